@@ -112,8 +112,9 @@ if False:
     # check if article is in HAL
     article_list_in_hal = list()
     article_list_notin_hal = list()
+    halIds = libHAL.checkDoisInHAL([art["doi"] for art in article_list_collection])
     for art in article_list_collection:
-        if libHAL.checkDoiInHAL(art["doi"]):
+        if halIds[art["doi"]]:
             article_list_in_hal.append(art)
         else:
             article_list_notin_hal.append(art)
@@ -0,0 +1,450 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL (asyncio API, available as libHAL.aio)
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import os
+import json
+import asyncio
+import base64
+import weakref
+from urllib.parse import urlparse
+from lxml import etree
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency (pip install push2HAL[aio])
+    aiohttp = None
+
+from . import default as dflt
+from . import libHAL as lib
+from . import execHAL as ex
+from . import session as ss
+from . import cache
+from . import refHAL
+
+Logger = logging.getLogger("push2HAL")
+
+## configuration of asyncio sessions (concurrency limits)
+SESSION_CONFIG = {
+    "limit": dflt.DEFAULT_AIO_LIMIT,
+    "limitPerHost": dflt.DEFAULT_AIO_LIMIT_PER_HOST,
+    "hostLimits": dict(),
+}
+## one session (and per host semaphores) per event loop
+SESSIONS = weakref.WeakKeyDictionary()
+SEMAPHORES = weakref.WeakKeyDictionary()
+## identical requests in flight (key -> future) per event loop
+FLIGHTS = weakref.WeakKeyDictionary()
+## adaptive concurrency slots (asyncio side of session.POLICY) per event loop
+SLOTS = weakref.WeakKeyDictionary()
+## result of a flight whose leader has been cancelled (request re-issued by waiters)
+ABANDONED = object()
+
+
+def configureSession(limit=None, limitPerHost=None, hostLimits=None):
+    """Configure concurrency limits: global, per host and for specific hosts ({host: limit})"""
+    if limit:
+        SESSION_CONFIG["limit"] = limit
+    if limitPerHost:
+        SESSION_CONFIG["limitPerHost"] = limitPerHost
+    if hostLimits:
+        SESSION_CONFIG["hostLimits"].update(hostLimits)
+
+
+async def getSession():
+    """Get the asyncio HTTP session of the running event loop"""
+    if aiohttp is None:
+        raise ImportError(
+            "aiohttp is required for asyncio API (pip install push2HAL[aio])"
+        )
+    loop = asyncio.get_running_loop()
+    s = SESSIONS.get(loop)
+    if s is None or s.closed:
+        Logger.debug(
+            "Build asyncio HTTP session (limit: {}, per host: {})".format(
+                SESSION_CONFIG["limit"], SESSION_CONFIG["limitPerHost"]
+            )
+        )
+        connector = aiohttp.TCPConnector(limit=SESSION_CONFIG["limit"])
+        s = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": dflt.DEFAULT_HTTP_USER_AGENT},
+        )
+        SESSIONS[loop] = s
+        SEMAPHORES[loop] = dict()
+    return s
+
+
+async def closeSession():
+    """Close the asyncio HTTP session of the running event loop"""
+    loop = asyncio.get_running_loop()
+    s = SESSIONS.pop(loop, None)
+    SEMAPHORES.pop(loop, None)
+    if s is not None:
+        await s.close()
+
+
+def getSemaphore(url):
+    """Get semaphore bounding concurrent requests to the host of url"""
+    host = urlparse(url).netloc
+    semaphores = SEMAPHORES[asyncio.get_running_loop()]
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(
+            SESSION_CONFIG["hostLimits"].get(host, SESSION_CONFIG["limitPerHost"])
+        )
+    return semaphores[host]
+
+
+def getSlots(family):
+    """Get counter and condition of adaptive concurrency slots of a family"""
+    slots = SLOTS.setdefault(asyncio.get_running_loop(), dict())
+    if family not in slots:
+        slots[family] = {"inflight": 0, "cond": asyncio.Condition()}
+    return slots[family]
+
+
+async def acquireSlot(family):
+    """Wait for a slot of the adaptive concurrency controller (session.POLICY)"""
+    slots = getSlots(family)
+    async with slots["cond"]:
+        await slots["cond"].wait_for(
+            lambda: slots["inflight"] < max(1, int(ss.POLICY[family]["concurrency"]))
+        )
+        slots["inflight"] += 1
+
+
+async def releaseSlot(family, failed=False):
+    """Release a slot and adapt concurrency (additive increase, multiplicative decrease)"""
+    with ss.POLICY_LOCK:
+        ss.adaptConcurrency(ss.POLICY[family], failed)
+    slots = getSlots(family)
+    async with slots["cond"]:
+        slots["inflight"] -= 1
+        slots["cond"].notify_all()
+
+
+async def request(method, url, **kwargs):
+    """Run request (bounded per host, rate limited, adaptive concurrency and retried): return
+    status code and content
+    (payload: libHAL.PayloadStream streamed as data)"""
+    s = await getSession()
+    family = ss.getFamily(url)
+    policy = ss.POLICY[family]
+    kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=policy["timeout"]))
+    # streamed payload (libHAL.PayloadStream): rewound to send it again
+    payload = kwargs.pop("payload", None)
+    attempt = 0
+    while True:
+        if payload is not None:
+            if attempt:
+                payload.seek(0)
+            kwargs["data"] = iterPayload(payload)
+        delay = ss.reserveToken(family)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await acquireSlot(family)
+        failed = False
+        try:
+            async with getSemaphore(url):
+                async with s.request(method, url, **kwargs) as response:
+                    status, content = response.status, await response.read()
+                    retryAfter = ss.getRetryAfter(response.headers)
+            failed = ss.isThrottled(status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            failed = True
+            if not isRetriedError(method, e) or attempt >= policy["maxRetries"]:
+                raise
+            Logger.warning("Request failed ({}): retry".format(e))
+            retryAfter = None
+        else:
+            if not ss.isRetried(method, status) or attempt >= policy["maxRetries"]:
+                return status, content
+            Logger.warning("Request failed (status code: {}): retry".format(status))
+        finally:
+            await releaseSlot(family, failed)
+        await asyncio.sleep(ss.getRetryDelay(family, attempt, retryAfter))
+        attempt += 1
+
+
+async def singleFlight(key, func):
+    """Run coroutine function once for identical calls in flight (others await its result)"""
+    loop = asyncio.get_running_loop()
+    flights = FLIGHTS.setdefault(loop, dict())
+    while key in flights:
+        ss.countFlight("coalesced")
+        Logger.debug("Coalesced request: {}".format(key))
+        result = await asyncio.shield(flights[key])
+        if result is not ABANDONED:
+            return result
+        Logger.debug("Coalesced request cancelled, issue it again: {}".format(key))
+    ss.countFlight("request")
+    future = flights[key] = loop.create_future()
+    try:
+        result = await func()
+    except asyncio.CancelledError:
+        # waiters are not cancelled: first one issues the request again
+        future.set_result(ABANDONED)
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # mark exception as retrieved (no waiter)
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if flights.get(key) is future:
+            flights.pop(key)
+
+
+async def getShared(url, params=None):
+    """Run GET request coalesced with identical ones in flight: return status code and content"""
+    return await singleFlight(
+        ss.getFlightKey(url, params), lambda: request("GET", url, params=params)
+    )
+
+
+def isRetriedError(method, error):
+    """Check if a request could be retried after a network failure (POST only if not sent)"""
+    if method == "POST":
+        return isinstance(error, aiohttp.ClientConnectorError)
+    return True
+
+
+async def getDataFromHAL(
+    txtsearch=None,
+    typeI=None,
+    typeDB="article",
+    typeR="json",
+    returnFields="title_s,author_s,halId_s,label_s,docid",
+    url=dflt.HAL_API_SEARCH_URL,
+    rows=dflt.DEFAULT_MAX_NUMBER_RESULTS_QUERY,
+):
+    """Search in HAL archives (asyncio version of libHAL.getDataFromHAL)"""
+    url = lib.getURLFromDB(typeDB, url)
+    query = lib.getQuery(txtsearch, typeI)
+    params = {
+        "q": query,
+        "fl": returnFields,
+        "wt": typeR,
+        "rows": rows,
+    }
+    # get from cache (referentials only)
+    useCache = cache.isCached(typeDB, typeR)
+    if useCache:
+        found, data = cache.getFromCache(typeDB, url, params)
+        if found:
+            return data
+    # request and get response
+    status, content = await getShared(
+        url, params={k: str(v) for k, v in params.items() if v is not None}
+    )
+    if status == 200:
+        if typeR == "json":
+            data = json.loads(content).get("response", {}).get("docs", [])
+            if useCache:
+                cache.storeInCache(typeDB, url, params, data)
+        elif typeR == "xml-tei":
+            return etree.fromstring(content)
+        return data
+    return []
+
+
+async def getTEIFromHAL(hal_id):
+    """Download TEI of a document in HAL"""
+    return await getDataFromHAL(
+        txtsearch=hal_id, typeI="docId", typeDB="article", typeR="xml-tei"
+    )
+
+
+async def checkDoiInHAL(doi):
+    """Check if DOI is already in HAL"""
+    dataFromHAL = await getDataFromHAL(
+        txtsearch=doi, typeI="doi", typeDB="article", typeR="json"
+    )
+    return len(dataFromHAL) > 0
+
+
+async def getHalIdsFromDois(dois):
+    """Get HAL ids of documents from a chunk of DOIs (see libHAL.getHalIdsFromDois)"""
+    rows = len(dois) * dflt.DEFAULT_BULK_ROWS_FACTOR
+    dataFromHAL = await getDataFromHAL(
+        txtsearch=dois if len(dois) > 1 else dois[0],
+        typeI="doi",
+        returnFields="doiId_id,halId_s",
+        rows=rows,
+    )
+    halIds = dict.fromkeys(dois)
+    if len(dois) == 1:
+        if dataFromHAL:
+            halIds[dois[0]] = dataFromHAL[0].get("halId_s")
+        return halIds
+    if len(dataFromHAL) >= rows:
+        for found in await asyncio.gather(
+            getHalIdsFromDois(dois[: len(dois) // 2]),
+            getHalIdsFromDois(dois[len(dois) // 2 :]),
+        ):
+            halIds.update(found)
+        return halIds
+    halIds.update(lib.dispatchHalIds(dois, dataFromHAL))
+    return halIds
+
+
+async def checkDoisInHAL(dois, chunkSize=dflt.DEFAULT_BULK_CHUNK_SIZE):
+    """Check if DOIs are already in HAL (return HAL id or None for each DOI)"""
+    dois = list(dict.fromkeys(dois))
+    halIds = dict.fromkeys(dois)
+    chunks = lib.splitValues(dois, chunkSize)
+    for found in await asyncio.gather(*[getHalIdsFromDois(c) for c in chunks]):
+        halIds.update(found)
+    return halIds
+
+
+async def getTEIsFromChunk(halIds):
+    """Get TEI of a chunk of documents (see libHAL.getTEIsFromChunk)"""
+    tei = await getDataFromHAL(
+        txtsearch=halIds if len(halIds) > 1 else halIds[0],
+        typeI="docId",
+        typeDB="article",
+        typeR="xml-tei",
+        rows=len(halIds),
+    )
+    if len(tei) == 0:
+        return dict()
+    wanted = set(halIds)
+    return {h: t for h, t in lib.splitTEI(tei) if h in wanted}
+
+
+async def getTEIsFromHAL(halIds, chunkSize=dflt.DEFAULT_TEI_CHUNK_SIZE):
+    """Download TEI of documents in HAL (return TEI or None for each HAL id)"""
+    teis = dict.fromkeys(halIds)
+    chunks = lib.splitValues(list(teis), chunkSize)
+    for found in await asyncio.gather(*[getTEIsFromChunk(c) for c in chunks]):
+        teis.update(found)
+    return teis
+
+
+async def getJournalIdFromHAL(journal):
+    """Get HAL ID of a journal from its title"""
+    idJ = await getDataFromHAL(
+        txtsearch=journal,
+        typeDB="journal",
+        typeI="title",
+        returnFields="docid,title_s",
+    )
+    if not idJ:
+        idJ = await getDataFromHAL(
+            txtsearch=journal,
+            typeDB="journal",
+            typeI="title_approx",
+            returnFields="docid,title_s",
+        )
+    return lib.selectJournalId(journal, idJ)
+
+
+async def iterPayload(stream):
+    """Iterate over chunks of a payload (read in executor, see libHAL.PayloadStream)"""
+    loop = asyncio.get_running_loop()
+    chunks = iter(stream)
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+async def upload2HAL(
+    file,
+    headers,
+    credentials,
+    server="preprod",
+    hal_id=None,
+    progress=None,
+    length=None,
+):
+    """Upload to HAL (asyncio version of libHAL.upload2HAL, payload streamed)"""
+    Logger.info("Upload to HAL")
+    Logger.debug("File: {}".format(file))
+    url = lib.getSWORDUrl(server, hal_id)
+    Logger.debug("Upload via {}".format(url))
+    credentials = ss.getCredentials(credentials)
+    headers = dict(headers)
+    if credentials:
+        headers["Authorization"] = getBasicAuth(credentials)
+    # new record posted, existing one replaced
+    method = "PUT" if hal_id else "POST"
+    with lib.PayloadStream(file, length, progress) as stream:
+        if stream.length is not None:
+            headers["Content-Length"] = str(stream.length)
+        status, content = await request(method, url, payload=stream, headers=headers)
+    return lib.getHalIdFromResponse(status, content.decode("utf-8"))
+
+
+def getBasicAuth(credentials):
+    """Get basic authentication header value from credentials"""
+    token = "{}:{}".format(credentials["login"], credentials["passwd"])
+    return "Basic " + base64.b64encode(token.encode("utf-8")).decode("ascii")
+
+
+async def runJSON2HAL(
+    jsonContent,
+    verbose=False,
+    prod="preprod",
+    credentials=None,
+    completion=None,
+    idhal=None,
+):
+    """execute using arguments (asyncio version of execHAL.runJSON2HAL)"""
+    # activate verbose mode
+    if verbose:
+        Logger.setLevel(logging.DEBUG)
+    # share credentials with the HTTP sessions
+    if credentials:
+        ss.configureSession(credentials=credentials)
+    Logger.info("Run JSON2HAL (asyncio)")
+    # activate production mode
+    serverType, testMode = ex.getServerMode(prod)
+    #
+    dataJSON, dirPath, new_xml = ex.loadJSON(jsonContent)
+    if dataJSON is None:
+        return os.EX_OSFILE
+    # resolve journal ID without blocking the event loop
+    dataID = dataJSON.get("ID", None)
+    if dataID and dataID.get("journal") and dataID.get("halJournalId") is None:
+        idJournal = refHAL.findJournalId(
+            dataID.get("journal"), dataID.get("issn"), dataID.get("eissn")
+        )
+        if idJournal is None:
+            idJournal = await getJournalIdFromHAL(dataID.get("journal"))
+        if idJournal:
+            dataJSON = dict(dataJSON, ID=dict(dataID, halJournalId=idJournal))
+    # build XML and payload
+    loop = asyncio.get_running_loop()
+    exitStatus, file, payload = await loop.run_in_executor(
+        None,
+        ex.prepareJSON2HAL,
+        dataJSON,
+        dirPath,
+        new_xml,
+        testMode,
+        completion,
+        idhal,
+    )
+    if exitStatus != os.EX_OK:
+        return exitStatus
+    # upload to HAL
+    if credentials:
+        id_hal = await upload2HAL(file, payload, credentials, server=serverType)
+        return lib.manageError(id_hal)
+    else:
+        Logger.error("No provided credentials")
+        return os.EX_CONFIG
@@ -0,0 +1,260 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from . import default as dflt
+
+Logger = logging.getLogger("push2HAL")
+
+## configuration of the on-disk cache (disabled when no path)
+CACHE_CONFIG = {
+    "path": None,
+    "maxEntries": dflt.DEFAULT_CACHE_MAX_ENTRIES,
+    "evictInterval": dflt.DEFAULT_CACHE_EVICT_INTERVAL,
+    "ttl": dict(dflt.DEFAULT_CACHE_TTL),
+    "negativeTTL": dflt.DEFAULT_CACHE_NEGATIVE_TTL,
+}
+## hit/miss counters (current process)
+CACHE_STATS = {
+    "hit": 0,
+    "negativeHit": 0,
+    "miss": 0,
+    "expired": 0,
+    "store": 0,
+    "evict": 0,
+}
+CACHE_LOCK = threading.Lock()
+## one SQLite connection per thread
+CACHE_LOCAL = threading.local()
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query (
+    key TEXT PRIMARY KEY,
+    typeDB TEXT,
+    data TEXT,
+    empty INTEGER,
+    expire REAL,
+    access REAL
+);
+CREATE INDEX IF NOT EXISTS query_access ON query(access);
+"""
+
+
+def enableCache(
+    path=dflt.DEFAULT_CACHE_FILE,
+    maxEntries=dflt.DEFAULT_CACHE_MAX_ENTRIES,
+    ttl=None,
+    negativeTTL=dflt.DEFAULT_CACHE_NEGATIVE_TTL,
+    evictInterval=dflt.DEFAULT_CACHE_EVICT_INTERVAL,
+):
+    """Enable on-disk cache of HAL referential queries (ttl per referential in seconds,
+    number of entries checked every evictInterval stores)"""
+    Logger.debug("Enable cache: {}".format(path))
+    dirPath = os.path.dirname(path)
+    if dirPath:
+        os.makedirs(dirPath, exist_ok=True)
+    with CACHE_LOCK:
+        CACHE_CONFIG["path"] = path
+        CACHE_CONFIG["maxEntries"] = maxEntries
+        CACHE_CONFIG["evictInterval"] = evictInterval
+        CACHE_CONFIG["ttl"] = dict(dflt.DEFAULT_CACHE_TTL)
+        if ttl:
+            CACHE_CONFIG["ttl"].update(ttl)
+        CACHE_CONFIG["negativeTTL"] = negativeTTL
+    # create tables
+    getConnection()
+
+
+def disableCache():
+    """Disable on-disk cache"""
+    with CACHE_LOCK:
+        CACHE_CONFIG["path"] = None
+
+
+def isCached(typeDB, typeR="json"):
+    """Check if queries on a referential are cached"""
+    return (
+        CACHE_CONFIG["path"] is not None
+        and typeR == "json"
+        and typeDB in CACHE_CONFIG["ttl"]
+    )
+
+
+def initConnection(conn):
+    """Set journal of cache and create its schema (in a single write transaction)"""
+    timeout = int(1000 * dflt.DEFAULT_CACHE_TIMEOUT)
+    conn.execute("PRAGMA busy_timeout={}".format(timeout))
+    # WAL journal allows concurrent readers with one writer (multiple processes)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in CACHE_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def openConnection(path):
+    """Open SQLite connection to cache (retried if another process or thread is
+    creating the same cache file)"""
+    attempt = 0
+    while True:
+        # autocommit mode: transactions are explicitly opened
+        conn = sqlite3.connect(
+            path, timeout=dflt.DEFAULT_CACHE_TIMEOUT, isolation_level=None
+        )
+        try:
+            initConnection(conn)
+            return conn
+        except sqlite3.OperationalError as e:
+            conn.close()
+            if attempt >= dflt.DEFAULT_CACHE_INIT_RETRIES:
+                raise
+            Logger.debug("Cache initialization failed ({}): retry".format(e))
+            time.sleep(dflt.DEFAULT_CACHE_INIT_BACKOFF * 2**attempt)
+            attempt += 1
+
+
+def getConnection():
+    """Get SQLite connection of the current thread (new one in a child process)"""
+    path = CACHE_CONFIG["path"]
+    conn = getattr(CACHE_LOCAL, "conn", None)
+    if conn is not None and CACHE_LOCAL.pid != os.getpid():
+        # connection inherited from parent process (fork): never used in child
+        conn = None
+    if conn is None or CACHE_LOCAL.path != path:
+        if conn is not None:
+            conn.close()
+        conn = openConnection(path)
+        CACHE_LOCAL.conn = conn
+        CACHE_LOCAL.path = path
+        CACHE_LOCAL.pid = os.getpid()
+        # first store checks the number of entries
+        CACHE_LOCAL.stores = 0
+    return conn
+
+
+def countStat(name):
+    """Increment cache counter"""
+    with CACHE_LOCK:
+        CACHE_STATS[name] += 1
+
+
+def getCacheStats():
+    """Get hit/miss counters of the cache (current process)"""
+    with CACHE_LOCK:
+        return dict(CACHE_STATS)
+
+
+def getKey(url, params):
+    """Build cache key from url and query parameters"""
+    return json.dumps(
+        [
+            url,
+            params.get("q"),
+            params.get("fl"),
+            params.get("wt"),
+            params.get("rows"),
+        ]
+    )
+
+
+def getFromCache(typeDB, url, params):
+    """Get data from cache (return status and data)"""
+    key = getKey(url, params)
+    conn = getConnection()
+    now = time.time()
+    try:
+        row = conn.execute(
+            "SELECT data, empty, expire FROM query WHERE key=?", (key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        Logger.warning("Unable to read cache: {}".format(e))
+        row = None
+    if row is None:
+        countStat("miss")
+        return False, None
+    if row[2] < now:
+        Logger.debug("Cache expired for {}".format(key))
+        try:
+            conn.execute("DELETE FROM query WHERE key=? AND expire<?", (key, now))
+        except sqlite3.Error as e:
+            Logger.debug("Unable to remove expired entry: {}".format(e))
+        countStat("expired")
+        countStat("miss")
+        return False, None
+    # update last access for LRU eviction (best effort if database is busy)
+    try:
+        conn.execute("UPDATE query SET access=? WHERE key=?", (now, key))
+    except sqlite3.Error as e:
+        Logger.debug("Unable to update cache access: {}".format(e))
+    countStat("negativeHit" if row[1] else "hit")
+    Logger.debug("Get data from cache: {}".format(key))
+    return True, json.loads(row[0])
+
+
+def storeInCache(typeDB, url, params, data):
+    """Store data in cache (and evict least recently used entries)"""
+    key = getKey(url, params)
+    now = time.time()
+    empty = not data
+    if empty:
+        ttl = CACHE_CONFIG["negativeTTL"]
+    else:
+        ttl = CACHE_CONFIG["ttl"].get(typeDB)
+    conn = getConnection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR REPLACE INTO query VALUES (?, ?, ?, ?, ?, ?)",
+            (key, typeDB, json.dumps(data), int(empty), now + ttl, now),
+        )
+        if CACHE_LOCAL.stores % CACHE_CONFIG["evictInterval"] == 0:
+            evictEntries(conn)
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        Logger.warning("Unable to store data in cache: {}".format(e))
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        return
+    CACHE_LOCAL.stores += 1
+    countStat("store")
+
+
+def evictEntries(conn):
+    """Evict least recently used cached queries (in a transaction)"""
+    nbEntries = conn.execute("SELECT COUNT(*) FROM query").fetchone()[0]
+    nbEvict = nbEntries - CACHE_CONFIG["maxEntries"]
+    if nbEvict > 0:
+        Logger.debug("Evict {} entries from cache".format(nbEvict))
+        conn.execute(
+            "DELETE FROM query WHERE key IN "
+            "(SELECT key FROM query ORDER BY access LIMIT ?)",
+            (nbEvict,),
+        )
+        with CACHE_LOCK:
+            CACHE_STATS["evict"] += nbEvict
+
+
+def clearCache():
+    """Remove all cached queries"""
+    conn = getConnection()
+    conn.execute("DELETE FROM query")
@@ -9,6 +9,9 @@
 ####*****************************************************************************************
 
 
+import os
+import zipfile
+
 DEFAULT_NB_CHAR = 400
 TXT_SEP = "++++++++++++++++++++++"
 
@@ -16,12 +19,84 @@ DEFAULT_CREDENTIALS_FILE = ".apihal"
 DEFAULT_UPLOAD_FILE_NAME_PDF = "{}.pdf"  #'upload.pdf'
 DEFAULT_UPLOAD_FILE_NAME_XML = "upload.xml"
 DEFAULT_UPLOAD_FILE_NAME_ZIP = "upload"
+DEFAULT_ZIP_PDF_COMPRESSION = zipfile.ZIP_STORED  # PDF already compressed: stored as is
+DEFAULT_ZIP_PDF_COMPRESSLEVEL = None  # compression level if PDF is compressed anyway
+DEFAULT_ZIP_SPOOL_SIZE = 32 * 1024 * 1024  # ZIP archive kept in memory up to this size (bytes)
+DEFAULT_UPLOAD_CHUNK_SIZE = 1 << 18  # size (bytes) of chunks of streamed uploads
 DEFAULT_MAX_NUMBER_RESULTS = (
     5  # results to display when searching in archives-ouvertes.fr
 )
 DEFAULT_MAX_NUMBER_RESULTS_QUERY = (
     50  # results to query when searching in archives-ouvertes.fr
 )
+DEFAULT_PAGE_SIZE = 500  # results per page when walking through results (cursor)
+DEFAULT_CURSOR_SORT = "docid asc"  # sort on unique key required by cursor
+
+DEFAULT_BATCH_UPLOADS = 4  # concurrent uploads in batch mode (records built in processes)
+DEFAULT_BATCH_INFLIGHT = 4  # records in flight (built or uploaded) per worker in batch mode
+DEFAULT_BATCH_RESULTS_FILE = "json2hal_results.jsonl"  # one JSON line per record
+
+DEFAULT_HTTP_POOL_SIZE = 10  # keep-alive connections kept per host
+DEFAULT_HTTP_POOL_HOSTS = 4  # hosts with a dedicated connection pool (API, SWORD...)
+DEFAULT_HTTP_USER_AGENT = "push2HAL"
+DEFAULT_HTTP_POLICY = {  # transport policy per endpoint family
+    # rate (requests/s, None: unlimited) and burst of the token bucket, timeout (s)
+    "search": {"rate": 20, "burst": 40, "timeout": 60},
+    "ref": {"rate": 20, "burst": 40, "timeout": 60},
+    "sword": {"rate": 1, "burst": 2, "timeout": 600},
+}
+DEFAULT_HTTP_MAX_RETRIES = 5  # retries on throttling, server errors or network failures
+DEFAULT_HTTP_BACKOFF = 0.5  # base delay (s) of the exponential backoff
+DEFAULT_HTTP_BACKOFF_MAX = 60  # maximal delay (s) between two retries
+DEFAULT_HTTP_RETRY_STATUS = (429, 500, 502, 503, 504)  # retried status (GET)
+DEFAULT_HTTP_RETRY_STATUS_POST = (429, 503)  # retried status (POST, not processed by server)
+DEFAULT_HTTP_CONCURRENCY_MIN = 1  # adaptive concurrency (AIMD): minimal requests in flight
+DEFAULT_HTTP_CONCURRENCY_DECREASE = 0.5  # multiplicative decrease of concurrency on error
+DEFAULT_HTTP_WORKERS = 8  # concurrent requests for bulk queries
+DEFAULT_BULK_CHUNK_SIZE = 100  # values OR'ed in a single bulk query
+DEFAULT_BULK_ROWS_FACTOR = 2  # rows requested per value in bulk queries (duplicates)
+DEFAULT_MAX_QUERY_LENGTH = 4000  # characters of a Solr query (url length limit)
+DEFAULT_TEI_CHUNK_SIZE = 20  # number of documents per bulk TEI query
+DEFAULT_STREAM_CHUNK_SIZE = 1 << 16  # size (bytes) of chunks read from streamed responses
+DEFAULT_AIO_LIMIT = 100  # concurrent requests of asyncio API
+DEFAULT_AIO_LIMIT_PER_HOST = 20  # concurrent requests per host of asyncio API
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "push2HAL")
+DEFAULT_CACHE_FILE = os.path.join(DEFAULT_CACHE_DIR, "cache.sqlite")
+DEFAULT_CACHE_MAX_ENTRIES = 50000  # LRU eviction above this number of cached queries
+DEFAULT_CACHE_EVICT_INTERVAL = 100  # stores between checks of number of cached queries
+DEFAULT_CACHE_TIMEOUT = 30  # seconds to wait for a lock held by another process
+DEFAULT_CACHE_INIT_RETRIES = 5  # retries of cache creation (locked by another process)
+DEFAULT_CACHE_INIT_BACKOFF = 0.05  # first delay (s) between retries of cache creation
+DEFAULT_CACHE_TTL = {  # time to live (in seconds) of cached queries per referential
+    "journal": 7 * 86400,
+    "structure": 7 * 86400,
+    "authorstruct": 86400,
+    "anrproject": 7 * 86400,
+    "europeanproject": 7 * 86400,
+    "doc": 30 * 86400,
+    "domain": 30 * 86400,
+    "instance": 30 * 86400,
+    "metadata": 30 * 86400,
+    "metadatalist": 30 * 86400,
+}
+DEFAULT_CACHE_NEGATIVE_TTL = 86400  # time to live of empty results
+DEFAULT_COUNTRY_FUZZY_CACHE_SIZE = 1024  # fuzzy searches of countries kept in memory (LRU)
+DEFAULT_COUNTRY_ADDRESS_CACHE_SIZE = 4096  # countries of addresses kept in memory (LRU)
+DEFAULT_REF_JOURNAL_FILE = os.path.join(DEFAULT_CACHE_DIR, "journal.json.gz")
+DEFAULT_REF_STRUCTURE_FILE = os.path.join(DEFAULT_CACHE_DIR, "structure.json.gz")
+DEFAULT_REF_AUTHOR_FILE = os.path.join(DEFAULT_CACHE_DIR, "author.json.gz")
+DEFAULT_REF_THRESHOLD = 0.8  # minimal similarity of fuzzy matching in local referentials
+DEFAULT_REF_MAX_TOKENS = 3  # rarest words used to get candidates in local referentials
+DEFAULT_REF_MAX_CANDIDATES = 200  # candidates scored in local referentials
+DEFAULT_REF_STRUCTURE_THRESHOLD = 0.85  # minimal score of structures found locally
+DEFAULT_REF_STRUCTURE_WEIGHTS = {  # weights of similarities scoring structures
+    "name": 0.55,
+    "acronym": 0.15,
+    "address": 0.1,
+    "country": 0.15,
+    "parent": 0.05,
+}
 
 DEFAULT_XML_SWORD_PACKAGING = "http://purl.org/net/sword-types/AOfr"
 DEFAULT_CONTENT_DISPOSITION='none'
@@ -36,6 +111,7 @@ DEFAULT_VALIDATION_XSD = 'aofr.xsd'
 DEFAULT_TEI_URL_NAMESPACE = 'http://www.tei-c.org/ns/1.0'
 DEFAULT_NAMESPACE_XML = {None: DEFAULT_TEI_URL_NAMESPACE}#, 'tei': 'http://www.tei-c.org/ns/1.0' , 'hal':'http://hal.archives-ouvertes.fr'} #{"tei": "http://www.tei-c.org/ns/1.0"}
 DEFAULT_XML_LANG = "{http://www.w3.org/XML/1998/namespace}"
+DEFAULT_XSD_URL_NAMESPACE = 'http://www.w3.org/2001/XMLSchema'
 DEFAULT_ERROR_DESCRIPTION_SWORD_LOC = "sword:verboseDescription"
 HAL_API_BASE = "https://api.archives-ouvertes.fr/"
 HAL_API_SEARCH_URL = HAL_API_BASE+"search/"
@@ -10,51 +10,46 @@
 
 
 import os
+import time
 import logging
 import json
+import tempfile
+import concurrent.futures as cf
 
 from . import libHAL as lib
 from . import misc as m
 from . import default as dflt
+from . import session
+from . import schema
+from . import cache
+from . import syncHAL
+from . import refHAL
 
 Logger = logging.getLogger("push2HAL")
 
 
-def runJSON2HAL(
-    jsonContent,
-    verbose=False,
-    prod="preprod",
-    credentials=None,
-    completion=None,
-    idhal=None,
-):
-    """execute using arguments"""
-    exitStatus = os.EX_CONFIG
-    # activate verbose mode
-    if verbose:
-        Logger.setLevel(logging.DEBUG)
-
-    Logger.info("Run JSON2HAL")
-    Logger.info("")
-
-    # activate production mode
+def getServerMode(prod="preprod"):
+    """Get server type and test mode from execution mode"""
     serverType = "preprod"
-    testMode = True
+    testMode = False
     if prod == "prod":
         Logger.info("Execution mode: use production server (USE WITH CAUTION))")
         serverType = "prod"
-        testMode = False
     elif prod == "test":
         Logger.info("Execution mode: use production server (dry-run))")
         serverType = "prod"
         testMode = True
     else:
         Logger.info("Dryrun mode: use preprod server")
-        testMode = False
+    return serverType, testMode
 
-    #
+
+def loadJSON(jsonContent):
+    """Load JSON content (dict or file): return data, directory and XML file name"""
     json_path = jsonContent
+    dirPath = ""
     new_xml = None
+    dataJSON = None
     if type(jsonContent) is dict:
         dataJSON = jsonContent
         new_xml = dflt.DEFAULT_UPLOAD_FILE_NAME_XML
@@ -63,15 +58,20 @@ def runJSON2HAL(
         dirPath = os.path.dirname(json_path)
         Logger.debug("Directory: {}".format(dirPath))
         # open and load json file
-        f = open(json_path, "r")
-        # Reading from file
-        dataJSON = json.loads(f.read())
+        with open(json_path, "r") as f:
+            # Reading from file
+            dataJSON = json.loads(f.read())
         new_xml = os.path.basename(json_path).replace(".json", ".xml")
     else:
         Logger.error("JSON file not found")
-        exitStatus = os.EX_OSFILE
-        return exitStatus
+    return dataJSON, dirPath, new_xml
+
 
+def buildJSON2HAL(dataJSON, dirPath):
+    """Validate JSON data and build XML: return exit status, XML tree and PDF file"""
+    # reject invalid JSON data before building anything
+    if schema.checkJSON(dataJSON):
+        return os.EX_DATAERR, None, None
     # build XML tree from json
     xmlData = lib.buildXML(dataJSON)
 
@@ -88,9 +88,12 @@ def runJSON2HAL(
             Logger.debug("PDF file: {}".format(pdf_path))
         else:
             Logger.error("PDF file not found")
-            exitStatus = os.EX_OSFILE
-            return exitStatus
-    # deal with specific upload options
+            return os.EX_OSFILE, None, None
+    return os.EX_OK, xmlData, pdf_path
+
+
+def getUploadOptions(testMode=False, completion=None, idhal=None):
+    """Get specific upload options"""
     options = dict()
     if completion:
         Logger.info(
@@ -104,6 +107,16 @@ def runJSON2HAL(
         options["testMode"] = "1"
     else:
         options["testMode"] = "0"
+    return options
+
+
+def prepareJSON2HAL(
+    dataJSON, dirPath, new_xml, testMode=False, completion=None, idhal=None
+):
+    """Build XML and payload from JSON data: return exit status, file and header"""
+    exitStatus, xmlData, pdf_path = buildJSON2HAL(dataJSON, dirPath)
+    if exitStatus != os.EX_OK:
+        return exitStatus, None, None
     # prepare payload to upload to HAL
     file, payload = lib.preparePayload(
         xmlData,
@@ -111,12 +124,95 @@ def runJSON2HAL(
         dirPath,
         xmlFileName=new_xml,
         hal_id=None,
-        options=options,
+        options=getUploadOptions(testMode, completion, idhal),
+    )
+    return os.EX_OK, file, payload
+
+
+def prepareSyncJSON2HAL(
+    dataJSON, dirPath, new_xml, testMode=False, completion=None, idhal=None
+):
+    """Build XML from JSON data and compare it with current record in HAL (if any):
+    return exit status, action (see syncHAL.getSyncAction), HAL id, file and header
+    (no payload if record is unchanged)"""
+    exitStatus, xmlData, pdf_path = buildJSON2HAL(dataJSON, dirPath)
+    if exitStatus != os.EX_OK:
+        return exitStatus, None, None, None, None
+    hal_id = syncHAL.findHalId(dataJSON)
+    currentTEI = None
+    if hal_id:
+        Logger.info("Record in HAL: {}".format(hal_id))
+        currentTEI = syncHAL.getCurrentTEI(hal_id)
+    action, _ = syncHAL.getSyncAction(xmlData, currentTEI, pdf_path)
+    if action == "unchanged":
+        return os.EX_OK, action, hal_id, None, None
+    if action == "deposit":
+        hal_id = None
+    elif action == "metadata":
+        # file already in HAL: only metadata are sent
+        pdf_path = None
+    file, payload = lib.preparePayload(
+        xmlData,
+        pdf_path,
+        dirPath,
+        xmlFileName=new_xml,
+        hal_id=hal_id,
+        options=getUploadOptions(testMode, completion, idhal),
     )
+    return os.EX_OK, action, hal_id, file, payload
+
 
-    # upload to HAL
+def runJSON2HAL(
+    jsonContent,
+    verbose=False,
+    prod="preprod",
+    credentials=None,
+    completion=None,
+    idhal=None,
+    sync=False,
+):
+    """execute using arguments (sync: update record already in HAL only if changed)"""
+    exitStatus = os.EX_CONFIG
+    # activate verbose mode
+    if verbose:
+        Logger.setLevel(logging.DEBUG)
+    # share credentials with the HTTP session
     if credentials:
-        id_hal = lib.upload2HAL(file, payload, credentials, server=serverType)
+        session.configureSession(credentials=credentials)
+
+    Logger.info("Run JSON2HAL")
+    Logger.info("")
+
+    # activate production mode
+    serverType, testMode = getServerMode(prod)
+
+    #
+    dataJSON, dirPath, new_xml = loadJSON(jsonContent)
+    if dataJSON is None:
+        exitStatus = os.EX_OSFILE
+        return exitStatus
+
+    # build XML and payload
+    hal_id = None
+    if sync:
+        exitStatus, action, hal_id, file, payload = prepareSyncJSON2HAL(
+            dataJSON, dirPath, new_xml, testMode, completion, idhal
+        )
+        if action == "unchanged":
+            Logger.info("No change: skip upload of {}".format(hal_id))
+            return exitStatus
+    else:
+        exitStatus, file, payload = prepareJSON2HAL(
+            dataJSON, dirPath, new_xml, testMode, completion, idhal
+        )
+    if exitStatus != os.EX_OK:
+        return exitStatus
+
+    # upload to HAL (update of record found in sync mode)
+    if credentials:
+        id_hal = lib.upload2HAL(
+            file, payload, credentials, server=serverType, hal_id=hal_id
+        )
         return lib.manageError(id_hal)
     else:
         Logger.error("No provided credentials")
@@ -124,6 +220,221 @@ def runJSON2HAL(
         return exitStatus
 
 
+def getBatchPaths(batch):
+    """Get JSON files of a batch (directory or manifest listing one file per line)"""
+    if os.path.isdir(batch):
+        paths = [
+            os.path.join(batch, f) for f in sorted(os.listdir(batch)) if f.endswith(".json")
+        ]
+    else:
+        dirPath = os.path.dirname(batch)
+        with open(batch, "r") as f:
+            lines = [l.strip() for l in f]
+        # relative paths from manifest directory (empty lines and comments skipped)
+        paths = [os.path.join(dirPath, l) for l in lines if l and not l.startswith("#")]
+    return [os.path.abspath(p) for p in paths]
+
+
+## configuration of the current batch worker
+BATCH_CONFIG = dict()
+
+
+def initBatchWorker(config):
+    """Initialize a process building records of a batch (own working directory)"""
+    os.chdir(tempfile.mkdtemp(dir=config["workDir"]))
+    Logger.setLevel(config["level"])
+    m.useXSD(config["xsd"])
+    if config["cache"]:
+        cache.enableCache(config["cache"])
+    BATCH_CONFIG.update(config)
+
+
+def prepareBatchRecord(
+    json_path, testMode=False, completion=None, idhal=None, sync=False
+):
+    """Build, validate and package a record of a batch (in a worker process):
+    return result of the record with payload (data and headers) if ready to upload"""
+    start = time.perf_counter()
+    result = {"path": json_path, "status": "failed", "code": None, "halId": None}
+    try:
+        dataJSON, dirPath, new_xml = loadJSON(json_path)
+        if dataJSON is None:
+            result["code"] = os.EX_OSFILE
+        else:
+            # file given relatively to the directory where the batch was started
+            pdf_path = dataJSON.get("file", None)
+            if pdf_path and not os.path.isabs(pdf_path):
+                pdf_path = os.path.join(BATCH_CONFIG.get("cwd", ""), pdf_path)
+                if os.path.isfile(pdf_path):
+                    dataJSON["file"] = pdf_path
+            if sync:
+                exitStatus, action, hal_id, file, payload = prepareSyncJSON2HAL(
+                    dataJSON, dirPath, new_xml, testMode, completion, idhal
+                )
+                result["action"] = action
+                result["halId"] = hal_id
+            else:
+                exitStatus, file, payload = prepareJSON2HAL(
+                    dataJSON, dirPath, new_xml, testMode, completion, idhal
+                )
+            result["code"] = exitStatus
+            if exitStatus == os.EX_OK and result.get("action") == "unchanged":
+                result["status"] = "ok"
+            elif exitStatus == os.EX_OK:
+                # payload streamed from a file by upload thread (archive saved in
+                # working directory of the worker, removed once sent)
+                result["data"] = file
+                if not isinstance(file, str):
+                    result["data"] = lib.savePayload(file, os.getcwd())
+                    result["temporary"] = True
+                result["headers"] = payload
+    except Exception as e:
+        Logger.error("Failed to build {}: {}".format(json_path, e))
+        result["code"] = os.EX_SOFTWARE
+        result["error"] = str(e)
+    result["build"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def uploadBatchRecord(result, credentials, serverType="preprod"):
+    """Upload a record of a batch (in an I/O thread): return its result"""
+    start = time.perf_counter()
+    data = result.pop("data")
+    temporary = result.pop("temporary", False)
+    headers = result.pop("headers")
+    try:
+        # record found in sync mode is updated
+        status, halId = lib.upload2HAL(
+            data,
+            headers,
+            credentials,
+            server=serverType,
+            hal_id=result["halId"],
+            withStatus=True,
+        )
+        result["code"] = status
+        if type(halId) is str:
+            result["halId"] = halId
+        if status in (200, 201, 202):
+            result["status"] = "ok"
+    except Exception as e:
+        Logger.error("Failed to upload {}: {}".format(result["path"], e))
+        result["error"] = str(e)
+    if temporary:
+        os.remove(data)
+    result["upload"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def runBatchJSON2HAL(
+    batch,
+    jobs=None,
+    uploads=dflt.DEFAULT_BATCH_UPLOADS,
+    results=dflt.DEFAULT_BATCH_RESULTS_FILE,
+    verbose=False,
+    prod="preprod",
+    credentials=None,
+    completion=None,
+    idhal=None,
+    sync=False,
+):
+    """execute on a batch of JSON files (directory or manifest): records are built in
+    a process pool and uploaded in a pool of threads, one result per record written in
+    results file (JSON lines) (sync: update records already in HAL only if changed)"""
+    # activate verbose mode
+    if verbose:
+        Logger.setLevel(logging.DEBUG)
+    # share credentials with the HTTP session
+    if credentials:
+        session.configureSession(credentials=credentials)
+    else:
+        Logger.error("No provided credentials")
+        return os.EX_CONFIG
+
+    Logger.info("Run JSON2HAL on batch: {}".format(batch))
+    Logger.info("")
+
+    # activate production mode
+    serverType, testMode = getServerMode(prod)
+
+    if not os.path.exists(batch):
+        Logger.error("Batch directory or manifest not found")
+        return os.EX_OSFILE
+    paths = getBatchPaths(batch)
+    jobs = jobs or os.cpu_count() or 1
+    Logger.info(
+        "{} record(s): {} build process(es), {} upload(s)".format(len(paths), jobs, uploads)
+    )
+
+    # local referentials loaded once (shared with forked build processes)
+    for referential in refHAL.REFERENTIALS:
+        refHAL.getIndex(referential)
+
+    nbFailed = 0
+    todo = iter(paths)
+    builds = set()
+    sends = set()
+    maxInflight = dflt.DEFAULT_BATCH_INFLIGHT * (jobs + uploads)
+    with tempfile.TemporaryDirectory(prefix="push2HAL-") as workDir:
+        config = {
+            "workDir": workDir,
+            "cwd": os.getcwd(),
+            "level": Logger.level,
+            "xsd": m.getXSDPath(),
+            "cache": cache.CACHE_CONFIG["path"],
+        }
+        with cf.ProcessPoolExecutor(
+            jobs, initializer=initBatchWorker, initargs=(config,)
+        ) as builders, cf.ThreadPoolExecutor(uploads) as senders, open(
+            results, "w"
+        ) as out:
+            while True:
+                # bounded number of records in flight (payloads kept on disk)
+                while len(builds) + len(sends) < maxInflight:
+                    path = next(todo, None)
+                    if path is None:
+                        break
+                    builds.add(
+                        builders.submit(
+                            prepareBatchRecord,
+                            path,
+                            testMode,
+                            completion,
+                            idhal,
+                            sync,
+                        )
+                    )
+                if not builds and not sends:
+                    break
+                done, _ = cf.wait(builds | sends, return_when=cf.FIRST_COMPLETED)
+                for f in done:
+                    result = f.result()
+                    if f in builds:
+                        builds.remove(f)
+                        if "data" in result:
+                            sends.add(
+                                senders.submit(
+                                    uploadBatchRecord, result, credentials, serverType
+                                )
+                            )
+                            continue
+                    else:
+                        sends.remove(f)
+                    if result["status"] != "ok":
+                        nbFailed += 1
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+
+    Logger.info(
+        "Batch done: {} record(s), {} failed (results: {})".format(
+            len(paths), nbFailed, results
+        )
+    )
+    if nbFailed:
+        return os.EX_SOFTWARE
+    return os.EX_OK
+
+
 def runPDF2HAL(
     pdf_path,
     verbose=False,
@@ -133,28 +444,22 @@ def runPDF2HAL(
     halid=None,
     idhal=None,
     interaction=True,
+    sync=False,
 ):
-    """execute using arguments"""
+    """execute using arguments (sync: add file only if record in HAL has none)"""
     exitStatus = os.EX_CONFIG
     # activate verbose mode
     if verbose:
         Logger.setLevel(logging.DEBUG)
+    # share credentials with the HTTP session
+    if credentials:
+        session.configureSession(credentials=credentials)
 
     Logger.info("Run PDF2HAL")
     Logger.info("")
 
     # activate production mode
-    serverType = "preprod"
-    testMode = False
-    if prod == "prod":
-        Logger.info("Execution mode: use production server (USE WITH CAUTION))")
-        serverType = "prod"
-    elif prod == "test":
-        Logger.info("Execution mode: use production server (dry-run))")
-        serverType = "prod"
-        testMode = True
-    else:
-        Logger.info("Dryrun mode: use preprod server")
+    serverType, testMode = getServerMode(prod)
 
     # check if file exists
     if os.path.isfile(pdf_path):
@@ -229,6 +534,12 @@ def runPDF2HAL(
             txtsearch=hal_id, typeI="docId", typeDB="article", typeR="xml-tei"
         )
 
+        if len(tei_content) > 0 and sync:
+            # metadata come from HAL: only a missing file is uploaded
+            if syncHAL.hasFile(tei_content):
+                Logger.info("File already in HAL: skip upload of {}".format(hal_id))
+                return os.EX_OK
+
         if len(tei_content) > 0:
             # write TEI file
             tei_file_path = os.path.join(dirPath, hal_id + ".tei.xml")
@@ -260,7 +571,13 @@ def runPDF2HAL(
 
             # upload to HAL
             if credentials:
-                retStatus = lib.upload2HAL(file, payload, credentials, server=serverType)
+                retStatus = lib.upload2HAL(
+                    file,
+                    payload,
+                    credentials,
+                    server=serverType,
+                    hal_id=hal_id if sync else None,
+                )
                 return lib.manageError(retStatus)
             else:
                 Logger.error("No provided credentials")
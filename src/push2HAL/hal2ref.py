@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Tools to download HAL referentials as local snapshots (used to resolve ids offline)
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### syntax: hal2ref.py <referential>
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import os
+import sys
+import argparse
+import logging
+from . import refHAL
+
+FORMAT = "HAL2REF - %(asctime)s - %(levelname)s - %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+Logger = logging.getLogger("push2HAL")
+
+
+def start():
+    parser = argparse.ArgumentParser(description='HAL2REF - Download HAL referential to a local snapshot used to resolve ids without network.')
+    parser.add_argument('referential', help='Referential to download', choices=list(refHAL.REFERENTIALS.keys()))
+    parser.add_argument('-o','--output', help='Path to the snapshot file (default in ~/.cache/push2HAL)')
+    parser.add_argument('-m','--max-age', help='Download only if the snapshot is older than this number of days (periodic refresh)', type=float)
+    parser.add_argument('-v','--verbose', help='Show all logs',action='store_true')
+    args = parser.parse_args()
+
+    if args.verbose:
+        Logger.setLevel(logging.DEBUG)
+
+    # download and store referential (if missing or too old)
+    maxAge = None
+    if args.max_age is not None:
+        maxAge = args.max_age * 86400
+    try:
+        refHAL.refreshReferential(args.referential, args.output, maxAge)
+    except Exception as e:
+        # previous snapshot (if any) is kept
+        Logger.error("Unable to download referential {}: {}".format(args.referential, e))
+        sys.exit(os.EX_UNAVAILABLE)
+    sys.exit(os.EX_OK)
+
+
+if __name__ == "__main__":
+    start()
@@ -18,6 +18,8 @@ import argparse
 import logging
 from . import execHAL
 from . import misc as m
+from . import cache
+from . import default as dflt
 
 FORMAT = "JSON2HAL - %(asctime)s - %(levelname)s - %(message)s"
 logging.basicConfig(format=FORMAT, level=logging.INFO)
@@ -26,7 +28,7 @@ Logger = logging.getLogger("push2HAL")
 
 def start():
     parser = argparse.ArgumentParser(description='JSON2HAL - Upload document metadata and optional PDF file to HAL using data from json file.')
-    parser.add_argument('json_path', help='Path to the JSON file')
+    parser.add_argument('json_path', help='Path to the JSON file', nargs='?')
     parser.add_argument('-c','--credentials', help='Path to the credentials file')
     parser.add_argument('-v','--verbose', help='Show all logs',action='store_true')
     parser.add_argument('-e','--prod', help='Execute on prod server',action='store_true')
@@ -35,11 +37,27 @@ def start():
     parser.add_argument('-p','--passwd', help='Password for API (HAL)')
     parser.add_argument('-cc','--complete', help='Run completion (use grobid, idext or affiliation or list of terms spearated by comma)')
     parser.add_argument('-id','--idhal', help='Declare deposition on behalf of a specific idHAL')
+    parser.add_argument('-ca','--cache', help='Cache HAL referentials queries in a local file (default: {})'.format(dflt.DEFAULT_CACHE_FILE), nargs='?', const=dflt.DEFAULT_CACHE_FILE)
+    parser.add_argument('-b','--batch', help='Run on all JSON files of a directory or listed in a manifest file (one path per line)')
+    parser.add_argument('-j','--jobs', help='Number of processes building records in batch mode (default: number of CPUs)', type=int)
+    parser.add_argument('-u','--uploads', help='Number of concurrent uploads in batch mode (default: {})'.format(dflt.DEFAULT_BATCH_UPLOADS), type=int, default=dflt.DEFAULT_BATCH_UPLOADS)
+    parser.add_argument('-r','--results', help='Path to the results file of batch mode (default: {})'.format(dflt.DEFAULT_BATCH_RESULTS_FILE), default=dflt.DEFAULT_BATCH_RESULTS_FILE)
+    parser.add_argument('-s','--sync', help='Update records already in HAL (found from halId or DOI) only if changed',action='store_true')
+    parser.add_argument('-x','--xsd', help='Path to the XSD file used to validate XML files (default: {})'.format(dflt.DEFAULT_VALIDATION_XSD))
     # sys.argv = ['json2hal.py', 'test.json', '-v', '-t']#, '-a', 'hal-04215255']
     args = parser.parse_args()
+    if not args.json_path and not args.batch:
+        parser.error('json_path or --batch is required')
     
     # load credentials from file or from arguments
     credentials = m.load_credentials(args)
+
+    # activate cache of referentials
+    if args.cache:
+        cache.enableCache(args.cache)
+    # use specific XSD file
+    if args.xsd:
+        m.useXSD(args.xsd)
     
     # adapt mode:
     prodmode = 'preprod'
@@ -48,13 +66,27 @@ def start():
     if args.test:
         prodmode = 'test'
     
+    # run on a batch of files
+    if args.batch:
+        sys.exit(execHAL.runBatchJSON2HAL(args.batch,
+                                          jobs=args.jobs,
+                                          uploads=args.uploads,
+                                          results=args.results,
+                                          verbose=args.verbose,
+                                          prod=prodmode,
+                                          credentials=credentials,
+                                          completion=args.complete,
+                                          idhal=args.idhal,
+                                          sync=args.sync))
+
     # run main function
     sys.exit(execHAL.runJSON2HAL(args.json_path,
                                  verbose=args.verbose,
                                  prod=prodmode,
                                  credentials=credentials,
                                  completion=args.complete,
-                                 idhal=args.idhal))
+                                 idhal=args.idhal,
+                                 sync=args.sync))
 
 
 if __name__ == "__main__":
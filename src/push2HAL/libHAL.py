@@ -11,36 +11,67 @@
 
 import logging
 import os
+import io
+import sys
+import time
+import copy
 import shutil
 import tempfile
-import requests
 import difflib
 import json
-from requests.auth import HTTPBasicAuth
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from lxml import etree
 import re
+import requests
 from unidecode import unidecode
 from stdnum import isbn, issn
 
 from . import default as dflt
 from . import misc as m
+from . import session
+from . import cache
+from . import refHAL
 
 Logger = logging.getLogger("push2HAL")
 
 
 ## get XML's namespace for everything
 TEI = "{%s}" % dflt.DEFAULT_TEI_URL_NAMESPACE
+## qualified tag names used to build each record (built once)
+TAGS = {
+    t: sys.intern(TEI + t)
+    for t in (
+        "TEI",
+        "text",
+        "body",
+        "listBibl",
+        "biblFull",
+        "titleStmt",
+        "sourceDesc",
+        "biblStruct",
+        "analytic",
+        "monogr",
+        "imprint",
+        "series",
+        "profileDesc",
+        "textClass",
+        "back",
+        "title",
+        "author",
+        "persName",
+        "forename",
+        "surname",
+        "email",
+        "idno",
+        "ptr",
+        "affiliation",
+    )
+}
 
 
-def getDataFromHAL(
-    txtsearch=None,
-    typeI=None,
-    typeDB="article",
-    typeR="json",
-    returnFields="title_s,author_s,halId_s,label_s,docid",
-    url=dflt.HAL_API_SEARCH_URL,
-):
-    """Search for a title in HAL archives"""
+def getURLFromDB(typeDB, url=dflt.HAL_API_SEARCH_URL):
+    """Get API url of a HAL database"""
     if typeDB:
         Logger.debug("Searching in database: {}".format(typeDB))
         if typeDB == "journal":
@@ -65,9 +96,28 @@ def getDataFromHAL(
             url = dflt.HAL_API_METADATALIST_URL
         elif typeDB == "structure":
             url = dflt.HAL_API_STRUCTURE_URL
+        elif typeDB == "author":
+            url = dflt.HAL_API_AUTHOR_URL
         else:
             Logger.warning("Unknown database: {}".format(typeDB))
+    return url
+
 
+def formatQueryValues(values):
+    """Format value(s) for Solr query (list of values are OR'ed)"""
+    if type(values) not in (list, tuple, set):
+        return values
+    return "({})".format(
+        " OR ".join(
+            '"{}"'.format(str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for v in values
+        )
+    )
+
+
+def getQuery(txtsearch, typeI):
+    """Build Solr query from searched text (or list of values) and type of search"""
+    query = None
     if typeI == "title":
         Logger.debug("Searching for title: {}".format(txtsearch.lower()))
         query = "title_t:{}".format(txtsearch.lower())
@@ -76,10 +126,28 @@ def getDataFromHAL(
         query = "title_s:{}".format(txtsearch.lower())
     elif typeI == "docId":
         Logger.debug("Searching for document's ID: {}".format(txtsearch))
-        query = "halId_s:{}".format(txtsearch)
+        query = "halId_s:{}".format(formatQueryValues(txtsearch))
     elif typeI == "doi":
         Logger.debug("Searching for document's doi: {}".format(txtsearch))
-        query = "doiId_id:{}".format(txtsearch)
+        query = "doiId_id:{}".format(formatQueryValues(txtsearch))
+    elif typeI == "query":
+        Logger.debug("Searching with query: {}".format(txtsearch))
+        query = txtsearch
+    return query
+
+
+def getDataFromHAL(
+    txtsearch=None,
+    typeI=None,
+    typeDB="article",
+    typeR="json",
+    returnFields="title_s,author_s,halId_s,label_s,docid",
+    url=dflt.HAL_API_SEARCH_URL,
+    rows=dflt.DEFAULT_MAX_NUMBER_RESULTS_QUERY,
+):
+    """Search for a title in HAL archives"""
+    url = getURLFromDB(typeDB, url)
+    query = getQuery(txtsearch, typeI)
     #
     Logger.debug("Return format: {}".format(typeR))
 
@@ -87,23 +155,100 @@ def getDataFromHAL(
         "q": query,
         "fl": returnFields,
         "wt": typeR,
-        "rows": dflt.DEFAULT_MAX_NUMBER_RESULTS_QUERY,  # Adjust the number of rows based on your preference
+        "rows": rows,  # Adjust the number of rows based on your preference
     }
-    # request and get response
-    response = requests.get(url, params=params)
-
-    if response.status_code == 200:
+    # get from cache (referentials only)
+    useCache = cache.isCached(typeDB, typeR)
+    if useCache:
+        found, data = cache.getFromCache(typeDB, url, params)
+        if found:
+            return data
+    # request and get response (shared with identical requests in flight)
+    status, content = session.getShared(url, params=params)
+
+    if status == 200:
         if typeR == "json":
-            data = response.json().get("response", {}).get("docs", [])
+            data = json.loads(content).get("response", {}).get("docs", [])
+            if useCache:
+                cache.storeInCache(typeDB, url, params, data)
         elif typeR == "xml-tei":
-            data = response.text
             # declare namespace
             # key, value = list(dflt.DEFAULT_NAMESPACE_XML.items())[0]
             # etree.register_namespace(key, value)
-            return etree.fromstring(data.encode("utf-8"))
+            return etree.fromstring(content)
         return data
     return []
 
+
+def getPageFromHAL(url, params, cursor="*"):
+    """Get a page of results from HAL using cursor: return documents, next cursor and
+    number of results (error raised if page is not available once retried: results are
+    not truncated)"""
+    params = dict(params, cursorMark=cursor)
+    response = session.get(url, params=params)
+    if response.status_code != 200:
+        Logger.error(
+            "Failed to get results page. Status code: {}".format(response.status_code)
+        )
+        response.raise_for_status()
+        raise requests.HTTPError(
+            "Unexpected status code: {}".format(response.status_code),
+            response=response,
+        )
+    content = response.json()
+    if "nextCursorMark" not in content:
+        raise ValueError("No cursor in results page of {}".format(url))
+    docs = content.get("response", {}).get("docs", [])
+    numFound = content.get("response", {}).get("numFound")
+    return docs, content["nextCursorMark"], numFound
+
+
+def iterDataFromHAL(
+    txtsearch=None,
+    typeI=None,
+    typeDB="article",
+    returnFields="title_s,author_s,halId_s,label_s,docid",
+    url=dflt.HAL_API_SEARCH_URL,
+    pageSize=dflt.DEFAULT_PAGE_SIZE,
+    prefetch=True,
+    info=None,
+):
+    """Walk through all results of a search in HAL (cursor deep paging, yield documents)
+    (info: dict filled with the number of results announced by HAL, numFound)"""
+    url = getURLFromDB(typeDB, url)
+    query = getQuery(txtsearch, typeI)
+    params = {
+        "q": query,
+        "fl": returnFields,
+        "wt": "json",
+        "rows": pageSize,
+        "sort": dflt.DEFAULT_CURSOR_SORT,
+    }
+    cursor = "*"
+    # next page is requested while current one is consumed
+    pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        docs, nextCursor, numFound = getPageFromHAL(url, params, cursor)
+        if info is not None:
+            info["numFound"] = numFound
+        while True:
+            lastPage = nextCursor == cursor
+            if not lastPage and pool:
+                nextPage = pool.submit(getPageFromHAL, url, params, nextCursor)
+            for d in docs:
+                yield d
+            if lastPage:
+                break
+            cursor = nextCursor
+            if pool:
+                docs, nextCursor, _ = nextPage.result()
+            else:
+                docs, nextCursor, _ = getPageFromHAL(url, params, cursor)
+    finally:
+        if pool:
+            pool.shutdown(wait=True)
+
+
 def checkDoiInHAL(doi):
     """ Check if DOI is already in HAL """
     # request
@@ -118,6 +263,192 @@ def checkDoiInHAL(doi):
     return return_code
 
 
+def splitValues(values, chunkSize=dflt.DEFAULT_BULK_CHUNK_SIZE):
+    """Split values in chunks for bulk queries (limited in number and query length)"""
+    chunks = list()
+    current = list()
+    length = 0
+    for v in values:
+        lv = len(formatQueryValues([v])) + len(" OR ")
+        if current and (
+            len(current) >= chunkSize or length + lv > dflt.DEFAULT_MAX_QUERY_LENGTH
+        ):
+            chunks.append(current)
+            current = list()
+            length = 0
+        current.append(v)
+        length += lv
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def getHalIdsFromDois(dois):
+    """Get HAL ids of documents from a chunk of DOIs (using one OR'ed query)"""
+    rows = len(dois) * dflt.DEFAULT_BULK_ROWS_FACTOR
+    dataFromHAL = getDataFromHAL(
+        txtsearch=dois if len(dois) > 1 else dois[0],
+        typeI="doi",
+        typeDB="article",
+        typeR="json",
+        returnFields="doiId_id,halId_s",
+        rows=rows,
+    )
+    halIds = dict.fromkeys(dois)
+    if len(dois) == 1:
+        if dataFromHAL:
+            halIds[dois[0]] = dataFromHAL[0].get("halId_s")
+        return halIds
+    # too many results: split the chunk to get all of them
+    if len(dataFromHAL) >= rows:
+        Logger.debug("Too many results for bulk DOIs query: split it")
+        halIds.update(getHalIdsFromDois(dois[: len(dois) // 2]))
+        halIds.update(getHalIdsFromDois(dois[len(dois) // 2 :]))
+        return halIds
+    halIds.update(dispatchHalIds(dois, dataFromHAL))
+    return halIds
+
+
+def dispatchHalIds(dois, dataFromHAL):
+    """Dispatch HAL ids of results of a bulk query on DOIs (DOI are case insensitive)"""
+    halIds = dict.fromkeys(dois)
+    lowerDois = dict()
+    for d in dois:
+        lowerDois.setdefault(d.lower(), list()).append(d)
+    for data in dataFromHAL:
+        found = data.get("doiId_id", [])
+        if type(found) is not list:
+            found = [found]
+        for f in found:
+            for d in lowerDois.get(str(f).lower(), []):
+                if halIds[d] is None:
+                    halIds[d] = data.get("halId_s")
+    return halIds
+
+
+def checkDoisInHAL(
+    dois, chunkSize=dflt.DEFAULT_BULK_CHUNK_SIZE, workers=dflt.DEFAULT_HTTP_WORKERS
+):
+    """Check if DOIs are already in HAL (return HAL id or None for each DOI)"""
+    dois = list(dict.fromkeys(dois))
+    chunks = splitValues(dois, chunkSize)
+    Logger.debug("Check {} DOIs in HAL ({} queries)".format(len(dois), len(chunks)))
+    halIds = dict.fromkeys(dois)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(getHalIdsFromDois, chunks):
+            halIds.update(found)
+    return halIds
+
+
+def getHalIdFromTEI(biblFull):
+    """Get HAL id of a document from its biblFull element"""
+    idno = biblFull.find("{0}publicationStmt/{0}idno[@type='halId']".format(TEI))
+    if idno is None:
+        idno = biblFull.find(".//{}idno[@type='halId']".format(TEI))
+    if idno is None or not idno.text:
+        return None
+    return idno.text.strip()
+
+
+def buildTEI(tei, teiHeader, biblFull):
+    """Build TEI of a single document (biblFull moved in it) with header of tei"""
+    root = etree.Element(tei.tag, attrib=dict(tei.attrib), nsmap=tei.nsmap)
+    if teiHeader is not None:
+        root.append(copy.deepcopy(teiHeader))
+    body = etree.SubElement(etree.SubElement(root, TEI + "text"), TEI + "body")
+    etree.SubElement(body, TEI + "listBibl").append(biblFull)
+    return root
+
+
+def splitTEI(tei):
+    """Split TEI of many documents: yield HAL id and TEI of each document"""
+    teiHeader = tei.find(TEI + "teiHeader")
+    for biblFull in list(tei.iterfind(".//{0}listBibl/{0}biblFull".format(TEI))):
+        yield getHalIdFromTEI(biblFull), buildTEI(tei, teiHeader, biblFull)
+
+
+def readTEIEvents(parser, state):
+    """Read events of TEI pull parser: yield HAL id and TEI of each completed document"""
+    for _, elem in parser.read_events():
+        if elem.tag == TEI + "teiHeader":
+            state["teiHeader"] = copy.deepcopy(elem)
+            elem.clear()
+        else:
+            # moving biblFull out of parsed tree keeps it empty
+            tei = elem.getroottree().getroot()
+            yield getHalIdFromTEI(elem), buildTEI(tei, state.get("teiHeader"), elem)
+
+
+def parseTEIStream(chunks):
+    """Parse TEI of many documents from chunks of bytes: yield HAL id and TEI of each document"""
+    parser = etree.XMLPullParser(
+        events=("end",), tag=(TEI + "teiHeader", TEI + "biblFull")
+    )
+    state = dict()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from readTEIEvents(parser, state)
+    parser.close()
+    yield from readTEIEvents(parser, state)
+
+
+def iterTEIFromHAL(
+    txtsearch=None,
+    typeI=None,
+    typeDB="article",
+    url=dflt.HAL_API_SEARCH_URL,
+    rows=dflt.DEFAULT_MAX_NUMBER_RESULTS_QUERY,
+):
+    """Search in HAL archives and stream TEI: yield HAL id and TEI of each document"""
+    url = getURLFromDB(typeDB, url)
+    params = {"q": getQuery(txtsearch, typeI), "wt": "xml-tei", "rows": rows}
+    with session.get(url, params=params, stream=True) as response:
+        if response.status_code != 200:
+            Logger.error(
+                "Failed to get TEI. Status code: {}".format(response.status_code)
+            )
+            return
+        yield from parseTEIStream(
+            response.iter_content(chunk_size=dflt.DEFAULT_STREAM_CHUNK_SIZE)
+        )
+
+
+def getTEIsFromChunk(halIds):
+    """Get TEI of a chunk of documents (using one OR'ed query): {halId: TEI}"""
+    wanted = set(halIds)
+    return {
+        h: t
+        for h, t in iterTEIFromHAL(
+            txtsearch=halIds if len(halIds) > 1 else halIds[0],
+            typeI="docId",
+            typeDB="article",
+            rows=len(halIds),
+        )
+        if h in wanted
+    }
+
+
+def iterTEIsFromHAL(
+    halIds, chunkSize=dflt.DEFAULT_TEI_CHUNK_SIZE, workers=dflt.DEFAULT_HTTP_WORKERS
+):
+    """Download TEI of documents in HAL: yield HAL id and TEI of each found document"""
+    halIds = list(dict.fromkeys(halIds))
+    chunks = splitValues(halIds, chunkSize)
+    Logger.debug("Download {} TEI ({} queries)".format(len(halIds), len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(getTEIsFromChunk, chunks):
+            yield from found.items()
+
+
+def getTEIsFromHAL(
+    halIds, chunkSize=dflt.DEFAULT_TEI_CHUNK_SIZE, workers=dflt.DEFAULT_HTTP_WORKERS
+):
+    """Download TEI of documents in HAL (return TEI or None for each HAL id)"""
+    teis = dict.fromkeys(halIds)
+    teis.update(iterTEIsFromHAL(halIds, chunkSize, workers))
+    return teis
+
+
 def choose_from_results(
     results, forceSelection=False, maxNumber=dflt.DEFAULT_MAX_NUMBER_RESULTS
 ):
@@ -177,13 +508,16 @@ def choose_from_results(
     return None
 
 
-def addFileInXML(inTree, filePath, hal_id="upload"):
+def addFileInXML(inTree, filePath, hal_id="upload", copyFile=True):
     """Add new imported file in XML"""
     if hal_id == None:
         hal_id = "upload"
     newFilename = dflt.DEFAULT_UPLOAD_FILE_NAME_PDF.format(hal_id)
-    Logger.debug("Copy original file to new one: {} -> {}".format(filePath, newFilename))
-    shutil.copyfile(filePath, newFilename)
+    if copyFile:
+        Logger.debug(
+            "Copy original file to new one: {} -> {}".format(filePath, newFilename)
+        )
+        shutil.copyfile(filePath, newFilename)
     # find section to add file
     inS = inTree.find(".//editionStmt", inTree.nsmap)
     if inS is None:
@@ -208,23 +542,111 @@ def addFileInXML(inTree, filePath, hal_id="upload"):
     return newFilename
 
 
+def getZIPBuffer():
+    """Get buffer of a ZIP archive (in memory, anonymous temporary file if too large)"""
+    return tempfile.SpooledTemporaryFile(max_size=dflt.DEFAULT_ZIP_SPOOL_SIZE)
+
+
+def addPDFInZIP(
+    z,
+    pdf_file_path,
+    pdfName=None,
+    compression=dflt.DEFAULT_ZIP_PDF_COMPRESSION,
+    compresslevel=dflt.DEFAULT_ZIP_PDF_COMPRESSLEVEL,
+):
+    """Add PDF file in ZIP archive (read from its original path, stored by default)"""
+    z.write(
+        pdf_file_path,
+        pdfName or os.path.basename(pdf_file_path),
+        compress_type=compression,
+        compresslevel=compresslevel,
+    )
 
 
-def buildZIP(xml_file_path, pdf_file_path):
-    """Build ZIP archive for HAL deposit (containing XML and PDF)"""
-    # create temporary directory
-    tmp_dir_path = tempfile.mkdtemp()
-    Logger.debug("Create temporary directory: {}".format(tmp_dir_path))
-    xml_file_dst = os.path.join(tmp_dir_path, dflt.DEFAULT_UPLOAD_FILE_NAME_XML)
-    Logger.debug("Copy XML file: {} -> {}".format(xml_file_path, xml_file_dst))
-    shutil.copy(xml_file_path, xml_file_dst)
-    Logger.debug("Copy PDF file: {} -> {}".format(pdf_file_path, tmp_dir_path))
-    shutil.copy(pdf_file_path, tmp_dir_path)
-    # build zip archive
-    archivePath = dflt.DEFAULT_UPLOAD_FILE_NAME_ZIP
-    Logger.debug("Create zip archive: {}".format(archivePath + ".zip"))
-    shutil.make_archive(archivePath, "zip", tmp_dir_path)
-    return archivePath + ".zip"
+def buildZIP(xml_file_path, pdf_file_path, pdfName=None, **kwargs):
+    """Build ZIP archive for HAL deposit (containing XML and PDF): return archive as a
+    file object (kwargs: compression of PDF, see addPDFInZIP)"""
+    archive = getZIPBuffer()
+    Logger.debug("Create zip archive from {} and {}".format(xml_file_path, pdf_file_path))
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.write(xml_file_path, dflt.DEFAULT_UPLOAD_FILE_NAME_XML)
+        addPDFInZIP(z, pdf_file_path, pdfName, **kwargs)
+    archive.seek(0)
+    return archive
+
+
+def savePayload(file, dirPath=None):
+    """Save payload given as a file object in a temporary file (closed once saved):
+    return its path"""
+    fd, path = tempfile.mkstemp(suffix=".zip", dir=dirPath)
+    with file, os.fdopen(fd, "wb") as f:
+        file.seek(0)
+        shutil.copyfileobj(file, f)
+    return path
+
+
+class PayloadStream:
+    """Payload streamed by chunks (path of a file, file object or generator of bytes):
+    length sent as Content-Length (chunked transfer if unknown) and progress reported
+    to a callback progress(sent, total, rate) with rate in bytes/s"""
+
+    def __init__(
+        self,
+        source,
+        length=None,
+        progress=None,
+        chunkSize=dflt.DEFAULT_UPLOAD_CHUNK_SIZE,
+    ):
+        if isinstance(source, str):
+            source = open(source, "rb")
+        self.source = source
+        self.origin = None
+        if hasattr(source, "seek"):
+            self.origin = source.tell()
+            # end read with tell (seek of spooled files returns None before 3.11)
+            source.seek(0, os.SEEK_END)
+            length = source.tell() - self.origin
+            source.seek(self.origin)
+        self.length = length
+        self.progress = progress
+        self.chunkSize = chunkSize
+
+    @property
+    def len(self):
+        """Length of payload read by requests (None: unknown, chunked transfer)"""
+        return self.length
+
+    def __iter__(self):
+        chunks = self.source
+        if hasattr(self.source, "read"):
+            chunks = iter(lambda: self.source.read(self.chunkSize), b"")
+        sent = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            # reported when handed to transport (not iterated further once length
+            # is reached by some clients)
+            sent += len(chunk)
+            if self.progress:
+                duration = time.perf_counter() - start
+                self.progress(sent, self.length, sent / duration if duration else 0.0)
+            yield chunk
+
+    def seek(self, offset):
+        """Rewind payload to send it again (retry)"""
+        if self.origin is None:
+            raise io.UnsupportedOperation("generated payload cannot be sent again")
+        self.source.seek(self.origin + offset)
+
+    def close(self):
+        """Close source of payload"""
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def preparePayload(
@@ -235,19 +657,20 @@ def preparePayload(
     hal_id=None,
     options=dict(),
 ):
-    """Prepare payload for HAL deposit"""
+    """Prepare payload for HAL deposit: return file to upload (path of XML file or ZIP
+    archive as a file object) and header"""
     # clean XML
     if pdf_path:
         # m.cleanXML(tei_content, ".//idno[@type='stamp']")
-        # declare new file as target in xml
-        newPDF = addFileInXML(tei_content, pdf_path, hal_id)
+        # declare new file as target in xml (PDF read from its path when zipped)
+        newPDF = addFileInXML(tei_content, pdf_path, hal_id, copyFile=False)
     # write xml file
     xml_file_path = os.path.join(dirPath, xmlFileName)
     m.writeXML(tei_content, xml_file_path)
     sendfile = xml_file_path
     # build zip file
     if pdf_path:
-        sendfile = buildZIP(xml_file_path, newPDF)
+        sendfile = buildZIP(xml_file_path, pdf_path, newPDF)
 
     # create header
     header = dict()
@@ -287,66 +710,60 @@ def preparePayload(
     return sendfile, header
 
 
-def upload2HAL(file, headers, credentials, server="preprod"):
-    """Upload to HAL"""
-    Logger.info("Upload to HAL")
-    Logger.debug("File: {}".format(file))
-    Logger.debug("Headers: {}".format(headers))
-
+def getSWORDUrl(server="preprod", hal_id=None):
+    """Get SWORD API url of server (url of a record to update it if hal_id is provided)"""
+    url = dflt.HAL_SWORD_API_URL
     if server == "preprod":
         url = dflt.HAL_SWORD_PRE_API_URL
-    else:
-        url = dflt.HAL_SWORD_API_URL
+    if hal_id:
+        url = "{}/{}".format(url.rstrip("/").rsplit("/", 1)[0], hal_id)
+    return url
 
-    Logger.debug("Upload via {}".format(url))
-    # read data to sent
-    with open(file, "rb") as f:
-        data = f.read()
-
-    res = requests.post(
-        url=url,
-        data=data,
-        headers=headers,
-        auth=HTTPBasicAuth(credentials["login"], credentials["passwd"]),
-    )
-    
-     
-    hal_id = res.status_code
-    if res.status_code == 201:
+
+def getHalIdFromResponse(status_code, text):
+    """Read SWORD response: return HAL id (or status code if failed)"""
+    hal_id = status_code
+    if status_code == 200:
+        Logger.info("Successfully update in HAL.")
+        # read return message
+        xmlResponse = etree.fromstring(text.encode("utf-8"))
+        elem = xmlResponse.findall("id", xmlResponse.nsmap)
+        hal_id = elem[0].text
+        Logger.debug("HAL ID: {}".format(elem[0].text))
+    elif status_code == 201:
         Logger.info("Successfully upload to HAL.")
         # read return message
-        xmlResponse = etree.fromstring(res.text.encode("utf-8"))
+        xmlResponse = etree.fromstring(text.encode("utf-8"))
         elem = xmlResponse.findall("id", xmlResponse.nsmap)
         hal_id = elem[0].text
         Logger.debug("HAL ID: {}".format(elem[0].text))
-    elif res.status_code == 202:
+    elif status_code == 202:
         Logger.info("Note accepted by HAL.")
         # read return message
-        xmlResponse = etree.fromstring(res.text.encode("utf-8"))
+        xmlResponse = etree.fromstring(text.encode("utf-8"))
         elem = xmlResponse.findall("id", xmlResponse.nsmap)
         hal_id = elem[0].text
         Logger.debug("HAL ID: {}".format(elem[0].text))
-    elif res.status_code == 401:
+    elif status_code == 401:
         Logger.info("Authentification refused - check credentials")
     else:
         # read error message
-        xmlResponse = etree.fromstring(res.text.encode("utf-8"))
+        xmlResponse = etree.fromstring(text.encode("utf-8"))
         elem = xmlResponse.findall(
             dflt.DEFAULT_ERROR_DESCRIPTION_SWORD_LOC, xmlResponse.nsmap
         )
-        Logger.error("Failed to upload. Status code: {}".format(res.status_code))
-        if len(elem) > 0:
-            json_ret = list()
-            for i in elem:
-                content = None
-                try:
-                    content = json.loads(i.text)
-                except:
-                    pass
-                if content is None:
-                    content = i.text
-                json_ret.append(content)
-                Logger.warning("Error: {}".format(i.text))
+        Logger.error("Failed to upload. Status code: {}".format(status_code))
+        json_ret = list()
+        for i in elem:
+            content = None
+            try:
+                content = json.loads(i.text)
+            except:
+                pass
+            if content is None:
+                content = i.text
+            json_ret.append(content)
+            Logger.warning("Error: {}".format(i.text))
         # extract hal_id
         for j in json_ret:
             if type(j) is dict:
@@ -355,9 +772,50 @@ def upload2HAL(file, headers, credentials, server="preprod"):
                     Logger.warning('Duplicate entry: {}'.format(hal_id))
     return hal_id
 
+
+def upload2HAL(
+    file,
+    headers,
+    credentials,
+    server="preprod",
+    hal_id=None,
+    progress=None,
+    length=None,
+    withStatus=False,
+):
+    """Upload to HAL (update of record hal_id if provided): payload streamed from path
+    of a file, file object or generator of bytes (closed once sent, see PayloadStream
+    for progress and length of generated payload); return HAL id (or status code if
+    failed), with status code of response first if withStatus"""
+    Logger.info("Upload to HAL")
+    Logger.debug("File: {}".format(file))
+    Logger.debug("Headers: {}".format(headers))
+
+    url = getSWORDUrl(server, hal_id)
+
+    Logger.debug("Upload via {}".format(url))
+    # new record posted, existing one replaced
+    send = session.put if hal_id else session.post
+    # data streamed by chunks (not loaded in memory)
+    with PayloadStream(file, length, progress) as data:
+        res = send(
+            url,
+            data=data,
+            headers=headers,
+            auth=session.getAuth(credentials),
+        )
+    hal_id = getHalIdFromResponse(res.status_code, res.text)
+    if withStatus:
+        return res.status_code, hal_id
+    return hal_id
+
+
 def manageError(e):
     """ Manage return code from upload2HAL """
-    if e == 201:
+    if e == 200:
+        # Logger.info("Successfully update in HAL.")
+        pass
+    elif e == 201:
         # Logger.info("Successfully upload to HAL.")
         pass
     elif e == 202:
@@ -371,6 +829,7 @@ def manageError(e):
         e = os.EX_SOFTWARE
     return e
 
+
 def setTitles(nInTree, titles, subTitles=None):
     """Add title(s) and subtitle(s) in XML (and specified language)"""
     if subTitles:
@@ -381,14 +840,14 @@ def setTitles(nInTree, titles, subTitles=None):
     for k, n in listTitles.items():
         if type(n) == dict:
             for l, t in n.items():
-                nTitle.append(etree.SubElement(nInTree, TEI + "title"))
+                nTitle.append(etree.SubElement(nInTree, TAGS["title"]))
                 if k == "subtitles":
                     nTitle[-1].set("type", "sub")
                 nTitle[-1].set(dflt.DEFAULT_XML_LANG + "lang", l)
                 nTitle[-1].text = t
         else:
             Logger.warning("No language for title: force english")
-            nTitle.append(etree.SubElement(nInTree, TEI + "title"))
+            nTitle.append(etree.SubElement(nInTree, TAGS["title"]))
             if k == "subtitles":
                 nTitle[-1].set("type", "sub")
             nTitle[-1].set(dflt.DEFAULT_XML_LANG + "lang", "en")
@@ -405,13 +864,38 @@ def getNameFormated(a):
     return l
 
 
-def setAuthors(inTree, authors):
-    """Add authors in XML (and linked to affiliation)"""
+def getAffiliationRefs(author, resolved, refs):
+    """Get references to structures of an author (refs: cache of references shared by
+    authors, built once per structure)"""
+    for key in ("affiliation", "affiliationHAL"):
+        list_aff = author.get(key, None)
+        if not list_aff:
+            continue
+        if type(list_aff) is not list:
+            list_aff = [list_aff]
+        for aff in list_aff:
+            ref = refs.get((key, aff))
+            if ref is None:
+                if key == "affiliationHAL":
+                    ref = "#struct-" + re.sub("^#struct-", "", aff)
+                elif aff in resolved:
+                    ref = "#struct-{}".format(resolved[aff][0])
+                else:
+                    ref = "#localStruct-" + aff
+                refs[(key, aff)] = ref
+            yield ref
+
+
+def setAuthors(inTree, authors, resolved=None):
+    """Add authors in XML (and linked to affiliation, HAL structure if resolved)"""
+    if resolved is None:
+        resolved = dict()
+    refs = dict()
     nAuthors = list()
     for a in authors:
         # format name
         nameFormated = getNameFormated(a)
-        nAuthors.append(etree.SubElement(inTree, TEI + "author"))
+        nAuthors.append(etree.SubElement(inTree, TAGS["author"]))
         # roles: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:relator&fl=*&wt=xml
         if "role" in a:
             nAuthors[-1].set("role", a["role"])
@@ -422,68 +906,113 @@ def setAuthors(inTree, authors):
                 )
             )
             nAuthors[-1].set("role", "aut")
-        persName = etree.SubElement(nAuthors[-1], TEI + "persName")
-        forename = etree.SubElement(persName, TEI + "forename")
+        persName = etree.SubElement(nAuthors[-1], TAGS["persName"])
+        forename = etree.SubElement(persName, TAGS["forename"])
         forename.set("type", "first")
         forename.text = nameFormated[0]
         if len(nameFormated) > 2:
-            forename = etree.SubElement(persName, TEI + "forename")
+            forename = etree.SubElement(persName, TAGS["forename"])
             forename.set("type", "middle")
             forename.text = nameFormated[1]
-        surname = etree.SubElement(persName, TEI + "surname")
+        surname = etree.SubElement(persName, TAGS["surname"])
         surname.text = nameFormated[-1]
         if a.get("email", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "email")
+            idA = etree.SubElement(nAuthors[-1], TAGS["email"])
             idA.text = a["email"]
         if a.get("idhal", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", "idhal")
             idA.text = a["idhal"]
         if a.get("halauthor", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", "halauthor")
             idA.text = a["halauthor"]
         if a.get("url", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "ptr")
+            idA = etree.SubElement(nAuthors[-1], TAGS["ptr"])
             idA.set("type", "url")
             idA.set("target", a["url"])
         if a.get("orcid", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", dflt.ID_ORCID_URL)
             idA.text = a["orcid"]
         if a.get("arxiv", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", dflt.ID_ARXIV_URL)
             idA.text = a["arxiv"]
         if a.get("researcherid", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", dflt.ID_RESEARCHERID_URL)
             idA.text = a["researcherid"]
         if a.get("idref", None):
-            idA = etree.SubElement(nAuthors[-1], TEI + "idno")
+            idA = etree.SubElement(nAuthors[-1], TAGS["idno"])
             idA.set("type", dflt.ID_IDREF_URL)
             idA.text = a["idref"]
-        if a.get("affiliation", None):
-            if type(a["affiliation"]) is not list:
-                list_aff = [a["affiliation"]]
-            else:
-                list_aff = a["affiliation"]
-            for aff in list_aff:
-                nAff = etree.SubElement(nAuthors[-1], TEI + "affiliation")
-                nAff.set("ref", "#localStruct-" + aff)
-        if a.get("affiliationHAL", None):
-            if type(a["affiliationHAL"]) is not list:
-                list_aff = [a["affiliationHAL"]]
-            else:
-                list_aff = a["affiliationHAL"]
-            for aff in list_aff:
-                nAff = etree.SubElement(nAuthors[-1], TEI + "affiliation")
-                idStrut = aff
-                idStruct = re.sub("^#struct-", "", idStrut)
-                nAff.set("ref", "#struct-" + idStruct)
+        # affiliations (each structure once per author)
+        seen = set()
+        for ref in getAffiliationRefs(a, resolved, refs):
+            if ref not in seen:
+                seen.add(ref)
+                etree.SubElement(nAuthors[-1], TAGS["affiliation"]).set("ref", ref)
     return nAuthors
 
 
+## identifiers of authors filled in from local referential (JSON key -> field)
+AUTHOR_IDS = {"idhal": "idHal_s", "halauthor": "docid", "orcid": "orcidId_s"}
+
+
+def getAuthorStructures(author, resolved=None):
+    """Get HAL IDs of structures of an author (HAL affiliations and resolved ones)"""
+    structures = list()
+    for key in ("affiliation", "affiliationHAL"):
+        values = author.get(key, None) or []
+        if type(values) is not list:
+            values = [values]
+        for v in values:
+            if key == "affiliationHAL":
+                structures.append(re.sub("^#struct-", "", str(v)))
+            elif resolved and v in resolved:
+                structures.append(str(resolved[v][0]))
+    return structures
+
+
+def enrichAuthors(authors, resolved=None):
+    """Fill in missing identifiers of authors (idHAL, HAL author ID and ORCID) from local
+    referential (see hal2ref): return authors (copies if enriched, ambiguous ones kept)"""
+    if not authors or refHAL.getIndex("author") is None:
+        return authors
+    enriched = list()
+    for a in authors:
+        if all(a.get(k, None) for k in AUTHOR_IDS):
+            enriched.append(a)
+            continue
+        found, info = refHAL.findAuthor(
+            a.get("firstname", None),
+            a.get("lastname", None),
+            a.get("orcid", None),
+            getAuthorStructures(a, resolved),
+        )
+        name = "{} {}".format(a.get("firstname", None), a.get("lastname", None))
+        if found is None:
+            if info:
+                Logger.warning(
+                    "Ambiguous author {}: {} HAL author(s) ({}), not enriched".format(
+                        name,
+                        len(info),
+                        ", ".join(str(c.get("idHal_s") or c["docid"]) for c in info),
+                    )
+                )
+            enriched.append(a)
+            continue
+        Logger.info("Author {} found from {}: {}".format(name, info, found["docid"]))
+        a = dict(a)
+        for key, field in AUTHOR_IDS.items():
+            value = refHAL.getValues(found.get(field, None))
+            if not a.get(key, None) and value:
+                a[key] = str(value[0])
+        enriched.append(a)
+    return enriched
+
+
 def setLicence(inTree, licence):
     """Set licence in XML"""
     availability = etree.SubElement(inTree, TEI + "availability")
@@ -511,94 +1040,8 @@ def setStamps(inTree, stamps):
     return nStamps
 
 
-def getAudience(notes):
-    # see all audience codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:audience&fl=*&wt=xml
-    # default audience
-    audienceFlag = notes.get("audience", dflt.DEFAULT_AUDIENCE)
-    if str(audienceFlag).lower().startswith("international"):
-        audienceFlag = "2"
-    elif str(audienceFlag).lower().startswith("national"):
-        audienceFlag = "3"
-    if (
-        str(audienceFlag) != "1"
-        and str(audienceFlag) != "2"
-        and str(audienceFlag) != "3"
-    ):
-        Logger.warning(
-            "Unknown audience: force default ({})".format(dflt.DEFAULT_AUDIENCE)
-        )
-        audienceFlag = dflt.DEFAULT_AUDIENCE
-    return audienceFlag
-
-
-def getInvited(notes):
-    # see all invited codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:invitedCommunication&fl=*&wt=xml
-    # default invited
-    invitedFlag = notes.get("invited", dflt.DEFAULT_INVITED)
-    if str(invitedFlag).lower().startswith(("o", "y", "1", "t")):
-        invitedFlag = "1"
-    elif str(invitedFlag).lower().startswith(("n", "0", "f")):
-        invitedFlag = "0"
-    if str(invitedFlag) != "0" and str(invitedFlag) != "1":
-        Logger.warning(
-            "Unknown invited: force default ({})".format(dflt.DEFAULT_INVITED)
-        )
-        invitedFlag = dflt.DEFAULT_INVITED
-    return invitedFlag
-
-
-def getPopular(notes):
-    # see all popular levels codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:popularLevel&fl=*&wt=xml
-    # default popular level
-    popFlag = notes.get("popular", dflt.DEFAULT_POPULAR)
-    if str(popFlag).lower().startswith(("o", "y", "1", "t")):
-        popFlag = "1"
-    elif str(popFlag).lower().startswith(("n", "0", "f")):
-        popFlag = "0"
-    if str(popFlag) != "0" and str(popFlag) != "1":
-        Logger.warning(
-            "Unknown popular level: force default ({})".format(dflt.DEFAULT_POPULAR)
-        )
-        popFlag = dflt.DEFAULT_POPULAR
-    return popFlag
-
-
-def getPeer(notes):
-    # see all peer reviewing codes: hhttps://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:popularLevel&fl=*&wt=xml
-    # default peer reviewing
-    peerFlag = notes.get("peer", dflt.DEFAULT_PEER)
-    if str(peerFlag).lower().startswith(("o", "y", "1", "t")):
-        peerFlag = "1"
-    elif str(peerFlag).lower().startswith(("n", "0", "f")):
-        peerFlag = "0"
-    if str(peerFlag) != "0" and str(peerFlag) != "1":
-        Logger.warning(
-            "Unknown peer reviewing type: force default ({})".format(dflt.DEFAULT_PEER)
-        )
-        peerFlag = dflt.DEFAULT_PEER
-    return peerFlag
-
-
-def getProceedings(notes):
-    # see all peer reviewing codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:proceedings&fl=*&wt=xml
-    # default proceedings
-    proFlag = notes.get("proceedings", dflt.DEFAULT_PROCEEDINGS)
-    if str(proFlag).lower().startswith(("o", "y", "1", "t")):
-        proFlag = "1"
-    elif str(proFlag).lower().startswith(("n", "0", "f")):
-        proFlag = "0"
-    if str(proFlag) != "0" and str(proFlag) != "1":
-        Logger.warning(
-            "Unknown proceedings status: force default ({})".format(
-                dflt.DEFAULT_PROCEEDINGS
-            )
-        )
-        proFlag = dflt.DEFAULT_PROCEEDINGS
-    return proFlag
-
-
 def setNotes(inTree, notes):
-    """Set notes in XML
+    """Set notes in XML (see MAPPING)
     NOTE: additionnal notes are supported by HAL but not included here
 
     INCLUDED:
@@ -619,40 +1062,9 @@ def setNotes(inTree, notes):
         <note type="pastel_library" n="7"/><!-- %%pastel_library : http://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:pastel_library&fl=*&wt=xml - -> 
 
     """
-    nNotes = list()
     # add element for notes
     idN = etree.SubElement(inTree, TEI + "notesStmt")
-    # define audience
-    nNotes.append(etree.SubElement(idN, TEI + "note"))
-    nNotes[-1].set("type", "audience")
-    nNotes[-1].set("n", getAudience(notes))
-    # define invited
-    nNotes.append(etree.SubElement(idN, TEI + "note"))
-    nNotes[-1].set("type", "invited")
-    nNotes[-1].set("n", getInvited(notes))
-    # define popular
-    nNotes.append(etree.SubElement(idN, TEI + "note"))
-    nNotes[-1].set("type", "popular")
-    nNotes[-1].set("n", getPopular(notes))
-    # define peer
-    nNotes.append(etree.SubElement(idN, TEI + "note"))
-    nNotes[-1].set("type", "peer")
-    nNotes[-1].set("n", getPeer(notes))
-    # define proceedings
-    nNotes.append(etree.SubElement(idN, TEI + "note"))
-    nNotes[-1].set("type", "proceedings")
-    nNotes[-1].set("n", getProceedings(notes))
-
-    if notes.get("comment", None):
-        nNotes.append(etree.SubElement(idN, TEI + "note"))
-        nNotes[-1].set("type", "commentary")
-        nNotes[-1].text = notes.get("comment")
-    if notes.get("description", None):
-        nNotes.append(etree.SubElement(idN, TEI + "note"))
-        nNotes[-1].set("type", "description")
-        nNotes[-1].text = notes.get("description")
-
-    return nNotes
+    return setMapped(idN, "notes", notes)
 
 
 def setAbstract(inTree, abstracts):
@@ -661,7 +1073,7 @@ def setAbstract(inTree, abstracts):
         Logger.warning("No provided abstract")
         return None
     nAbstract = list()
-    if type(abstracts) == str():
+    if type(abstracts) == str:
         Logger.warning("No language for abstract: force english")
         nAbstract.append(etree.SubElement(inTree, TEI + "abstract"))
         nAbstract[-1].set(dflt.DEFAULT_XML_LANG + "lang", "en")
@@ -683,79 +1095,49 @@ def setID(inTree, ids, typeId):
     if ids:
         idT = etree.SubElement(inTree, TEI + "idno")
         idT.set("type", typeId)
-        idT.text = ids
+        idT.text = str(ids)
     return idT
 
 
+def selectJournalId(journal, results):
+    """Select journal ID from results of search in HAL journal referential"""
+    idJournal = None
+    if len(results) == 1:
+        idJournal = results[0]["docid"]
+    elif len(results) > 1:
+        Logger.debug("Identify write journal ID in HAL")
+        listJ = [j["title_s"] for j in results]
+        jName = difflib.get_close_matches(journal, listJ)
+        if jName:
+            ixJ = listJ.index(jName[0])
+            idJournal = results[ixJ]["docid"]
+    return idJournal
+
+
+def getJournalIdFromHAL(journal):
+    """Get HAL ID of a journal from its title"""
+    idJ = getDataFromHAL(
+        txtsearch=journal,
+        typeDB="journal",
+        typeI="title",
+        returnFields="docid,title_s",
+    )
+    if not idJ:
+        idJ = getDataFromHAL(
+            txtsearch=journal,
+            typeDB="journal",
+            typeI="title_approx",
+            returnFields="docid,title_s",
+        )
+    return selectJournalId(journal, idJ)
+
+
 def setIDS(inTree, data):
-    """Set all IDs"""
-    lID = []
-    if data.get("nnt", None):
-        lID.append(setID(inTree, data.get("nnt"), "nnt"))
-    if data.get("isbn", None):
-        if not isbn.is_valid(data.get("isbn")):
-            Logger.warning("ISBN not valid: {}, continue...".format(data.get("isbn")))
-        lID.append(setID(inTree, data.get("isbn"), "isbn"))
-    if data.get("patentNumber", None):
-        lID.append(setID(inTree, data.get("patentNumber"), "patentNumber"))
-    if data.get("reportNumber", None):
-        lID.append(setID(inTree, data.get("reportNumber"), "reportNumber"))
-    if data.get("localRef", None):
-        lID.append(setID(inTree, data.get("localRef"), "localRef"))
-    if data.get("halJournalId", None) or not data.get("journal", None) == "none":
-        lID.append(setID(inTree, data.get("halJournalId"), "halJournalId"))
-    if data.get("journal", None):
-        lID.append(setID(inTree, data.get("j"), "j"))
-        if data.get("halJournalId", None) is None:
-            idJ = getDataFromHAL(
-                txtsearch=data.get("journal"),
-                typeDB="journal",
-                typeI="title",
-                returnFields="docid,title_s",
-            )
-            if idJ is None:
-                idJ = getDataFromHAL(
-                    textsearch=data.get("journal"),
-                    typeDB="journal",
-                    typeI="title_approx",
-                    returnFields="docid,title_s",
-                )
-            # adapt id if many are found
-            idJournal = None
-            if len(idJ) > 1:
-                Logger.debug("Identify write journal ID in HAL")
-                listJ = [j["title_s"] for j in idJ]
-                jName = difflib.get_close_matches(data.get("journal"), listJ)
-                ixJ = listJ.index(jName[0])
-                idJournal = idJ[ixJ]["docid"]
-            if idJournal:
-                Logger.debug("Jounal ID found: {}".format(idJournal))
-                lID.append(setID(inTree, idJournal, "halJournalId"))
-    if data.get("issn", None):
-        if not issn.is_valid(data.get("issn")):
-            Logger.warning("ISSN not valid: {}, continue...".format(data.get("issn")))
-    lID.append(setID(inTree, data.get("issn"), "issn"))
-    if data.get("eissn", None):
-        if not issn.validate(data.get("eissn")):
-            Logger.warning("eISSN not valid: {}, continue...".format(data.get("eissn")))
-    lID.append(setID(inTree, data.get("eissn"), "eissn"))
-    if data.get("j", None):
-        lID.append(inTree.SubElement(inTree, TEI + "title"))
-        lID[-1].set("level", "j")
-        lID[-1].text = data.get("j")
-    if data.get("m", None):
-        lID.append(inTree.SubElement(inTree, TEI + "title"))
-        lID[-1].set("level", "m")
-        lID[-1].text = data.get("m")
-    if data.get("booktitle", None):
-        lID.append(inTree.SubElement(inTree, TEI + "title"))
-        lID[-1].set("level", "m")
-        lID[-1].text = data.get("booktitle")
-    if data.get("source", None):
-        lID.append(inTree.SubElement(inTree, TEI + "title"))
-        lID[-1].set("level", "m")
-        lID[-1].text = data.get("source")
-    return lID
+    """Set all IDs (see MAPPING)"""
+    if data is None:
+        Logger.debug("No IDs provided")
+        return None
+    return setMapped(inTree, "ID", data)
 
 
 def setConference(inTree, data):
@@ -814,11 +1196,11 @@ def setKeywords(inTree, keywords):
         keywords = [keywords]
     itK = etree.SubElement(inTree, TEI + "keywords")
     itK.set("scheme", "author")
-    if type(keywords) == list():
+    if type(keywords) == list:
         Logger.warning("No language for keywords: force english")
         nKeywords = list()
         for k in keywords:
-            nKeywords.append(etree.SubElement(inTree, TEI + "keyword"))
+            nKeywords.append(etree.SubElement(itK, TEI + "term"))
             nKeywords[-1].set(dflt.DEFAULT_XML_LANG + "lang", "en")
             nKeywords[-1].text = k
     else:
@@ -834,40 +1216,76 @@ def setKeywords(inTree, keywords):
 
 
 def setCodes(inTree, data):
-    """Set classification codes"""
+    """Set classification codes (see MAPPING)"""
     if data is None:
         Logger.warning("No classification codes provided")
         return None
-    #
-    idS = list()
-    if data.get("classification"):
-        idS.append(etree.SubElement(inTree, TEI + "classCode"))
-        idS[-1].set("scheme", "classification")
-        idS[-1].text = data.get("classification")
-    if data.get("acm"):
-        idS.append(etree.SubElement(inTree, TEI + "classCode"))
-        idS[-1].set("scheme", "acm")
-        idS[-1].text = data.get("acm")
-    if data.get("mesh"):
-        idS.append(etree.SubElement(inTree, TEI + "classCode"))
-        idS[-1].set("scheme", "mesh")
-        idS[-1].text = data.get("mesh")
-    if data.get("jel"):
-        idS.append(etree.SubElement(inTree, TEI + "classCode"))
-        idS[-1].set("scheme", "jel")
-        idS[-1].text = data.get("jel")
-    halDomains = data.get("halDomain")
-    if halDomains:
-        if type(halDomains) != list:
-            halDomains = [halDomains]
-        for id, d in enumerate(halDomains):
-            idS.append(etree.SubElement(inTree, TEI + "classCode"))
-            if id == 0:
-                idS[-1].set("scheme", "halDomain")
-            else:
-                idS[-1].set("scheme", "halDomain")
-            idS[-1].set("n", d)
-    return idS
+    return setMapped(inTree, "codes", data)
+
+
+## types of document (HAL typology: https://api.archives-ouvertes.fr/ref/doctype) and their aliases
+DOC_TYPES = {
+    "ART": ["article", "journalarticle", "articlejournal", "art"],  # Article dans une revue
+    "ARTREV": ["articlereview", "review", "artrev", "articlesynthese"],  # Article de synthèse
+    "DATAPAPER": ["datapaper", "paperdata"],  # Cdata paper
+    "BOOKREVIEW": ["bookreview", "compterendulecture"],  # Compte rendu de lecture
+    "COMM": ["comm", "conferencepaper", "communication", "conference"],  # Communication dans un congrés
+    "POSTER": ["poster"],  # poster de conference
+    "PROCEEDINGS": ["proceedings", "recueilcommunications"],  # Proceedings\/Recueil des communication
+    "ISSUE": ["issue", "specialissue", "numerospecial"],  # Numéro spécial
+    "OUV": ["ouv", "book", "monograph", "ouvrage"],  # Ouvrage
+    "CRIT": ["crit", "editioncritique"],  # Edition critique
+    "MANUAL": ["manual", "manuel"],  # Manuel
+    "SYNTOUV": ["syntouv", "ouvragesynthese"],  # Ouvrage de synthese
+    "DICTIONARY": ["dictionary", "dictionnaire", "encyclopedie"],  # Dictionnaire ou encyclopédie
+    "COUV": ["couv", "chapitre"],  # Chapitre d'ouvrage
+    "BLOG": ["blog", "articleblog"],  # Article de blog scientifique
+    "NOTICE": ["notice", "noticedictionary", "noticeencyclopede"],  # Notice de dictionnaire ou d'encyclopedie
+    "TRAD": ["trad", "traduction"],  # traduction
+    "PATENT": ["patent", "brevet"],  # brevet
+    "OTHER": ["other", "autre"],  # autre document scientifique
+    "UNDEFINED": ["undefined", "prepublication", "documenttravail"],  # pré-publication/document de travail
+    "PREPRINT": ["preprint"],  # preprint/pre-publication
+    "WORKINGPAPER": ["workingpaper"],  # working paper
+    "CREPORT": ["creport", "chapitrerapport", "chaptereport"],  # chapitre de rapport
+    "REPORT": ["report", "rapport"],  # rapport
+    "RESREPORT": ["resreport", "rapportrecherche", "researchreport"],  # rapport de recherche
+    "TECHREPORT": ["techreport", "rapporttechnique", "technicalreport"],  # rapport technique
+    "FUNDREPORT": ["fundreport", "rapportcontrat", "rapportprojet", "contractreport", "projectreport"],  # rapport de contrat/projet
+    "EXPERTREPORT": ["expertreport", "rapportexpertise"],  # rapport d'une expertise collective
+    "DMP": ["dmp", "plangestiondonnees"],  # data management plan/plan gestion de données
+    "THESE": ["these", "theses"],  # these
+    "HDR": ["hdr", "habilitation"],  # HDR
+    "LECTURE": ["lecture", "cours"],  # cours
+    "MEM": ["mem", "memoire"],  # mémoire étudiant
+    "IMG": ["img", "image", "picture"],  # image
+    "PHOTOGRAPHY": ["photography", "photo", "photographie"],  # photographie
+    "DRAWING": ["drawing", "dessin"],  # dessin
+    "ILLUSTRATION": ["illustration"],  # illustration
+    "GRAVURE": ["gravure"],  # gravure
+    "GRAPHICS": ["graphics"],  # image de synthèse
+    "VIDEO": ["video", "movie"],  # video
+    "SON": ["son", "sound"],  # son
+    "SOFTWARE": ["software", "logiciel"],  # logiciel
+    "PRESCONF": ["presconf"],  # Document associé à des manifestations scientifiques
+    "MEMLIC": ["memclic"],  #
+    "NOTE": ["note"],  # note de lecture
+    "OTHERREPORT": ["otherreport", "autrerapport"],  # autre rapport, séminaire...
+    "REPACT": ["repact", "rapportactivite"],  # rapport d'activité
+    "SYNTHESE": ["synthese", "notesynthese"],  # notes de synthèse
+}
+
+
+def buildAliases(table):
+    """Build dictionary alias -> value from dictionary value -> aliases (first declared wins)"""
+    aliases = dict()
+    for value, names in table.items():
+        for name in names:
+            aliases.setdefault(name, value)
+    return aliases
+
+
+DOC_TYPE_ALIASES = buildAliases(DOC_TYPES)
 
 
 def getTypeDoc(typeDoc):
@@ -875,178 +1293,16 @@ def getTypeDoc(typeDoc):
     if typeDoc is None:
         Logger.warning("No type of document provided")
         return None
-    typeDoc = typeDoc.lower()
-    if (
-        typeDoc == "article"
-        or typeDoc == "journalarticle"
-        or typeDoc == "articlejournal"
-        or typeDoc == "art"
-    ):  # Article dans une revue
-        return "ART"
-    elif (
-        typeDoc == "articlereview"
-        or typeDoc == "review"
-        or typeDoc == "artrev"
-        or typeDoc == "articlesynthese"
-    ):  # Article de synthèse
-        return "ARTREV"
-    elif typeDoc == "datapaper" or typeDoc == "paperdata":  # Cdata paper
-        return "DATAPAPER"
-    elif (
-        typeDoc == "bookreview" or typeDoc == "compterendulecture"
-    ):  # Compte rendu de lecture
-        return "BOOKREVIEW"
-    elif (
-        typeDoc == "comm"
-        or typeDoc == "conferencePaper"
-        or typeDoc == "communication"
-        or typeDoc == "conference"
-    ):  # Communication dans un congrés
-        return "COMM"
-    elif typeDoc == "poster":  # poster de conference
-        return "POSTER"
-    elif (
-        typeDoc == "proceedings" or typeDoc == "recueilcommunications"
-    ):  # Proceedings\/Recueil des communication
-        return "PROCEEDINGS"
-    elif (
-        typeDoc == "issue" or typeDoc == "specialissue" or typeDoc == "numerospecial"
-    ):  # Numéro spécial
-        return "ISSUE"
-    elif (
-        typeDoc == "ouv"
-        or typeDoc == "book"
-        or typeDoc == "monograph"
-        or typeDoc == "ouvrage"
-    ):  # Ouvrage
-        return "OUV"
-    elif typeDoc == "crit" or typeDoc == "editioncritique":  # Edition critique
-        return "CRIT"
-    elif typeDoc == "manual" or typeDoc == "manuel":  # Manuel
-        return "MANUAL"
-    elif typeDoc == "syntouv" or typeDoc == "ouvragesynthese":  # Ouvrage de synthese
-        return "SYNTOUV"
-    elif (
-        typeDoc == "dictionary"
-        or typeDoc == "dictionnaire"
-        or typeDoc == "encyclopedie"
-    ):  # Dictionnaire ou encyclopédie
-        return "DICTIONARY"
-    elif typeDoc == "couv" or typeDoc == "chapitre":  # Chapitre d'ouvrage
-        return "COUV"
-    elif typeDoc == "blog" or typeDoc == "articleblog":  # Article de blog scientifique
-        return "BLOG"
-    elif (
-        typeDoc == "notice"
-        or typeDoc == "noticedictionary"
-        or typeDoc == "noticeencyclopede"
-    ):  # Notice de dictionnaire ou d'encyclopedie
-        return "NOTICE"
-    elif typeDoc == "trad" or typeDoc == "traduction":  # traduction
-        return "TRAD"
-    elif typeDoc == "patent" or typeDoc == "brevet":  # brevet
-        return "PATENT"
-    elif typeDoc == "other" or typeDoc == "autre":  # autre document scientifique
-        return "OTHER"
-    elif (
-        typeDoc == "undefined"
-        or typeDoc == "prepublication"
-        or typeDoc == "documenttravail"
-    ):  # pré-publication/document de travail
-        return "UNDEFINED"
-    elif (
-        typeDoc == "preprint" or typeDoc == "prepublication"
-    ):  # preprint/pre-publication
-        return "PREPRINT"
-    elif typeDoc == "workingpaper":  # working paper
-        return "WORKINGPAPER"
-    elif (
-        typeDoc == "creport"
-        or typeDoc == "chapitrerapport"
-        or typeDoc == "chaptereport"
-    ):  # chapitre de rapport
-        return "CREPORT"
-    elif typeDoc == "report" or typeDoc == "rapport":  # rapport
-        return "REPORT"
-    elif (
-        typeDoc == "resreport"
-        or typeDoc == "rapportrecherche"
-        or typeDoc == "researchreport"
-    ):  # rapport de recherche
-        return "RESREPORT"
-    elif (
-        typeDoc == "techreport"
-        or typeDoc == "rapporttechnique"
-        or typeDoc == "technicalreport"
-    ):  # rapport technique
-        return "TECHREPORT"
-    elif (
-        typeDoc == "fundreport"
-        or typeDoc == "rapportcontrat"
-        or typeDoc == "rapportprojet"
-        or typeDoc == "contractreport"
-        or typeDoc == "projectreport"
-    ):  # rapport de contrat/projet
-        return "FUNDREPORT"
-    elif (
-        typeDoc == "expertreport" or typeDoc == "rapportexpertise"
-    ):  # rapport d'une expertise collective
-        return "EXPERTREPORT"
-    elif (
-        typeDoc == "dmp" or typeDoc == "plangestiondonnees"
-    ):  # data management plan/plan gestion de données
-        return "DMP"
-    elif typeDoc == "these" or typeDoc == "theses":  # these
-        return "THESE"
-    elif typeDoc == "hdr" or typeDoc == "habilitation":  # HDR
-        return "HDR"
-    elif typeDoc == "lecture" or typeDoc == "cours":  # cours
-        return "LECTURE"
-    elif typeDoc == "mem" or typeDoc == "memoire":  # mémoire étudiant
-        return "MEM"
-    elif typeDoc == "img" or typeDoc == "image" or typeDoc == "picture":  # image
-        return "IMG"
-    elif (
-        typeDoc == "photography" or typeDoc == "photo" or typeDoc == "photographie"
-    ):  # photographie
-        return "PHOTOGRAPHY"
-    elif typeDoc == "drawing" or typeDoc == "dessin":  # dessin
-        return "DRAWING"
-    elif typeDoc == "illustration":  # illustration
-        return "ILLUSTRATION"
-    elif typeDoc == "gravure":  # gravure
-        return "GRAVURE"
-    elif typeDoc == "graphics":  # image de synthèse
-        return "GRAPHICS"
-    elif typeDoc == "video" or typeDoc == "movie":  # video
-        return "VIDEO"
-    elif typeDoc == "son" or typeDoc == "sound":  # son
-        return "SON"
-    elif typeDoc == "software" or typeDoc == "logiciel":  # logiciel
-        return "SOFTWARE"
-    elif typeDoc == "presconf":  # Document associé à des manifestations scientifiques
-        return "PRESCONF"
-    elif typeDoc == "software" or typeDoc == "logiciel":  # logiciel
-        return "ETABTHESE"
-    elif typeDoc == "memclic":  #
-        return "MEMLIC"
-    elif typeDoc == "note":  # note de lecture
-        return "NOTE"
-    elif (
-        typeDoc == "otherreport" or typeDoc == "autrerapport"
-    ):  # autre rapport, séminaire...
-        return "OTHERREPORT"
-    elif typeDoc == "repact" or typeDoc == "rapportactivite":  # rapport d'activité
-        return "REPACT"
-    elif typeDoc == "synthese" or typeDoc == "notesynthese":  # notes de synthèse
-        return "SYNTHESE"
-    else:
+    t = DOC_TYPE_ALIASES.get(typeDoc.lower())
+    if t is None:
         Logger.warning("Unknown type of document: force article")
         return "ART"
+    return t
 
 
 def setType(inTree, typeDoc=None):
     """Set type of document"""
+    idT = None
     if typeDoc:
         idT = etree.SubElement(inTree, TEI + "classCode")
         idT.set("scheme", "halTypology")
@@ -1093,11 +1349,11 @@ def setAddress(inTree, address):
     elif type(address) == dict:
         addressLine = address.get("line", None)
         addressCountry = address.get("country", None)
-    # get country name in plain text in string
+    # get country name in plain text in string and its code (shared by addresses)
     if addressCountry is None:
-        addressCountry = m.getCountryFromText(address)
-    # get country code
-    addressCountryCode = m.getAlpha2Country(addressCountry)
+        addressCountry, addressCountryCode = m.getAddressCountry(addressLine)
+    else:
+        addressCountryCode = m.getAlpha2Country(addressCountry)
     # set address
     idA = list()
     idA.append(etree.SubElement(inTree, TEI + "addrLine"))
@@ -1145,14 +1401,32 @@ def setStructure(inTree, data, id=None):
     return idS
 
 
-def setStructures(inTree, data):
-    """Set all structures in XML"""
+def setStructures(inTree, data, resolved=None):
+    """Set all structures in XML (except ones resolved as HAL structures)"""
     if data is None : 
         Logger.debug("No structures provided")
         return None
     # if no dictionary: one structure
     if type(data) != list:
         data = [data]
+    if resolved is None:
+        resolved = dict()
+    # keep first declaration of each structure (except ones resolved in HAL)
+    structures = list()
+    seen = set()
+    for i in data:
+        idS = i.get("id", None)
+        if idS in resolved:
+            continue
+        if idS is not None:
+            if idS in seen:
+                Logger.debug("Structure {} declared twice: skip".format(idS))
+                continue
+            seen.add(idS)
+        structures.append(i)
+    data = structures
+    if not data and resolved:
+        return list()
     # set all structures
     idSS = etree.SubElement(inTree, TEI + "listOrg")
     idSS.set("type", "structures")
@@ -1162,6 +1436,49 @@ def setStructures(inTree, data):
     return idA
 
 
+def getStructureQuery(data):
+    """Get query of a structure in local referential from its data"""
+    address = data.get("address", None)
+    country = None
+    if type(address) is dict:
+        country = address.get("country", None)
+        address = address.get("line", None)
+    if country is None and address:
+        country = m.getCountryFromText(address)
+    return (
+        data.get("name", None),
+        data.get("acronym", None),
+        address,
+        m.getAlpha2Country(country),
+        data.get("parent", None),
+    )
+
+
+def resolveStructures(data, threshold=dflt.DEFAULT_REF_STRUCTURE_THRESHOLD):
+    """Resolve structures as HAL ones from local referential (see hal2ref): return
+    HAL ID and score of resolved structures by local id"""
+    resolved = dict()
+    if not data or refHAL.getIndex("structure") is None:
+        return resolved
+    if type(data) != list:
+        data = [data]
+    found = dict()
+    for i in data:
+        if i.get("id", None) is None:
+            continue
+        query = getStructureQuery(i)
+        if query not in found:
+            found[query] = refHAL.findStructure(*query, threshold=threshold)
+        if found[query]:
+            Logger.info(
+                "Structure {} resolved: struct-{} (score: {:.2f})".format(
+                    i["id"], *found[query]
+                )
+            )
+            resolved[i["id"]] = found[query]
+    return resolved
+
+
 def setEditors(inTree, data):
     """Set scientific editor(s) in XML"""
     if data is None:
@@ -1177,117 +1494,413 @@ def setEditors(inTree, data):
 
 
 def setInfoDoc(inTree, data):
-    """Set info of the document (publisher, serie, volume...) in XML"""
+    """Set info of the document (publisher, serie, volume...) in XML (see MAPPING)"""
     if data is None:
         Logger.debug("No document info provided")
         return None
-    #
-    listId = list()
-    dataPublisher = data.get("publisher", None)
-    if dataPublisher:
-        if type(dataPublisher) != list:
-            dataPublisher = [dataPublisher]
-        for p in dataPublisher:
-            listId.append(etree.SubElement(inTree, TEI + "publisher"))
-            listId[-1].text = p
-    if data.get("serie", None):
-        listId.append(etree.SubElement(inTree, TEI + "biblScope"))
-        listId[-1].set("unit", "serie")
-        listId[-1].text = data.get("serie")
-    if data.get("volume", None):
-        listId.append(etree.SubElement(inTree, TEI + "biblScope"))
-        listId[-1].set("unit", "volume")
-        listId[-1].text = data.get("volume")
-    if data.get("issue", None):
-        listId.append(etree.SubElement(inTree, TEI + "biblScope"))
-        listId[-1].set("unit", "issue")
-        listId[-1].text = data.get("issue")
-    if data.get("pages", None):
-        listId.append(etree.SubElement(inTree, TEI + "biblScope"))
-        listId[-1].set("unit", "pp")
-        listId[-1].text = data.get("pages")
-    if data.get("datePub", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "datePub")
-        listId[-1].text = data.get("datePub")
-    if data.get("dateEpub", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "dateEpub")
-        listId[-1].text = data.get("dateEpub")
-    if data.get("whenWritten", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "whenWritten")
-        listId[-1].text = data.get("whenWritten")
-    if data.get("whenSubmitted", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "whenSubmitted")
-        listId[-1].text = data.get("whenSubmitted")
-    if data.get("whenReleased", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "whenReleased")
-        listId[-1].text = data.get("whenReleased")
-    if data.get("whenProduced", None):
-        listId.append(etree.SubElement(inTree, TEI + "date"))
-        listId[-1].set("type", "whenProduced")
-        listId[-1].text = data.get("whenProduced")
-    return listId
+    return setMapped(inTree, "infoDoc", data)
 
 
 def setSeries(inTree, data):
-    """Set series (book, proceedings...) in XML"""
+    """Set series (book, proceedings...) in XML (see MAPPING)"""
     if data is None:
         Logger.debug("No series provided")
         return None
-    #
-    listId = list()
-    if data.get("editor", None):
-        listId.append(etree.SubElement(inTree, TEI + "editor"))
-        listId[-1].text = data.get("editor")
-    if data.get("title", None):
-        listId.append(etree.SubElement(inTree, TEI + "title"))
-        listId[-1].text = data.get("title")
-    return listId
+    return setMapped(inTree, "series", data)
 
 
 def setRef(inTree, data):
-    """Set external references in XML"""
+    """Set external references in XML (see MAPPING)"""
     if data is None:
         Logger.debug("No external reference provided")
         return None
-    #
-    items = [
-        "doi",
-        "arxiv",
-        "bibcode",
-        "ird",
-        "pubmed",
-        "ads",
-        "pubmedcentral",
-        "irstea",
-        "sciencespo",
-        "oatao",
-        "ensam",
-        "prodinra",
+    return setMapped(inTree, "extref", data)
+
+
+## mapping of JSON input to TEI (section -> fields, in order of the XML elements)
+##   key: key in JSON input, tag and attrib: TEI element added for the value
+##   target: attribute receiving the value (text of element by default)
+##   normaliser: function(value, data, field) giving the value to write (None to skip)
+##   multiple: list of values accepted (one element each), default: value if key is missing
+##   kind: kind of value checked before building XML (see schema)
+CODES_NOTES = {"0": ["n", "0", "f"], "1": ["o", "y", "1", "t"]}
+CODES_AUDIENCE = {"1": [], "2": ["international"], "3": ["national"]}
+MAPPING = {
+    "notes": [
+        # see all codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:audience&fl=*&wt=xml
+        {
+            "key": "audience",
+            "tag": "note",
+            "attrib": {"type": "audience"},
+            "target": "n",
+            "normaliser": "code",
+            "codes": CODES_AUDIENCE,
+            "default": dflt.DEFAULT_AUDIENCE,
+            "kind": "flag",
+        },
+        # see all codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:invitedCommunication&fl=*&wt=xml
+        {
+            "key": "invited",
+            "tag": "note",
+            "attrib": {"type": "invited"},
+            "target": "n",
+            "normaliser": "code",
+            "codes": CODES_NOTES,
+            "default": dflt.DEFAULT_INVITED,
+            "kind": "flag",
+        },
+        # see all codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:popularLevel&fl=*&wt=xml
+        {
+            "key": "popular",
+            "label": "popular level",
+            "tag": "note",
+            "attrib": {"type": "popular"},
+            "target": "n",
+            "normaliser": "code",
+            "codes": CODES_NOTES,
+            "default": dflt.DEFAULT_POPULAR,
+            "kind": "flag",
+        },
+        # see all codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:peerReviewing&fl=*&wt=xml
+        {
+            "key": "peer",
+            "label": "peer reviewing type",
+            "tag": "note",
+            "attrib": {"type": "peer"},
+            "target": "n",
+            "normaliser": "code",
+            "codes": CODES_NOTES,
+            "default": dflt.DEFAULT_PEER,
+            "kind": "flag",
+        },
+        # see all codes: https://api-preprod.archives-ouvertes.fr/ref/metadataList/?q=metaName_s:proceedings&fl=*&wt=xml
+        {
+            "key": "proceedings",
+            "label": "proceedings status",
+            "tag": "note",
+            "attrib": {"type": "proceedings"},
+            "target": "n",
+            "normaliser": "code",
+            "codes": CODES_NOTES,
+            "default": dflt.DEFAULT_PROCEEDINGS,
+            "kind": "flag",
+        },
+        {"key": "comment", "tag": "note", "attrib": {"type": "commentary"}},
+        {"key": "description", "tag": "note", "attrib": {"type": "description"}},
+    ],
+    "ID": [
+        {
+            "key": "nnt",
+            "tag": "idno",
+            "attrib": {"type": "nnt"},
+            "normaliser": "str",
+            "kind": "value",
+        },
+        {
+            "key": "isbn",
+            "label": "ISBN",
+            "tag": "idno",
+            "attrib": {"type": "isbn"},
+            "normaliser": "isbn",
+            "kind": "value",
+        },
+        {
+            "key": "patentNumber",
+            "tag": "idno",
+            "attrib": {"type": "patentNumber"},
+            "normaliser": "str",
+            "kind": "value",
+        },
+        {
+            "key": "reportNumber",
+            "tag": "idno",
+            "attrib": {"type": "reportNumber"},
+            "normaliser": "str",
+            "kind": "value",
+        },
+        {
+            "key": "localRef",
+            "tag": "idno",
+            "attrib": {"type": "localRef"},
+            "normaliser": "str",
+            "kind": "value",
+        },
+        {
+            "key": "halJournalId",
+            "tag": "idno",
+            "attrib": {"type": "halJournalId"},
+            "normaliser": "str",
+            "kind": "value",
+        },
+        # HAL ID of journal found from its title, ISSN or eISSN (if not provided)
+        {
+            "key": "journal",
+            "tag": "idno",
+            "attrib": {"type": "halJournalId"},
+            "normaliser": "journal",
+        },
+        {
+            "key": "issn",
+            "label": "ISSN",
+            "tag": "idno",
+            "attrib": {"type": "issn"},
+            "normaliser": "issn",
+            "kind": "value",
+        },
+        {
+            "key": "eissn",
+            "label": "eISSN",
+            "tag": "idno",
+            "attrib": {"type": "eissn"},
+            "normaliser": "issn",
+            "kind": "value",
+        },
+        {"key": "j", "tag": "title", "attrib": {"level": "j"}},
+        {"key": "m", "tag": "title", "attrib": {"level": "m"}},
+        {"key": "booktitle", "tag": "title", "attrib": {"level": "m"}},
+        {"key": "source", "tag": "title", "attrib": {"level": "m"}},
+    ],
+    "infoDoc": [
+        {"key": "publisher", "tag": "publisher", "multiple": True},
+        {"key": "serie", "tag": "biblScope", "attrib": {"unit": "serie"}},
+        {"key": "volume", "tag": "biblScope", "attrib": {"unit": "volume"}},
+        {"key": "issue", "tag": "biblScope", "attrib": {"unit": "issue"}},
+        {"key": "pages", "tag": "biblScope", "attrib": {"unit": "pp"}},
+        {
+            "key": "datePub",
+            "tag": "date",
+            "attrib": {"type": "datePub"},
+            "kind": "date",
+        },
+        {
+            "key": "dateEpub",
+            "tag": "date",
+            "attrib": {"type": "dateEpub"},
+            "kind": "date",
+        },
+        {
+            "key": "whenWritten",
+            "tag": "date",
+            "attrib": {"type": "whenWritten"},
+            "kind": "date",
+        },
+        {
+            "key": "whenSubmitted",
+            "tag": "date",
+            "attrib": {"type": "whenSubmitted"},
+            "kind": "date",
+        },
+        {
+            "key": "whenReleased",
+            "tag": "date",
+            "attrib": {"type": "whenReleased"},
+            "kind": "date",
+        },
+        {
+            "key": "whenProduced",
+            "tag": "date",
+            "attrib": {"type": "whenProduced"},
+            "kind": "date",
+        },
+    ],
+    "series": [
+        {"key": "editor", "tag": "editor"},
+        {"key": "title", "tag": "title"},
+    ],
+    "extref": [
+        {"key": k, "tag": "idno", "attrib": {"type": k}}
+        for k in (
+            "doi",
+            "arxiv",
+            "bibcode",
+            "ird",
+            "pubmed",
+            "ads",
+            "pubmedcentral",
+            "irstea",
+            "sciencespo",
+            "oatao",
+            "ensam",
+            "prodinra",
+        )
     ]
+    + [{"key": "publisher", "tag": "ref", "attrib": {"type": "publisher"}}]
+    + [
+        {"key": "link" + str(i), "tag": "ref", "attrib": {"type": "seeAlso"}}
+        for i in range(0, 10)
+    ],
+    "codes": [
+        {
+            "key": "classification",
+            "tag": "classCode",
+            "attrib": {"scheme": "classification"},
+        },
+        {"key": "acm", "tag": "classCode", "attrib": {"scheme": "acm"}},
+        {"key": "mesh", "tag": "classCode", "attrib": {"scheme": "mesh"}},
+        {"key": "jel", "tag": "classCode", "attrib": {"scheme": "jel"}},
+        {
+            "key": "halDomain",
+            "tag": "classCode",
+            "attrib": {"scheme": "halDomain"},
+            "target": "n",
+            "multiple": True,
+        },
+    ],
+}
+
+
+def normaliseStr(value, data, field):
+    """Normalise value as text"""
+    return str(value)
+
+
+def normaliseISBN(value, data, field):
+    """Normalise ISBN (warning if not valid)"""
+    if not isbn.is_valid(value):
+        Logger.warning("{} not valid: {}, continue...".format(field["label"], value))
+    return str(value)
+
+
+def normaliseISSN(value, data, field):
+    """Normalise ISSN or eISSN (warning if not valid)"""
+    if not issn.is_valid(value):
+        Logger.warning("{} not valid: {}, continue...".format(field["label"], value))
+    return str(value)
+
+
+def normaliseJournal(value, data, field):
+    """Get HAL ID of journal (if not provided) from local referential or HAL"""
+    if data.get("halJournalId", None) is not None:
+        return None
+    # local journal referential first (see hal2ref)
+    idJournal = refHAL.findJournalId(value, data.get("issn"), data.get("eissn"))
+    if idJournal is None:
+        idJournal = getJournalIdFromHAL(value)
+    if not idJournal:
+        return None
+    Logger.debug("Jounal ID found: {}".format(idJournal))
+    return str(idJournal)
+
+
+def normaliseCode(value, data, field):
+    """Normalise value as code (from prefixes of accepted values, default if unknown)"""
+    v = str(value)
+    lv = v.lower()
+    for n in field["lengths"]:
+        code = field["prefixes"].get(lv[:n])
+        if code is not None:
+            return code
+    if v in field["codes"]:
+        return v
+    Logger.warning(
+        "Unknown {}: force default ({})".format(field["label"], field["default"])
+    )
+    return field["default"]
+
+
+NORMALISERS = {
+    "str": normaliseStr,
+    "isbn": normaliseISBN,
+    "issn": normaliseISSN,
+    "journal": normaliseJournal,
+    "code": normaliseCode,
+}
+
+
+def compileField(field):
+    """Compile field of mapping to function(inTree, value, data, listId) adding its element(s)"""
+    tag = sys.intern(TEI + field["tag"])
+    # attributes set one by one (faster than attrib dictionary with lxml)
+    attrib = tuple(field.get("attrib", dict()).items())
+    target = field.get("target", None)
+    normaliser = NORMALISERS.get(field.get("normaliser", None))
+
+    def add(inTree, value, data, listId):
+        if normaliser is not None:
+            value = normaliser(value, data, field)
+            if value is None:
+                return
+        elem = etree.SubElement(inTree, tag)
+        for k, v in attrib:
+            elem.set(k, v)
+        if target is None:
+            elem.text = value
+        else:
+            elem.set(target, value)
+        listId.append(elem)
+
+    if not field.get("multiple", False):
+        return add
+
+    def addAll(inTree, value, data, listId):
+        if type(value) is not list:
+            value = [value]
+        for v in value:
+            add(inTree, v, data, listId)
+
+    return addAll
+
+
+def compileMapping(mapping):
+    """Compile mapping to dispatch tables: section -> list of (key, default, function)"""
+    tables = dict()
+    for section, fields in mapping.items():
+        tables[section] = list()
+        for f in fields:
+            field = dict(f)
+            field.setdefault("label", field["key"])
+            if "codes" in field:
+                field["prefixes"] = buildAliases(field["codes"])
+                field["lengths"] = sorted({len(p) for p in field["prefixes"]})
+            tables[section].append(
+                (field["key"], field.get("default", None), compileField(field))
+            )
+    return tables
+
+
+MAPPING_TABLES = compileMapping(MAPPING)
+
+
+def setMapped(inTree, section, data):
+    """Set fields of a section of JSON input in XML using compiled mapping"""
     listId = list()
-    for it in items:
-        if data.get(it, None):
-            listId.append(etree.SubElement(inTree, TEI + "idno"))
-            listId[-1].set("type", it)
-            listId[-1].text = data.get(it)
-    items = ["publisher"]
-    items.extend(["link" + str(i) for i in range(0, 10)])
-    for it in items:
-        if data.get(it, None):
-            listId.append(etree.SubElement(inTree, TEI + "ref"))
-            if it == "publisher":
-                listId[-1].set("type", it)
-            else:
-                listId[-1].set("type", "seeAlso")
-            listId[-1].text = data.get(it)
+    for key, default, add in MAPPING_TABLES[section]:
+        value = data.get(key, default)
+        if value or default is not None:
+            add(inTree, value, data, listId)
     return listId
 
 
+def buildSkeleton():
+    """Build skeleton of TEI (static structure of all records)"""
+    tei = etree.Element(TAGS["TEI"], nsmap=dflt.DEFAULT_NAMESPACE_XML)
+    text = etree.SubElement(tei, TAGS["text"])
+    body = etree.SubElement(text, TAGS["body"])
+    listBibl = etree.SubElement(body, TAGS["listBibl"])
+    biblFull = etree.SubElement(listBibl, TAGS["biblFull"])
+    etree.SubElement(biblFull, TAGS["titleStmt"])
+    sourceDesc = etree.SubElement(biblFull, TAGS["sourceDesc"])
+    biblStruct = etree.SubElement(sourceDesc, TAGS["biblStruct"])
+    etree.SubElement(biblStruct, TAGS["analytic"])
+    monogr = etree.SubElement(biblStruct, TAGS["monogr"])
+    etree.SubElement(monogr, TAGS["imprint"])
+    etree.SubElement(biblStruct, TAGS["series"])
+    profileDesc = etree.SubElement(biblFull, TAGS["profileDesc"])
+    etree.SubElement(profileDesc, TAGS["textClass"])
+    etree.SubElement(text, TAGS["back"])
+    return tei
+
+
+SKELETON = buildSkeleton()
+SKELETON_NAMES = [etree.QName(e).localname for e in SKELETON.iter()]
+
+
+def getSkeleton():
+    """Get a copy of TEI skeleton and its elements (by name)"""
+    tei = copy.deepcopy(SKELETON)
+    return tei, dict(zip(SKELETON_NAMES, tei.iter()))
+
+
 def buildXML(data):
     """Build the XML file from data"""
     Logger.debug("Open XML tree with namespace")
@@ -1297,21 +1910,22 @@ def buildXML(data):
     #         k = ''
     #     etree.register_namespace(k, v)
     #
-    tei = etree.Element(TEI + "TEI", nsmap=dflt.DEFAULT_NAMESPACE_XML)
     # tei.set("xmlns","http://www.tei-c.org/ns/1.0")
     # tei.set("xmlns:hal","http://hal.archives-ouvertes.fr/")
     Logger.debug("Add first elements")
-    text = etree.SubElement(tei, TEI + "text")
-    body = etree.SubElement(text, TEI + "body")
-    listBibl = etree.SubElement(body, TEI + "listBibl")
-    biblFull = etree.SubElement(listBibl, TEI + "biblFull")
+    tei, nodes = getSkeleton()
+    biblFull = nodes["biblFull"]
     Logger.debug("Start to add metadata")
     # add title(s)/author
     Logger.debug("Add title(s) 1/2")
-    titleStmt = etree.SubElement(biblFull, TEI + "titleStmt")
+    titleStmt = nodes["titleStmt"]
     title = setTitles(titleStmt, data.get("title", None), data.get("subtitle", None))
     Logger.debug("Add authors 1/2")
-    authors = setAuthors(titleStmt, data.get("authors", None))
+    # structures found in local referential are referenced by their HAL ID
+    resolved = resolveStructures(data.get("structures", None))
+    # missing identifiers of authors found in local referential
+    authorsData = enrichAuthors(data.get("authors", None), resolved)
+    authors = setAuthors(titleStmt, authorsData, resolved)
     # # add file
     # if data.get('file',None):
     #     Logger.debug('Add file')
@@ -1325,35 +1939,41 @@ def buildXML(data):
     if data.get("notes", None):
         Logger.debug("Add notes")
         setNotes(biblFull, data.get("notes"))
-    ## new section
-    sourceDesc = etree.SubElement(biblFull, TEI + "sourceDesc")
-    biblStruct = etree.SubElement(sourceDesc, TEI + "biblStruct")
-    analytic = etree.SubElement(biblStruct, TEI + "analytic")
-    # add title(s)
+    ## new section (moved after optional elements)
+    sourceDesc = nodes["sourceDesc"]
+    biblFull.append(sourceDesc)
+    biblStruct = nodes["biblStruct"]
+    analytic = nodes["analytic"]
+    # add title(s) (copy of the first ones)
     Logger.debug("Add title(s) 2/2")
-    titleB = setTitles(analytic, data.get("title", None), data.get("subtitle", None))
+    for e in title:
+        analytic.append(copy.deepcopy(e))
     Logger.debug("Add authors 2/2")
-    authorsB = setAuthors(analytic, data.get("authors", None))
+    for e in authors:
+        analytic.append(copy.deepcopy(e))
     # add identifications data
     Logger.debug("Add identification numbers")
-    monogr = etree.SubElement(biblStruct, TEI + "monogr")
+    monogr = nodes["monogr"]
     setIDS(monogr, data.get("ID", None))
     # add bib information relative to document
     Logger.debug("Add situation value for document")
-    imprint = etree.SubElement(monogr, TEI + "imprint")
+    imprint = nodes["imprint"]
+    monogr.append(imprint)
     setInfoDoc(imprint, data.get("infoDoc", None))
     # add series description for book, proceedings...
     Logger.debug("Add series description")
-    series = etree.SubElement(biblStruct, TEI + "series")
+    series = nodes["series"]
     setSeries(series, data.get("series", None))
     # add external ref of document
     Logger.debug("Add external reference(s)")
     setRef(biblStruct, data.get("extref", None))
-    # new section
-    profileDesc = etree.SubElement(biblFull, TEI + "profileDesc")
+    # new section (moved after optional elements)
+    profileDesc = nodes["profileDesc"]
+    biblFull.append(profileDesc)
     Logger.debug("Add language")
     setLanguage(profileDesc, data.get("lang", None))
-    textClass = etree.SubElement(profileDesc, TEI + "textClass")
+    textClass = nodes["textClass"]
+    profileDesc.append(textClass)
     # add keywords
     Logger.debug("Add keywords")
     setKeywords(textClass, data.get("keywords", None))
@@ -1367,9 +1987,18 @@ def buildXML(data):
     Logger.debug("Add abstract(s)")
     setAbstract(profileDesc, data.get("abstract", None))
     # new section
-    back = etree.SubElement(text, TEI + "back")
+    back = nodes["back"]
     # add structure(s)
     Logger.debug("Add structure(s)")
-    setStructures(back, data.get("structures", None))
+    setStructures(back, data.get("structures", None), resolved)
 
     return tei
+
+
+def __getattr__(name):
+    """Lazy access to asyncio API (libHAL.aio)"""
+    if name == "aio":
+        from . import aio
+
+        return aio
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
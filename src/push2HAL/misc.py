@@ -15,6 +15,9 @@ import time
 import os
 import re
 import json
+import functools
+import threading
+import unicodedata
 import fitz
 from . import default as dflt
 from lxml import etree
@@ -23,6 +26,11 @@ import pycountry as pc
 
 Logger = logging.getLogger("push2HAL")
 
+## compiled XSD schemas (per thread: lxml schemas could not be shared between threads)
+SCHEMAS = threading.local()
+## XSD used by default to validate XML files
+XSD_CONFIG = {"path": dflt.DEFAULT_VALIDATION_XSD}
+
 
 def input_char(message):
     try:
@@ -127,14 +135,39 @@ def checkTitle(title):
     return title
 
 
-def checkXML(xml_tree, xsd_file_path=dflt.DEFAULT_VALIDATION_XSD, showError=True):
-    """Validate XML file with XSD"""
+def useXSD(xsd_file_path=dflt.DEFAULT_VALIDATION_XSD):
+    """Use a specific XSD file to validate XML files"""
+    XSD_CONFIG["path"] = xsd_file_path
+
+
+def getXSDPath(xsd_file_path=None):
+    """Get path of XSD file (given path, used one or provided with push2HAL)"""
+    if not xsd_file_path:
+        xsd_file_path = XSD_CONFIG["path"]
     if not os.path.isfile(xsd_file_path):
         if os.path.isfile(os.path.join(os.path.dirname(__file__), xsd_file_path)):
             xsd_file_path = os.path.join(os.path.dirname(__file__), xsd_file_path)
+    return os.path.abspath(xsd_file_path)
+
+
+def getSchema(xsd_file_path=None):
+    """Get compiled XSD schema (compiled once per thread, again if file changes)"""
+    xsd_file_path = getXSDPath(xsd_file_path)
+    if not hasattr(SCHEMAS, "schemas"):
+        SCHEMAS.schemas = dict()
+    mtime = os.path.getmtime(xsd_file_path)
+    if SCHEMAS.schemas.get(xsd_file_path, (None,))[0] != mtime:
+        Logger.debug("Compile XSD: {}".format(xsd_file_path))
+        xmlschema_doc = etree.parse(xsd_file_path)
+        SCHEMAS.schemas[xsd_file_path] = (mtime, etree.XMLSchema(xmlschema_doc))
+    return SCHEMAS.schemas[xsd_file_path][1]
+
+
+def checkXML(xml_tree, xsd_file_path=None, showError=True):
+    """Validate XML file with XSD"""
+    xsd_file_path = getXSDPath(xsd_file_path)
     Logger.debug("Validate XML with {}".format(xsd_file_path))
-    xmlschema_doc = etree.parse(xsd_file_path)
-    xmlschema = etree.XMLSchema(xmlschema_doc)
+    xmlschema = getSchema(xsd_file_path)
     # run check
     status = xmlschema.validate(xml_tree)
     if not status:
@@ -144,12 +177,13 @@ def checkXML(xml_tree, xsd_file_path=dflt.DEFAULT_VALIDATION_XSD, showError=True
                 Logger.warning(error)
     return status
 
-def writeXML(inTree, file_path, check=True):
-    """Write XML tree to file"""
+
+def writeXML(inTree, file_path, check=True, xsd_file_path=None):
+    """Write XML tree to file (path or binary file object)"""
     Logger.debug("Write XML file: {}".format(file_path))
     et = inTree.getroottree()
     if check:
-        checkXML(et)
+        checkXML(et, xsd_file_path)
     et.write(file_path, pretty_print=True, xml_declaration=True, encoding='utf-8')
     # f.write(etree.tostring(inTree, pretty_print=True, xml_declaration=True, encoding='utf-8'))
 
@@ -186,37 +220,193 @@ def adaptH(inStr):
     else:
         return inStr
     
+## usual names of countries not known by pycountry (name -> alpha2 code)
+COUNTRY_ALIASES = {
+    "England": "GB",
+    "Scotland": "GB",
+    "Wales": "GB",
+    "Northern Ireland": "GB",
+    "Great Britain": "GB",
+    "UK": "GB",
+    "Russia": "RU",
+    "Turkey": "TR",
+    "Holland": "NL",
+    "The Netherlands": "NL",
+    "Republic of Korea": "KR",
+    "Ivory Coast": "CI",
+    "Swaziland": "SZ",
+    "Burma": "MM",
+    "Cape Verde": "CV",
+    "Macedonia": "MK",
+    "Vatican": "VA",
+    "Palestine": "PS",
+    "Micronesia": "FM",
+    "Brunei": "BN",
+}
+## index of countries (Aho-Corasick automaton over names and alpha3 codes, built once)
+COUNTRY_INDEX = None
+## lookup table of countries (normalised names and codes -> alpha2 code, built once)
+COUNTRY_TABLE = None
+COUNTRY_INDEX_LOCK = threading.Lock()
+
+
+def normaliseCountryText(text):
+    """Normalise text for country matching (lower case, no accent, punctuation and spaces
+    as single space): return normalised text and offset of each character in text"""
+    chars = list()
+    offsets = list()
+    for i, c in enumerate(text):
+        c = unicodedata.normalize("NFKD", c)[:1].lower()
+        if not c.isalnum():
+            if not chars or chars[-1] == " ":
+                continue
+            c = " "
+        chars.append(c)
+        offsets.append(i)
+    return "".join(chars), offsets
+
+
+def normaliseCountryName(text):
+    """Normalise name or code of a country (key of lookup table)"""
+    return normaliseCountryText(text)[0].strip()
+
+
+def iterCountryNames():
+    """Iterate over names (common, official ones and aliases) of countries:
+    yield name, country and if name is a code (upper case only)"""
+    for country in pc.countries:
+        for attr in ("name", "common_name", "official_name"):
+            value = getattr(country, attr, None)
+            if value:
+                yield value, country, False
+    for alias, code in COUNTRY_ALIASES.items():
+        yield alias, pc.countries.get(alpha_2=code), alias.isupper()
+
+
+def buildCountryIndex():
+    """Build automaton matching names (common and official ones) and alpha3 codes of
+    countries: goto transitions, failure links and outputs (length, name, code) of states"""
+    patterns = dict()
+    for value, country, code in iterCountryNames():
+        patterns.setdefault(normaliseCountryName(value), (country.name, code))
+    for country in pc.countries:
+        patterns.setdefault(country.alpha_3.lower(), (country.name, True))
+    goto = [dict()]
+    outputs = [list()]
+    for key, (name, code) in patterns.items():
+        state = 0
+        for c in key:
+            if c not in goto[state]:
+                goto.append(dict())
+                outputs.append(list())
+                goto[state][c] = len(goto) - 1
+            state = goto[state][c]
+        outputs[state].append((len(key), name, code))
+    # failure links (breadth first) and outputs of suffixes
+    fail = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        for c, nxt in goto[state].items():
+            f = fail[state]
+            while f and c not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(c, 0)
+            outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+            queue.append(nxt)
+    Logger.debug("Build country index: {} patterns".format(len(patterns)))
+    return goto, fail, outputs
+
+
+def getCountryIndex():
+    """Get country index (built on first use)"""
+    global COUNTRY_INDEX
+    if COUNTRY_INDEX is None:
+        with COUNTRY_INDEX_LOCK:
+            if COUNTRY_INDEX is None:
+                COUNTRY_INDEX = buildCountryIndex()
+    return COUNTRY_INDEX
+
+
+def buildCountryTable():
+    """Build lookup table of countries: normalised names, aliases, alpha2 and alpha3 codes
+    -> alpha2 code"""
+    table = dict()
+    for value, country, _ in iterCountryNames():
+        table.setdefault(normaliseCountryName(value), country.alpha_2)
+    for country in pc.countries:
+        table.setdefault(country.alpha_2.lower(), country.alpha_2)
+        table.setdefault(country.alpha_3.lower(), country.alpha_2)
+    Logger.debug("Build country table: {} names".format(len(table)))
+    return table
+
+
+def getCountryTable():
+    """Get lookup table of countries (built on first use)"""
+    global COUNTRY_TABLE
+    if COUNTRY_TABLE is None:
+        with COUNTRY_INDEX_LOCK:
+            if COUNTRY_TABLE is None:
+                COUNTRY_TABLE = buildCountryTable()
+    return COUNTRY_TABLE
+
+
 def getCountryFromText(text):
-    """ Try to get country from text """
+    """Try to get country from text (one pass over text: whole words only, alpha3 codes
+    in upper case, rightmost match wins and longest one if several end at the same place)"""
     r = None
     if text:
-        # with text
-        for country in pc.countries:
-            if country.name.lower() in text.lower():
-                r = country.name
-                break
-        # with alpha3 code
-        for country in pc.countries:
-            if country.alpha_3.lower() in text.lower():
-                r = country.name
-                break
-        # # with alpha2 code
-        # for country in pc.countries:
-        #     if country.alpha_2.lower() in text.lower():
-        #         r = country.name
-        #         break
+        goto, fail, outputs = getCountryIndex()
+        norm, offsets = normaliseCountryText(text)
+        best = None
+        state = 0
+        for i, c in enumerate(norm):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            if not outputs[state] or (i + 1 < len(norm) and norm[i + 1] != " "):
+                continue
+            for length, name, code in outputs[state]:
+                start = i - length + 1
+                if start > 0 and norm[start - 1] != " ":
+                    continue
+                if code and not text[offsets[start] : offsets[i] + 1].isupper():
+                    continue
+                if best is None or (i, length) > best[:2]:
+                    best = (i, length, name)
+        if best:
+            r = best[2]
     return r
 
+
+@functools.lru_cache(maxsize=dflt.DEFAULT_COUNTRY_FUZZY_CACHE_SIZE)
+def searchAlpha2Country(text):
+    """Fuzzy search of the alpha2 code of a country (slow: results are cached)"""
+    try:
+        r = pc.countries.search_fuzzy(text)
+    except LookupError as e:
+        Logger.error('LookupError: {}'.format(e))
+        return None
+    return r[0].alpha_2 if r else None
+
+
 def getAlpha2Country(text):
-    """Try to get the alpha2 code of a country from a string"""
+    """Try to get the alpha2 code of a country from a string (lookup table of names and
+    codes, fuzzy search if not found)"""
     r = None
     if text:
-        try:
-            r = pc.countries.search_fuzzy(text)
-        except LookupError as e:
-            Logger.error('LookupError: {}'.format(e))
-            return None
-    return r[0].alpha_2 if r else None
+        r = getCountryTable().get(normaliseCountryName(text))
+        if r is None:
+            r = searchAlpha2Country(text)
+    return r
+
+
+@functools.lru_cache(maxsize=dflt.DEFAULT_COUNTRY_ADDRESS_CACHE_SIZE)
+def getAddressCountry(address):
+    """Get country and its alpha2 code from an address (cached: addresses shared by
+    structures are processed once)"""
+    country = getCountryFromText(address)
+    return country, getAlpha2Country(country)
+
 
 def checkISBN(isbn):
     """ Check if ISBN is OK """
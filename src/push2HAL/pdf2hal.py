@@ -39,6 +39,7 @@ def start():
     parser.add_argument('-f','--force', help='Force for no interaction',action='store_true')
     parser.add_argument('-cc','--complete', help='Run completion (use grobid, idext or affiliation or list of theme spearated by comma)')
     parser.add_argument('-id','--idhal', help='Declare deposition on behalf of a specific idHAL')
+    parser.add_argument('-s','--sync', help='Add file only if the record in HAL has none',action='store_true')
     # sys.argv = ['pdf2hal.py', 'allix1989.pdf', '-v']#, '-a', 'hal-04215255']
     args = parser.parse_args()
     
@@ -60,7 +61,8 @@ def start():
                                  completion=args.complete,
                                  halid=args.halid,
                                  idhal=args.idhal,
-                                 interaction=not args.force))
+                                 interaction=not args.force,
+                                 sync=args.sync))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,524 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL (local snapshots and indexes of HAL referentials)
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import os
+import re
+import gzip
+import json
+import time
+import threading
+from collections import Counter
+from unidecode import unidecode
+
+from . import default as dflt
+from . import libHAL as lib
+
+Logger = logging.getLogger("push2HAL")
+
+## available referentials: HAL database, stored fields and default snapshot file
+REFERENTIALS = {
+    "journal": {
+        "typeDB": "journal",
+        "fields": ["docid", "title_s", "issn_s", "eissn_s", "valid_s"],
+        "file": dflt.DEFAULT_REF_JOURNAL_FILE,
+    },
+    "structure": {
+        "typeDB": "structure",
+        "fields": [
+            "docid",
+            "name_s",
+            "acronym_s",
+            "type_s",
+            "valid_s",
+            "address_s",
+            "country_s",
+            "parentDocid_i",
+        ],
+        "file": dflt.DEFAULT_REF_STRUCTURE_FILE,
+    },
+    "author": {
+        "typeDB": "author",
+        "fields": [
+            "docid",
+            "idHal_s",
+            "firstName_s",
+            "lastName_s",
+            "valid_s",
+            "orcidId_s",
+            "structureId_i",
+        ],
+        "file": dflt.DEFAULT_REF_AUTHOR_FILE,
+    },
+}
+## status of referential entries (preferred first)
+VALIDITY = {"VALID": 0, "OLD": 1, "INCOMING": 2}
+## loaded indexes (path -> index or None if no snapshot)
+INDEXES = dict()
+INDEXES_LOCK = threading.Lock()
+
+
+def normalizeText(text):
+    """Normalize text for matching (no accent, lower case, alphanumeric words)"""
+    if text is None:
+        return ""
+    return " ".join(re.findall(r"[a-z0-9]+", unidecode(str(text)).lower()))
+
+
+def normalizeISSN(issn):
+    """Normalize ISSN (upper case without hyphen)"""
+    if not issn:
+        return None
+    n = re.sub(r"[^0-9X]", "", str(issn).upper())
+    return n if len(n) == 8 else None
+
+
+def getTrigrams(text):
+    """Get character trigrams of (normalized) text"""
+    text = " {} ".format(text)
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def getSimilarity(textA, textB):
+    """Similarity of two normalized texts (Dice coefficient on trigrams)"""
+    gA = getTrigrams(textA)
+    gB = getTrigrams(textB)
+    if not gA or not gB:
+        return 0.0
+    return 2.0 * len(gA & gB) / (len(gA) + len(gB))
+
+
+def buildTextIndex(texts):
+    """Build index over texts (list of texts for each entry)"""
+    exact = dict()
+    tokens = dict()
+    norms = list()
+    for i, entryTexts in enumerate(texts):
+        entryNorms = list()
+        for t in entryTexts:
+            n = normalizeText(t)
+            if n and n not in entryNorms:
+                entryNorms.append(n)
+                exact.setdefault(n, list()).append(i)
+                for tok in set(n.split()):
+                    tokens.setdefault(tok, list()).append(i)
+        norms.append(entryNorms)
+    return {"exact": exact, "tokens": tokens, "texts": norms}
+
+
+def searchTextIndex(
+    index,
+    text,
+    threshold=dflt.DEFAULT_REF_THRESHOLD,
+    maxTokens=dflt.DEFAULT_REF_MAX_TOKENS,
+    maxCandidates=dflt.DEFAULT_REF_MAX_CANDIDATES,
+):
+    """Search text in index: return list of (score, entry) (best first)"""
+    norm = normalizeText(text)
+    if not norm:
+        return []
+    # exact match on normalized text
+    hits = index["exact"].get(norm)
+    if hits:
+        return [(1.0, i) for i in hits]
+    # candidates share the rarest words of the text
+    postings = [index["tokens"][t] for t in set(norm.split()) if t in index["tokens"]]
+    postings.sort(key=len)
+    candidates = Counter()
+    for p in postings[:maxTokens]:
+        candidates.update(p)
+    # score candidates on trigrams
+    results = list()
+    for i, _ in candidates.most_common(maxCandidates):
+        score = max(getSimilarity(norm, t) for t in index["texts"][i])
+        if score >= threshold:
+            results.append((score, i))
+    results.sort(key=lambda x: -x[0])
+    return results
+
+
+def getSnapshotPath(referential, path=None):
+    """Get path of the snapshot file of a referential"""
+    if path:
+        return path
+    return REFERENTIALS[referential]["file"]
+
+
+def useSnapshot(referential, path):
+    """Use a specific snapshot file for a referential"""
+    REFERENTIALS[referential]["file"] = path
+
+
+def saveSnapshot(referential, docs, path=None, numFound=None):
+    """Save snapshot of a referential (compact gzipped JSON, numFound: number of entries
+    announced by HAL)"""
+    path = getSnapshotPath(referential, path)
+    fields = REFERENTIALS[referential]["fields"]
+    content = {
+        "referential": referential,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "fields": fields,
+        "numFound": len(docs) if numFound is None else numFound,
+        "docs": [[d.get(f) for f in fields] for d in docs],
+    }
+    dirPath = os.path.dirname(path)
+    if dirPath:
+        os.makedirs(dirPath, exist_ok=True)
+    # write in temporary file first: readers never see a partial snapshot
+    tmpPath = "{}.{}.tmp".format(path, os.getpid())
+    with gzip.open(tmpPath, "wt", encoding="utf-8") as f:
+        json.dump(content, f, separators=(",", ":"))
+    os.replace(tmpPath, path)
+    Logger.info("Snapshot of {} ({} entries): {}".format(referential, len(docs), path))
+    return path
+
+
+def loadSnapshot(path):
+    """Load snapshot of a referential (list of documents)"""
+    Logger.debug("Load snapshot: {}".format(path))
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        content = json.load(f)
+    fields = content["fields"]
+    numFound = content.get("numFound")
+    if numFound is not None and len(content["docs"]) < numFound:
+        Logger.warning(
+            "Incomplete snapshot ({}/{} entries): {}".format(
+                len(content["docs"]), numFound, path
+            )
+        )
+    return [dict(zip(fields, d)) for d in content["docs"]]
+
+
+def downloadReferential(referential, path=None, pageSize=dflt.DEFAULT_PAGE_SIZE):
+    """Download a HAL referential and save it as local snapshot"""
+    conf = REFERENTIALS[referential]
+    Logger.info("Download HAL referential: {}".format(referential))
+    info = dict()
+    # paging errors are raised: previous snapshot is kept
+    docs = list(
+        lib.iterDataFromHAL(
+            txtsearch="*:*",
+            typeI="query",
+            typeDB=conf["typeDB"],
+            returnFields=",".join(conf["fields"]),
+            pageSize=pageSize,
+            info=info,
+        )
+    )
+    numFound = info.get("numFound")
+    if numFound is not None and len(docs) < numFound:
+        raise ValueError(
+            "Incomplete download of {} ({}/{} entries)".format(
+                referential, len(docs), numFound
+            )
+        )
+    path = saveSnapshot(referential, docs, path, numFound)
+    # drop previously loaded index
+    with INDEXES_LOCK:
+        INDEXES.pop(path, None)
+    return path
+
+
+def refreshReferential(
+    referential, path=None, maxAge=None, pageSize=dflt.DEFAULT_PAGE_SIZE
+):
+    """Download a HAL referential if its local snapshot is missing or older than maxAge
+    (in seconds)"""
+    path = getSnapshotPath(referential, path)
+    if maxAge is not None and os.path.isfile(path):
+        age = time.time() - os.path.getmtime(path)
+        if age < maxAge:
+            Logger.info(
+                "Snapshot of {} is up to date ({:.1f} days): {}".format(
+                    referential, age / 86400, path
+                )
+            )
+            return path
+    return downloadReferential(referential, path, pageSize)
+
+
+def getIndex(referential, path=None):
+    """Get index of a referential (loaded once per process, None if no snapshot)"""
+    path = getSnapshotPath(referential, path)
+    if path not in INDEXES:
+        with INDEXES_LOCK:
+            if path not in INDEXES:
+                index = None
+                if os.path.isfile(path):
+                    index = buildIndex(referential, loadSnapshot(path))
+                else:
+                    Logger.debug("No local snapshot for {}".format(referential))
+                INDEXES[path] = index
+    return INDEXES[path]
+
+
+def buildIndex(referential, docs):
+    """Build index of a referential from its documents"""
+    Logger.debug("Build index of {} ({} entries)".format(referential, len(docs)))
+    if referential == "journal":
+        return buildJournalIndex(docs)
+    if referential == "structure":
+        return buildStructureIndex(docs)
+    if referential == "author":
+        return buildAuthorIndex(docs)
+    return None
+
+
+def buildJournalIndex(docs):
+    """Build index of journals over titles and ISSN/eISSN"""
+    issn = dict()
+    for i, d in enumerate(docs):
+        for f in ("issn_s", "eissn_s"):
+            n = normalizeISSN(d.get(f))
+            if n:
+                issn.setdefault(n, list()).append(i)
+    return {
+        "docs": docs,
+        "title": buildTextIndex([[d.get("title_s")] for d in docs]),
+        "issn": issn,
+    }
+
+
+def selectJournal(docs, entries):
+    """Select journal among entries (valid ones first)"""
+    entries = sorted(entries, key=lambda i: docs[i].get("valid_s") != "VALID")
+    return docs[entries[0]]["docid"]
+
+
+def findJournalId(
+    journal=None, issn=None, eissn=None, threshold=dflt.DEFAULT_REF_THRESHOLD, path=None
+):
+    """Find HAL ID of a journal in local index (from ISSN/eISSN or title)"""
+    index = getIndex("journal", path)
+    if index is None:
+        return None
+    for n in (normalizeISSN(issn), normalizeISSN(eissn)):
+        if n in index["issn"]:
+            return selectJournal(index["docs"], index["issn"][n])
+    results = searchTextIndex(index["title"], journal, threshold)
+    if results:
+        best = [i for s, i in results if s == results[0][0]]
+        return selectJournal(index["docs"], best)
+    return None
+
+
+def getValues(value):
+    """Get list of values of a field (single value or list)"""
+    if value is None:
+        return []
+    if type(value) is not list:
+        return [value]
+    return value
+
+
+def buildStructureIndex(docs):
+    """Build index of structures over names, acronyms, addresses and parent links"""
+    acronym = dict()
+    children = dict()
+    for i, d in enumerate(docs):
+        n = normalizeText(d.get("acronym_s"))
+        if n:
+            acronym.setdefault(n, list()).append(i)
+        for p in getValues(d.get("parentDocid_i")):
+            children.setdefault(p, list()).append(i)
+    return {
+        "docs": docs,
+        "name": buildTextIndex([[d.get("name_s")] for d in docs]),
+        "acronym": acronym,
+        "address": [normalizeText(d.get("address_s")) for d in docs],
+        "children": children,
+    }
+
+
+def getStructureCandidates(index, name, acronym, parentId=None):
+    """Get candidate structures from name, acronym and parent structure:
+    {entry: similarity of name}"""
+    candidates = dict()
+    norm = normalizeText(name)
+    for score, i in searchTextIndex(index["name"], name, threshold=0.0):
+        candidates[i] = score
+    others = index["acronym"].get(normalizeText(acronym), []) + index["children"].get(
+        parentId, []
+    )
+    for i in others:
+        if i not in candidates:
+            candidates[i] = max(
+                [getSimilarity(norm, t) for t in index["name"]["texts"][i]] + [0.0]
+            )
+    return candidates
+
+
+def scoreStructure(index, i, nameScore, query):
+    """Score a candidate structure (weighted similarities of provided data only)"""
+    d = index["docs"][i]
+    scores = {"name": nameScore}
+    if query["acronym"]:
+        scores["acronym"] = float(
+            normalizeText(d.get("acronym_s")) == normalizeText(query["acronym"])
+        )
+    if query["address"]:
+        scores["address"] = getSimilarity(query["address"], index["address"][i])
+    if query["country"]:
+        scores["country"] = float(
+            str(d.get("country_s", "")).lower() == query["country"].lower()
+        )
+    if query["parent"] is not None:
+        scores["parent"] = float(query["parent"] in getValues(d.get("parentDocid_i")))
+    weights = dflt.DEFAULT_REF_STRUCTURE_WEIGHTS
+    total = sum(weights[k] for k in scores)
+    return sum(weights[k] * v for k, v in scores.items()) / total
+
+
+def findStructure(
+    name=None,
+    acronym=None,
+    address=None,
+    country=None,
+    parent=None,
+    threshold=dflt.DEFAULT_REF_STRUCTURE_THRESHOLD,
+    path=None,
+):
+    """Find HAL structure in local index from name, acronym, address, country (alpha2
+    code) and name of parent structure: return HAL ID and score (None if not found)"""
+    index = getIndex("structure", path)
+    if index is None or not (name or acronym):
+        return None
+    parentId = None
+    if parent:
+        found = findStructure(parent, threshold=threshold, path=path)
+        parentId = found[0] if found else -1
+    query = {
+        "acronym": acronym,
+        "address": normalizeText(address),
+        "country": country,
+        "parent": parentId,
+    }
+    results = list()
+    candidates = getStructureCandidates(index, name, acronym, parentId)
+    for i, nameScore in candidates.items():
+        score = scoreStructure(index, i, nameScore, query)
+        if score >= threshold:
+            valid = VALIDITY.get(index["docs"][i].get("valid_s"), len(VALIDITY))
+            results.append((-score, valid, i))
+    if not results:
+        return None
+    score, _, i = min(results)
+    return index["docs"][i]["docid"], -score
+
+
+def normalizeORCID(orcid):
+    """Normalize ORCID (16 characters without URL and hyphens)"""
+    if not orcid:
+        return None
+    n = re.sub(r"[^0-9X]", "", str(orcid).upper().rsplit("/", 1)[-1])
+    return n if len(n) == 16 else None
+
+
+def getAuthorKeys(firstname, lastname):
+    """Get keys of an author name: full normalized name and last name with initial"""
+    first = normalizeText(firstname)
+    last = normalizeText(lastname)
+    if not last:
+        return None, None
+    initial = "{} {}".format(first[:1], last) if first else None
+    if len(first) <= 1:
+        return None, initial
+    return "{} {}".format(first, last), initial
+
+
+def buildAuthorIndex(docs):
+    """Build index of authors over normalized names (full and initial of first name)
+    and ORCID"""
+    name = dict()
+    initial = dict()
+    orcid = dict()
+    for i, d in enumerate(docs):
+        full, short = getAuthorKeys(d.get("firstName_s"), d.get("lastName_s"))
+        if full:
+            name.setdefault(full, list()).append(i)
+        if short:
+            initial.setdefault(short, list()).append(i)
+        for o in getValues(d.get("orcidId_s")):
+            n = normalizeORCID(o)
+            if n:
+                orcid.setdefault(n, list()).append(i)
+    return {"docs": docs, "name": name, "initial": initial, "orcid": orcid}
+
+
+def getAuthorPerson(doc):
+    """Get person of an author form (forms of a person share their idHAL)"""
+    if doc.get("idHal_s"):
+        return "idhal:{}".format(doc["idHal_s"])
+    return "docid:{}".format(doc.get("docid"))
+
+
+def getStructureIds(doc):
+    """Get HAL IDs of structures linked to an author form"""
+    return [str(s) for s in getValues(doc.get("structureId_i"))]
+
+
+def getORCIDs(doc):
+    """Get normalized ORCIDs of an author form"""
+    return set(filter(None, map(normalizeORCID, getValues(doc.get("orcidId_s")))))
+
+
+def hasORCID(docs, forms, orcid):
+    """Check if forms of a person may have an ORCID (no stored ORCID or same one)"""
+    orcids = set().union(*(getORCIDs(docs[i]) for i in forms))
+    return not orcids or orcid in orcids
+
+
+def groupAuthorForms(docs, entries):
+    """Group author forms by person: {person: entries (preferred form first)}"""
+    persons = dict()
+    for i in entries:
+        persons.setdefault(getAuthorPerson(docs[i]), list()).append(i)
+    for p in persons.values():
+        p.sort(key=lambda i: VALIDITY.get(docs[i].get("valid_s"), len(VALIDITY)))
+    return persons
+
+
+def findAuthor(firstname=None, lastname=None, orcid=None, structures=None, path=None):
+    """Find HAL author in local index from ORCID, name and HAL IDs of affiliations:
+    return author form and how it was found (orcid, name or affiliation), or None
+    and candidate forms if name is ambiguous"""
+    index = getIndex("author", path)
+    if index is None:
+        return None, []
+    docs = index["docs"]
+    n = normalizeORCID(orcid)
+    if n in index["orcid"]:
+        persons = groupAuthorForms(docs, index["orcid"][n])
+        if len(persons) == 1:
+            return docs[list(persons.values())[0][0]], "orcid"
+    full, short = getAuthorKeys(firstname, lastname)
+    entries = index["name"].get(full)
+    # initial of first name only: found author must be linked to an affiliation
+    confirmed = bool(entries)
+    if not entries:
+        entries = index["initial"].get(short, [])
+    persons = groupAuthorForms(docs, entries)
+    if n:
+        # homonyms with another ORCID are different persons
+        persons = {p: forms for p, forms in persons.items() if hasORCID(docs, forms, n)}
+    if len(persons) == 1 and confirmed:
+        return docs[list(persons.values())[0][0]], "name"
+    if persons and structures:
+        # same name: keep persons linked to affiliations of author
+        structures = set(str(s) for s in structures)
+        linked = [
+            p
+            for p, forms in persons.items()
+            if any(structures.intersection(getStructureIds(docs[i])) for i in forms)
+        ]
+        if len(linked) == 1:
+            return docs[persons[linked[0]][0]], "affiliation"
+    return None, [docs[forms[0]] for forms in persons.values()]
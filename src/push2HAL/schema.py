@@ -0,0 +1,380 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL (validation of JSON input before building XML)
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import os
+import re
+import threading
+from lxml import etree
+import pycountry as pc
+
+from . import default as dflt
+from . import misc as m
+from . import libHAL as lib
+
+Logger = logging.getLogger("push2HAL")
+
+XS = "{%s}" % dflt.DEFAULT_XSD_URL_NAMESPACE
+
+
+def getMappingSpec(section):
+    """Get rules of a section of JSON input from its mapping to TEI (see libHAL.MAPPING)"""
+    spec = dict()
+    for field in lib.MAPPING[section]:
+        spec[field["key"]] = {
+            "kind": field.get("kind", "texts" if field.get("multiple") else "text"),
+            "xsd": [
+                (field["tag"], k, v) for k, v in field.get("attrib", dict()).items()
+            ],
+        }
+    return spec
+
+
+## JSON input format (key -> rule) read by buildXML
+##   kind of values: text, value (text or number), texts (text or list of texts), date,
+##   flag, lang, langText ({lang: text} or text), keywords ({lang: texts}), docType,
+##   dict (spec, required keys, text accepted or not) and list (item, single item accepted or not)
+##   xsd: (element, attribute, value) of XML elements: value must be accepted if the
+##   attribute is enumerated in XSD
+AUTHOR_SPEC = {
+    "firstname": "text",
+    "middle": "text",
+    "lastname": "text",
+    "role": "text",
+    "email": "text",
+    "idhal": "text",
+    "halauthor": "text",
+    "url": "text",
+    "orcid": "text",
+    "arxiv": "text",
+    "researcherid": "text",
+    "idref": "text",
+    "affiliation": "texts",
+    "affiliationHAL": "texts",
+}
+STRUCTURE_SPEC = {
+    "id": "text",
+    "type": "text",
+    "name": "text",
+    "acronym": "text",
+    "url": "text",
+    "parent": "text",
+    "address": {
+        "kind": "dict",
+        "spec": {"line": "text", "country": "text"},
+        "text": True,
+    },
+}
+SPEC = {
+    "type": "docType",
+    "lang": "lang",
+    "title": "langText",
+    "subtitle": "langText",
+    "abstract": "langText",
+    "authors": {
+        "kind": "list",
+        "item": {
+            "kind": "dict",
+            "spec": AUTHOR_SPEC,
+            "required": ["firstname", "lastname"],
+        },
+    },
+    "licence": {
+        "kind": "dict",
+        "spec": {"licence": "text"},
+        "required": ["licence"],
+        "text": True,
+    },
+    "notes": {"kind": "dict", "spec": getMappingSpec("notes")},
+    "ID": {"kind": "dict", "spec": getMappingSpec("ID")},
+    "infoDoc": {"kind": "dict", "spec": getMappingSpec("infoDoc")},
+    "series": {"kind": "dict", "spec": getMappingSpec("series")},
+    "extref": {"kind": "dict", "spec": getMappingSpec("extref")},
+    "keywords": "keywords",
+    "codes": {"kind": "dict", "spec": getMappingSpec("codes")},
+    "structures": {
+        "kind": "list",
+        "item": {"kind": "dict", "spec": STRUCTURE_SPEC, "required": ["name"]},
+        "single": True,
+    },
+    "file": "text",
+    "halId": "text",
+}
+REQUIRED = ["title", "authors"]
+DATE_PATTERN = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+
+## compiled validators ((XSD path, modification time, strict) -> validator)
+VALIDATORS = dict()
+VALIDATORS_LOCK = threading.Lock()
+
+
+def joinPath(path, key):
+    """Build path of a key in JSON input (for error messages)"""
+    if type(key) is int:
+        return "{}[{}]".format(path, key)
+    return "{}.{}".format(path, key) if path else key
+
+
+def getTypeName(value):
+    """Get name of the type of a value in JSON terms (for error messages)"""
+    if type(value) is dict:
+        return "object"
+    if type(value) is list:
+        return "array"
+    if type(value) is str:
+        return "text"
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def getXSDEnums(xsd_file_path=None):
+    """Get enumerated values of attributes in XSD: (element, attribute) -> values"""
+    tree = etree.parse(m.getXSDPath(xsd_file_path))
+    enums = dict()
+    for attr in tree.iter(XS + "attribute"):
+        values = [e.get("value") for e in attr.iter(XS + "enumeration")]
+        elem = next(attr.iterancestors(XS + "element"), None)
+        if values and elem is not None:
+            enums.setdefault((elem.get("name"), attr.get("name")), set()).update(values)
+    return enums
+
+
+def getLanguages():
+    """Get ISO 639-1 codes of languages"""
+    return {l.alpha_2 for l in pc.languages if hasattr(l, "alpha_2")}
+
+
+def checkText(value, path, errors):
+    """Check that value is a text"""
+    if type(value) is not str:
+        errors.append("{}: expected text, got {}".format(path, getTypeName(value)))
+
+
+def checkValue(value, path, errors):
+    """Check that value is a text or a number"""
+    if type(value) not in (str, int, float):
+        errors.append(
+            "{}: expected text or number, got {}".format(path, getTypeName(value))
+        )
+
+
+def checkTexts(value, path, errors):
+    """Check that value is a text or a list of texts"""
+    if type(value) is list:
+        for i, v in enumerate(value):
+            checkText(v, joinPath(path, i), errors)
+    else:
+        checkText(value, path, errors)
+
+
+def checkFlag(value, path, errors):
+    """Check that value is a flag (text, number or boolean)"""
+    if type(value) not in (str, int, float, bool):
+        errors.append(
+            "{}: expected text, number or boolean, got {}".format(
+                path, getTypeName(value)
+            )
+        )
+
+
+def checkDate(value, path, errors):
+    """Check that value is a date (YYYY, YYYY-MM or YYYY-MM-DD)"""
+    if type(value) is not str or not DATE_PATTERN.match(value):
+        errors.append("{}: expected date YYYY[-MM[-DD]], got {!r}".format(path, value))
+
+
+def checkDocType(value, path, errors):
+    """Check that value is a known type of document"""
+    if type(value) is not str:
+        errors.append("{}: expected text, got {}".format(path, getTypeName(value)))
+    elif value.lower() not in lib.DOC_TYPE_ALIASES:
+        errors.append("{}: unknown type of document {!r}".format(path, value))
+
+
+def compileLang(languages):
+    """Compile check of a language code"""
+
+    def check(value, path, errors):
+        if type(value) is not str or value not in languages:
+            errors.append("{}: unknown language {!r}".format(path, value))
+
+    return check
+
+
+def compileLangText(languages):
+    """Compile check of text(s) given as text or by language ({lang: text})"""
+    checkLang = compileLang(languages)
+
+    def check(value, path, errors):
+        if type(value) is dict:
+            for l, t in value.items():
+                checkLang(l, path, errors)
+                checkText(t, joinPath(path, l), errors)
+        else:
+            checkText(value, path, errors)
+
+    return check
+
+
+def compileKeywords(languages):
+    """Compile check of keywords given as texts or by language ({lang: texts})"""
+    checkLang = compileLang(languages)
+
+    def check(value, path, errors):
+        if type(value) is dict:
+            for l, t in value.items():
+                checkLang(l, path, errors)
+                checkTexts(t, joinPath(path, l), errors)
+        else:
+            checkTexts(value, path, errors)
+
+    return check
+
+
+def compileDict(spec, required, text, context):
+    """Compile check of a dictionary (known keys, required ones and their values)"""
+    checks = {k: compileRule(r, context) for k, r in spec.items()}
+    strict = context["strict"]
+
+    def check(value, path, errors):
+        if type(value) is not dict:
+            if not (text and type(value) is str):
+                errors.append(
+                    "{}: expected {}, got {}".format(
+                        path, "object or text" if text else "object", getTypeName(value)
+                    )
+                )
+            return
+        for k in required:
+            if not value.get(k):
+                errors.append("{}: missing".format(joinPath(path, k)))
+        for k, v in value.items():
+            c = checks.get(k)
+            if c is None:
+                if strict:
+                    errors.append("{}: unknown key".format(joinPath(path, k)))
+            elif v is not None:
+                c(v, joinPath(path, k), errors)
+
+    return check
+
+
+def compileList(item, single, context):
+    """Compile check of a list (and of its items)"""
+    checkItem = compileRule(item, context)
+
+    def check(value, path, errors):
+        if type(value) is not list:
+            if single:
+                checkItem(value, path, errors)
+            else:
+                errors.append(
+                    "{}: expected array, got {}".format(path, getTypeName(value))
+                )
+            return
+        for i, v in enumerate(value):
+            checkItem(v, joinPath(path, i), errors)
+
+    return check
+
+
+def compileForbidden(xsd):
+    """Compile check of a key that is not accepted by XSD"""
+    message = "{{}}: not accepted by XSD ({}/@{}={})".format(*xsd)
+
+    def check(value, path, errors):
+        errors.append(message.format(path))
+
+    return check
+
+
+## checks of values (kind -> check or function compiling it)
+CHECKS = {
+    "text": checkText,
+    "value": checkValue,
+    "texts": checkTexts,
+    "flag": checkFlag,
+    "date": checkDate,
+    "docType": checkDocType,
+}
+COMPILERS = {
+    "lang": compileLang,
+    "langText": compileLangText,
+    "keywords": compileKeywords,
+}
+
+
+def compileRule(rule, context):
+    """Compile a rule of JSON input format to a check function(value, path, errors)"""
+    if type(rule) is str:
+        rule = {"kind": rule}
+    for xsd in rule.get("xsd", []):
+        values = context["enums"].get(xsd[:2])
+        if values is not None and xsd[2] not in values:
+            return compileForbidden(xsd)
+    kind = rule["kind"]
+    if kind == "dict":
+        return compileDict(
+            rule["spec"], rule.get("required", []), rule.get("text", False), context
+        )
+    if kind == "list":
+        return compileList(rule["item"], rule.get("single", False), context)
+    if kind in COMPILERS:
+        return COMPILERS[kind](context["languages"])
+    return CHECKS[kind]
+
+
+def compileValidator(spec=SPEC, required=REQUIRED, xsd_file_path=None, strict=False):
+    """Compile validator of JSON input (constraints of spec checked against XSD)"""
+    Logger.debug("Compile JSON validator with {}".format(m.getXSDPath(xsd_file_path)))
+    context = {
+        "enums": getXSDEnums(xsd_file_path),
+        "languages": getLanguages(),
+        "strict": strict,
+    }
+    check = compileDict(spec, required, False, context)
+
+    def validate(data):
+        errors = list()
+        if type(data) is not dict:
+            errors.append("expected object, got {}".format(getTypeName(data)))
+        else:
+            check(data, "", errors)
+        return errors
+
+    return validate
+
+
+def getValidator(xsd_file_path=None, strict=False):
+    """Get compiled validator of JSON input (compiled once, again if XSD changes)"""
+    xsd_file_path = m.getXSDPath(xsd_file_path)
+    key = (xsd_file_path, os.path.getmtime(xsd_file_path), strict)
+    validator = VALIDATORS.get(key)
+    if validator is None:
+        with VALIDATORS_LOCK:
+            validator = VALIDATORS.get(key)
+            if validator is None:
+                validator = VALIDATORS[key] = compileValidator(
+                    xsd_file_path=xsd_file_path, strict=strict
+                )
+    return validator
+
+
+def checkJSON(data, xsd_file_path=None, strict=False, showError=True):
+    """Validate JSON input before building XML: return list of all errors
+    (strict: unknown keys are errors)"""
+    errors = getValidator(xsd_file_path, strict)(data)
+    if errors and showError:
+        Logger.error("JSON input is not valid ({} error(s))".format(len(errors)))
+        for error in errors:
+            Logger.error(error)
+    return errors
@@ -0,0 +1,395 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import os
+import json
+import time
+import random
+import threading
+import email.utils
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from concurrent.futures import Future
+
+from . import default as dflt
+from . import misc as m
+
+Logger = logging.getLogger("push2HAL")
+
+## shared HTTP session (built on first use) and its configuration
+SESSION = None
+SESSION_LOCK = threading.Lock()
+SESSION_CONFIG = {
+    "poolSize": dflt.DEFAULT_HTTP_POOL_SIZE,
+    "poolHosts": dflt.DEFAULT_HTTP_POOL_HOSTS,
+    "credentials": None,
+}
+
+
+def buildSession(
+    poolSize=dflt.DEFAULT_HTTP_POOL_SIZE, poolHosts=dflt.DEFAULT_HTTP_POOL_HOSTS
+):
+    """Build a new HTTP session with keep-alive connection pooling"""
+    Logger.debug(
+        "Build HTTP session (pool size: {}, hosts: {})".format(poolSize, poolHosts)
+    )
+    session = requests.Session()
+    session.headers["User-Agent"] = dflt.DEFAULT_HTTP_USER_AGENT
+    adapter = HTTPAdapter(pool_connections=poolHosts, pool_maxsize=poolSize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configureSession(poolSize=None, poolHosts=None, credentials=None):
+    """Configure the shared HTTP session (rebuilt on next use if pool changes, transport
+    policy bounded by the new pool size)"""
+    global SESSION
+    with SESSION_LOCK:
+        if credentials:
+            SESSION_CONFIG["credentials"] = credentials
+        if poolSize or poolHosts:
+            SESSION_CONFIG["poolSize"] = poolSize or SESSION_CONFIG["poolSize"]
+            SESSION_CONFIG["poolHosts"] = poolHosts or SESSION_CONFIG["poolHosts"]
+            if SESSION is not None:
+                SESSION.close()
+                SESSION = None
+    if poolSize:
+        # adaptive concurrency is bounded by the pool
+        configurePolicy(concurrencyMax=poolSize)
+
+
+def getSession():
+    """Get the shared HTTP session (build it if necessary)"""
+    global SESSION
+    if SESSION is None:
+        with SESSION_LOCK:
+            if SESSION is None:
+                SESSION = buildSession(
+                    SESSION_CONFIG["poolSize"], SESSION_CONFIG["poolHosts"]
+                )
+    return SESSION
+
+
+def dropSession():
+    """Drop shared HTTP session inherited by a child process (connections are not shared)"""
+    global SESSION, SESSION_LOCK
+    SESSION = None
+    SESSION_LOCK = threading.Lock()
+
+
+def resetChild():
+    """Reset state inherited by a child process (fork): HTTP session, transport policy
+    and requests in flight (locks may be held by threads of the parent)"""
+    global POLICY_LOCK, FLIGHT_LOCK, FLIGHTS
+    dropSession()
+    POLICY_LOCK = threading.Lock()
+    resetPolicy()
+    FLIGHT_LOCK = threading.Lock()
+    FLIGHTS = dict()
+    for name in FLIGHT_STATS:
+        FLIGHT_STATS[name] = 0
+
+
+def closeSession():
+    """Close the shared HTTP session and its pooled connections"""
+    global SESSION
+    with SESSION_LOCK:
+        if SESSION is not None:
+            Logger.debug("Close HTTP session")
+            SESSION.close()
+            SESSION = None
+
+
+## transport policy (rate limiter, retries and adaptive concurrency) per endpoint family
+POLICY = dict()
+POLICY_LOCK = threading.Lock()
+
+
+def resetPolicy():
+    """Reset transport policy to default one"""
+    with POLICY_LOCK:
+        POLICY.clear()
+        for family, conf in dflt.DEFAULT_HTTP_POLICY.items():
+            POLICY[family] = dict(conf)
+            POLICY[family].update(
+                {
+                    "maxRetries": dflt.DEFAULT_HTTP_MAX_RETRIES,
+                    "backoff": dflt.DEFAULT_HTTP_BACKOFF,
+                    "backoffMax": dflt.DEFAULT_HTTP_BACKOFF_MAX,
+                    # token bucket
+                    "tokens": conf["burst"],
+                    "last": time.monotonic(),
+                    # adaptive concurrency (AIMD)
+                    "concurrency": float(SESSION_CONFIG["poolSize"]),
+                    "concurrencyMax": SESSION_CONFIG["poolSize"],
+                    "inflight": 0,
+                    "cond": threading.Condition(POLICY_LOCK),
+                }
+            )
+
+
+def configurePolicy(family=None, **kwargs):
+    """Configure transport policy of a family (search, ref, sword) or all of them
+    (rate, burst, timeout, maxRetries, backoff, backoffMax, concurrencyMax)"""
+    with POLICY_LOCK:
+        for f in [family] if family else list(POLICY.keys()):
+            POLICY[f].update(kwargs)
+            if "burst" in kwargs:
+                POLICY[f]["tokens"] = kwargs["burst"]
+            if "concurrencyMax" in kwargs:
+                POLICY[f]["concurrency"] = float(kwargs["concurrencyMax"])
+
+
+def getFamily(url):
+    """Get endpoint family of url (search, ref or sword)"""
+    if "/sword/" in url:
+        return "sword"
+    if "/ref/" in url:
+        return "ref"
+    return "search"
+
+
+def reserveToken(family):
+    """Reserve a token of the rate limiter: return delay to wait before sending"""
+    with POLICY_LOCK:
+        policy = POLICY[family]
+        if not policy["rate"]:
+            return 0
+        now = time.monotonic()
+        policy["tokens"] = min(
+            policy["burst"], policy["tokens"] + (now - policy["last"]) * policy["rate"]
+        )
+        policy["last"] = now
+        # negative tokens: delayed requests are served in order
+        policy["tokens"] -= 1
+        if policy["tokens"] >= 0:
+            return 0
+        return -policy["tokens"] / policy["rate"]
+
+
+def acquireSlot(family):
+    """Wait for a slot of the adaptive concurrency controller"""
+    policy = POLICY[family]
+    with policy["cond"]:
+        while policy["inflight"] >= max(1, int(policy["concurrency"])):
+            policy["cond"].wait()
+        policy["inflight"] += 1
+
+
+def releaseSlot(family, failed=False):
+    """Release a slot and adapt concurrency (additive increase, multiplicative decrease)"""
+    policy = POLICY[family]
+    with policy["cond"]:
+        policy["inflight"] -= 1
+        adaptConcurrency(policy, failed)
+        policy["cond"].notify_all()
+
+
+def adaptConcurrency(policy, failed=False):
+    """Adapt allowed concurrency after a request (lock must be held)"""
+    if failed:
+        policy["concurrency"] = max(
+            dflt.DEFAULT_HTTP_CONCURRENCY_MIN,
+            policy["concurrency"] * dflt.DEFAULT_HTTP_CONCURRENCY_DECREASE,
+        )
+        Logger.debug("Decrease concurrency: {:.2f}".format(policy["concurrency"]))
+    else:
+        policy["concurrency"] = min(
+            policy["concurrencyMax"],
+            policy["concurrency"] + 1.0 / policy["concurrency"],
+        )
+
+
+def isThrottled(status):
+    """Check if status code means that server is throttling or failing"""
+    return status == 429 or status >= 500
+
+
+def getRetryAfter(headers):
+    """Get delay (s) requested by server in Retry-After header (None if not provided)"""
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, date.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def getRetryDelay(family, attempt, retryAfter=None):
+    """Get delay before retry (Retry-After if provided, else jittered exponential backoff)"""
+    policy = POLICY[family]
+    if retryAfter is not None:
+        return min(retryAfter, policy["backoffMax"])
+    return random.uniform(0, min(policy["backoffMax"], policy["backoff"] * 2**attempt))
+
+
+def isRetried(method, status):
+    """Check if a request could be retried after a response with status"""
+    if method == "POST":
+        return status in dflt.DEFAULT_HTTP_RETRY_STATUS_POST
+    return status in dflt.DEFAULT_HTTP_RETRY_STATUS
+
+
+def isRetriedError(method, error):
+    """Check if a request could be retried after a network failure (POST only if not sent)"""
+    if method == "POST":
+        return isinstance(error, requests.exceptions.ConnectTimeout)
+    return isinstance(
+        error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    )
+
+
+def request(method, url, **kwargs):
+    """Run request through the shared session with transport policy
+    (rate limiter, adaptive concurrency, timeout and retries with backoff)"""
+    family = getFamily(url)
+    policy = POLICY[family]
+    kwargs.setdefault("timeout", policy["timeout"])
+    attempt = 0
+    while True:
+        delay = reserveToken(family)
+        if delay > 0:
+            Logger.debug("Rate limit ({}): wait {:.3f}s".format(family, delay))
+            time.sleep(delay)
+        acquireSlot(family)
+        try:
+            response = getSession().request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            releaseSlot(family, failed=True)
+            if not isRetriedError(method, e) or attempt >= policy["maxRetries"]:
+                raise
+            Logger.warning("Request failed ({}): retry".format(e))
+            retryAfter = None
+        else:
+            releaseSlot(family, failed=isThrottled(response.status_code))
+            if (
+                not isRetried(method, response.status_code)
+                or attempt >= policy["maxRetries"]
+            ):
+                return response
+            Logger.warning(
+                "Request failed (status code: {}): retry".format(response.status_code)
+            )
+            retryAfter = getRetryAfter(response.headers)
+            # release connection (streamed response)
+            response.close()
+        delay = getRetryDelay(family, attempt, retryAfter)
+        Logger.debug("Retry {} in {:.3f}s".format(attempt + 1, delay))
+        time.sleep(delay)
+        attempt += 1
+        # rewind data to send again
+        if hasattr(kwargs.get("data"), "seek"):
+            kwargs["data"].seek(0)
+
+
+## identical requests in flight (key -> future shared by callers) and counters
+FLIGHTS = dict()
+FLIGHT_LOCK = threading.Lock()
+FLIGHT_STATS = {"request": 0, "coalesced": 0}
+
+
+def getFlightKey(url, params=None):
+    """Build key identifying a request from url and query parameters"""
+    return json.dumps([url, sorted((params or dict()).items())], default=str)
+
+
+def countFlight(name):
+    """Increment single-flight counter"""
+    with FLIGHT_LOCK:
+        FLIGHT_STATS[name] += 1
+
+
+def getFlightStats():
+    """Get counters of sent and coalesced requests (current process)"""
+    with FLIGHT_LOCK:
+        return dict(FLIGHT_STATS)
+
+
+def singleFlight(key, func):
+    """Run func once for identical calls in flight (other callers wait for its result)"""
+    with FLIGHT_LOCK:
+        future = FLIGHTS.get(key)
+        leader = future is None
+        if leader:
+            future = FLIGHTS[key] = Future()
+        FLIGHT_STATS["request" if leader else "coalesced"] += 1
+    if not leader:
+        Logger.debug("Coalesced request: {}".format(key))
+        return future.result()
+    try:
+        result = func()
+    except BaseException as e:
+        with FLIGHT_LOCK:
+            FLIGHTS.pop(key, None)
+        future.set_exception(e)
+        raise
+    with FLIGHT_LOCK:
+        FLIGHTS.pop(key, None)
+    future.set_result(result)
+    return result
+
+
+def getShared(url, params=None):
+    """Run GET request coalesced with identical ones in flight: return status code and content"""
+
+    def run():
+        response = get(url, params=params)
+        return response.status_code, response.content
+
+    return singleFlight(getFlightKey(url, params), run)
+
+
+def getCredentials(credentials=None):
+    """Get credentials for SWORD API (provided ones, shared ones or loaded from default file)"""
+    if not credentials:
+        credentials = SESSION_CONFIG["credentials"]
+    if not credentials:
+        credentials = m.load_credentials()
+        if credentials:
+            SESSION_CONFIG["credentials"] = credentials
+    return credentials
+
+
+def getAuth(credentials=None):
+    """Get authentication for SWORD API"""
+    credentials = getCredentials(credentials)
+    if not credentials:
+        return None
+    return HTTPBasicAuth(credentials["login"], credentials["passwd"])
+
+
+def get(url, **kwargs):
+    """Run GET request through the shared session"""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Run POST request through the shared session"""
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    """Run PUT request through the shared session"""
+    return request("PUT", url, **kwargs)
+
+
+resetPolicy()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=resetChild)
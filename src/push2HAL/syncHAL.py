@@ -0,0 +1,241 @@
+####*****************************************************************************************
+####*****************************************************************************************
+####*****************************************************************************************
+#### Library part of push2HAL (sync of records already in HAL: diff against current TEI)
+#### Copyright - 2024 - Luc Laurent (luc.laurent@lecnam.net)
+####
+#### description available on https://github.com/luclaurent/push2HAL
+####*****************************************************************************************
+####*****************************************************************************************
+
+
+import logging
+import re
+import hashlib
+from collections import Counter
+from lxml import etree
+
+from . import default as dflt
+from . import libHAL as lib
+from . import refHAL
+
+Logger = logging.getLogger("push2HAL")
+
+NS = {"tei": dflt.DEFAULT_TEI_URL_NAMESPACE}
+
+## elements of biblFull added or rewritten by HAL (ignored by diff)
+IGNORED = [
+    "tei:editionStmt",
+    "tei:publicationStmt/tei:distributor",
+    "tei:publicationStmt/tei:idno",
+    "tei:seriesStmt",
+    "tei:titleStmt/tei:editor[@role='depositor']",
+    ".//tei:funder",
+    ".//tei:idno[@type='stamp']",
+    ".//tei:idno[@type='halId']",
+    ".//tei:idno[@type='halUri']",
+    ".//tei:idno[@type='halBibtex']",
+    ".//tei:idno[@type='halRefHtml']",
+    ".//tei:idno[@type='halRef']",
+    ".//tei:idno[@type='halauthor']",
+    ".//tei:idno[@type='halauthorid']",
+    ".//tei:idno[@type='idhal'][@notation='numeric']",
+    ".//tei:email[@type='domain']",
+    ".//tei:classCode[@scheme='halOldTypology']",
+    ".//tei:classCode[@scheme='halTreeTypology']",
+]
+## journal metadata replaced by HAL from its referential (if HAL journal id is given)
+HAL_JOURNAL = [
+    ".//tei:monogr/tei:title[@level='j']",
+    ".//tei:monogr/tei:idno[@type='issn']",
+    ".//tei:monogr/tei:idno[@type='eissn']",
+    ".//tei:imprint/tei:publisher",
+]
+## elements filled by HAL (journal referential, typology) in current record: not
+## removed from deposited record if missing in it
+IGNORED_CURRENT = HAL_JOURNAL + [".//tei:classCode[@scheme='halTypology']"]
+## attributes set in deposited records (others are added by HAL: notation, status...)
+ATTRIBUTES = {
+    "ident",
+    "key",
+    "lang",
+    "level",
+    "n",
+    "ref",
+    "role",
+    "scheme",
+    "subtype",
+    "target",
+    "type",
+    "unit",
+}
+## coded elements compared by their code (label added by HAL)
+CODED = {"note": "n", "language": "ident", "classCode": "n", "licence": "target"}
+## elements compared by their whole text (paragraphs added by HAL)
+UNWRAPPED = {"abstract"}
+## references to HAL structures in current record (local structures resolved by HAL)
+HAL_STRUCT = ".//tei:affiliation[starts-with(@ref, '#struct-')]"
+## repeated elements whose order matters (position kept in path)
+ORDERED = {"author"}
+## prefix of references to structures declared in deposited record (unknown in HAL)
+LOCAL_STRUCT = "#localStruct-"
+URL_PATTERN = re.compile(r"^https?://(www\.)?", re.IGNORECASE)
+
+
+def normaliseValue(value):
+    """Normalise text or attribute value (spaces, and scheme and slashes of URLs)"""
+    value = " ".join(value.split())
+    if URL_PATTERN.match(value):
+        value = re.sub("/+", "/", URL_PATTERN.sub("", value)).rstrip("/").lower()
+    return value
+
+
+def getStep(elem, position=None):
+    """Get step of path of an element (local name, attributes set in deposited records
+    and position)"""
+    name = etree.QName(elem).localname
+    attrib = sorted(
+        (etree.QName(k).localname, normaliseValue(v)) for k, v in elem.attrib.items()
+    )
+    attrib = [(k, v) for k, v in attrib if k in ATTRIBUTES]
+    step = name
+    if attrib:
+        step += "[{}]".format(",".join("{}={}".format(k, v) for k, v in attrib))
+    if position is not None:
+        step += "#{}".format(position)
+    return step
+
+
+def isORCID(elem):
+    """Check if an element is an ORCID (type is ORCID in HAL, ORCID URL in deposit)"""
+    return (
+        etree.QName(elem).localname == "idno"
+        and "orcid" in elem.get("type", "").lower()
+    )
+
+
+def getLeafText(elem):
+    """Get step and normalised text of a leaf element (e-mails hashed as HAL does,
+    canonical ORCID and no label of coded elements)"""
+    name = etree.QName(elem).localname
+    if name in UNWRAPPED:
+        text = normaliseValue(" ".join(elem.itertext()))
+    else:
+        text = normaliseValue(elem.text or "")
+    if name == "email" and not elem.attrib and text:
+        return "email[type=md5]", hashlib.md5(text.lower().encode("utf-8")).hexdigest()
+    if isORCID(elem):
+        return "idno[type=orcid]", refHAL.normalizeORCID(text) or text
+    if name in CODED and elem.get(CODED[name]) is not None:
+        text = ""
+    return getStep(elem), text
+
+
+def addFacts(elem, path, ignored, facts):
+    """Add facts of children of an element (path and text of each leaf)"""
+    positions = Counter()
+    for child in elem:
+        if not isinstance(child.tag, str) or child in ignored:
+            continue
+        if child.get("ref", "").startswith(LOCAL_STRUCT):
+            continue
+        position = None
+        name = etree.QName(child).localname
+        if name in ORDERED:
+            position = positions[name]
+            positions[name] += 1
+        if len(child) and name not in UNWRAPPED:
+            addFacts(child, path + (getStep(child, position),), ignored, facts)
+            continue
+        step, text = getLeafText(child)
+        if text or child.attrib:
+            facts["{}: {}".format("/".join(path + (step,)), text)] += 1
+
+
+def getBiblFull(tei):
+    """Get biblFull element of a TEI record"""
+    if etree.QName(tei).localname == "biblFull":
+        return tei
+    return tei.find(".//{}biblFull".format(lib.TEI))
+
+
+def getFacts(tei, extra=()):
+    """Get facts of a TEI record: normalised path and text of each leaf element
+    (elements added by HAL and ones matching extra xpaths are ignored)"""
+    facts = Counter()
+    biblFull = getBiblFull(tei)
+    if biblFull is None:
+        return facts
+    ignored = set()
+    for xpath in IGNORED + list(extra):
+        ignored.update(biblFull.xpath(xpath, namespaces=NS))
+    addFacts(biblFull, (), ignored, facts)
+    return facts
+
+
+def hasLocalStructures(tei):
+    """Check if a TEI record references structures declared in it"""
+    xpath = ".//tei:affiliation[starts-with(@ref, '{}')]".format(LOCAL_STRUCT)
+    return bool(getBiblFull(tei).xpath(xpath, namespaces=NS))
+
+
+def hasJournalId(tei):
+    """Check if a TEI record gives the HAL id of its journal"""
+    xpath = ".//tei:monogr/tei:idno[@type='halJournalId']"
+    return bool(getBiblFull(tei).xpath(xpath, namespaces=NS))
+
+
+def diffTEI(newTEI, currentTEI):
+    """Semantic diff of a record with its current version in HAL: return facts of new
+    record missing in HAL and facts of HAL removed from new record (prefixed by "-";
+    metadata only added by HAL are not differences)"""
+    extra = list(IGNORED_CURRENT)
+    if hasLocalStructures(newTEI):
+        extra.append(HAL_STRUCT)
+    journal = HAL_JOURNAL if hasJournalId(newTEI) else []
+    newFacts = getFacts(newTEI, journal)
+    missing = newFacts - getFacts(currentTEI, journal)
+    removed = getFacts(currentTEI, extra) - newFacts
+    return sorted(missing.elements()) + sorted("-" + f for f in removed.elements())
+
+
+def hasFile(tei):
+    """Check if a TEI record declares a file"""
+    return tei.find(".//{0}editionStmt//{0}ref[@type='file']".format(lib.TEI)) is not None
+
+
+def getCurrentTEI(halId):
+    """Download current TEI of a record in HAL (None if not found)"""
+    return lib.getTEIsFromHAL([halId]).get(halId)
+
+
+def findHalId(data):
+    """Find HAL id of a record from JSON data (given one or found from DOI)"""
+    halId = data.get("halId")
+    if halId:
+        return halId
+    doi = (data.get("extref") or dict()).get("doi")
+    if doi:
+        return lib.getHalIdsFromDois([doi]).get(doi)
+    return None
+
+
+def getSyncAction(newTEI, currentTEI, pdf_path=None):
+    """Choose action to sync a record with HAL: return action (deposit, file, metadata
+    or unchanged) and differences"""
+    if currentTEI is None:
+        return "deposit", []
+    differences = diffTEI(newTEI, currentTEI)
+    if pdf_path and not hasFile(currentTEI):
+        action = "file"
+    elif differences:
+        action = "metadata"
+    else:
+        action = "unchanged"
+    Logger.info("Sync: {} ({} difference(s))".format(action, len(differences)))
+    for d in differences:
+        if d.startswith("-"):
+            Logger.debug("Removed from record: {}".format(d[1:]))
+        else:
+            Logger.debug("Not in HAL: {}".format(d))
+    return action, differences
@@ -0,0 +1,85 @@
+"""Benchmark: buildXML on records with many authors and affiliations (consortium papers):
+time and peak memory (tracemalloc) for 10, 100, 1000 and 5000 authors
+
+usage: python tests/bench_authors.py [number of authors...]
+(run with PYTHONPATH pointing to another tree to compare implementations)
+"""
+
+import sys
+import time
+import random
+import logging
+import tracemalloc
+import pycountry as pc
+from push2HAL import libHAL
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+def getRecord(nbAuthors):
+    """Record with one structure for 10 authors (at least 5), authors affiliated to
+    1 to 3 structures (some listed twice) and structures sharing a few addresses"""
+    rnd = random.Random(nbAuthors)
+    countries = [c.name for c in pc.countries][:20]
+    nbStructures = max(5, nbAuthors // 10)
+    structures = [
+        {
+            "id": "s{}".format(i),
+            "name": "Laboratory {} of physics".format(i),
+            "acronym": "L{}".format(i),
+            "address": "Street {}, City, {}".format(i % 7, countries[i % 20]),
+        }
+        for i in range(nbStructures)
+    ]
+    authors = list()
+    for i in range(nbAuthors):
+        affiliations = rnd.sample(structures, rnd.randint(1, 3))
+        affiliations = [s["id"] for s in affiliations]
+        if i % 4 == 0:
+            affiliations.append(affiliations[0])
+        authors.append(
+            {
+                "firstname": "First{}".format(i),
+                "lastname": "Last{}".format(i),
+                "role": "aut",
+                "email": "author{}@lab.org".format(i),
+                "orcid": "0000-0000-0000-{:04d}".format(i % 10000),
+                "affiliation": affiliations,
+            }
+        )
+    return {
+        "title": {"en": "A consortium paper"},
+        "type": "ART",
+        "lang": "en",
+        "authors": authors,
+        "structures": structures + structures[:2],
+        "ID": {"halJournalId": "12345"},
+        "abstract": {"en": "abstract"},
+    }
+
+
+def run(nbAuthors):
+    record = getRecord(nbAuthors)
+    # time without tracing (tracemalloc slows allocations down), then peak memory
+    start = time.perf_counter()
+    tei = libHAL.buildXML(record)
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    libHAL.buildXML(record)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    affiliations = len(tei.findall(".//{*}affiliation"))
+    orgs = len(tei.findall(".//{*}org"))
+    print(
+        "{:6d} authors: {:8.1f} ms, peak {:8.1f} kB ({} affiliations, {} org)".format(
+            nbAuthors, 1e3 * duration, peak / 1024, affiliations, orgs
+        )
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 100, 1000, 5000]
+    # build country index and tables once
+    libHAL.buildXML(getRecord(1))
+    for nb in sizes:
+        run(nb)
@@ -0,0 +1,59 @@
+"""Benchmark: records one after the other vs batch mode (process pool and upload pool)
+against a local fake HAL (with SWORD latency)
+
+usage: python tests/bench_batch.py [number of records] [latency in s] [jobs]
+(structures are included: addresses are resolved to countries when records are built)
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import logging
+from push2HAL import default as dflt
+from push2HAL import execHAL, misc, session
+
+from fakeHAL import FakeHAL, TEI_XSD
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    jobs = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    path = os.path.join(os.path.dirname(__file__), "..", "examples", "test.json")
+    with open(path) as f:
+        data = json.load(f)
+    # no network: journal id is known
+    data["ID"]["halJournalId"] = "12345"
+    credentials = {"login": "login", "passwd": "passwd"}
+    with tempfile.TemporaryDirectory() as tmp, FakeHAL(delay=delay) as fake:
+        dflt.HAL_SWORD_PRE_API_URL = fake.url + "sword/hal/"
+        session.configurePolicy(rate=None)
+        xsd = os.path.join(tmp, "tei.xsd")
+        with open(xsd, "w") as f:
+            f.write(TEI_XSD)
+        misc.useXSD(xsd)
+        for i in range(nb):
+            with open(os.path.join(tmp, "record{:05d}.json".format(i)), "w") as f:
+                json.dump(data, f)
+        paths = execHAL.getBatchPaths(tmp)
+        start = time.perf_counter()
+        for p in paths:
+            execHAL.uploadBatchRecord(
+                execHAL.prepareBatchRecord(p), credentials, "preprod"
+            )
+        tSerial = time.perf_counter() - start
+        start = time.perf_counter()
+        execHAL.runBatchJSON2HAL(
+            tmp,
+            jobs=jobs,
+            results=os.path.join(tmp, "results.jsonl"),
+            credentials=credentials,
+        )
+        tBatch = time.perf_counter() - start
+        print("one after the other: {:8.3f} s ({} records)".format(tSerial, nb))
+        print("batch ({} jobs):     {:8.3f} s".format(jobs, tBatch))
+        print("speedup:             {:8.1f}x".format(tSerial / tBatch))
@@ -0,0 +1,41 @@
+"""Benchmark: records built per second by buildXML (examples/test.json-shaped inputs)
+
+usage: python tests/bench_build.py [number of records] [--structures]
+(structures, with countries resolved from addresses, are not included by default)
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import logging
+from push2HAL import libHAL
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+def getRecords(nb, structures=False):
+    path = os.path.join(os.path.dirname(__file__), "..", "examples", "test.json")
+    with open(path) as f:
+        data = json.load(f)
+    # no network: journal id is known
+    data["ID"]["halJournalId"] = "12345"
+    if not structures:
+        data.pop("structures", None)
+    records = list()
+    for i in range(nb):
+        record = copy.deepcopy(data)
+        record["title"] = {k: "{} {}".format(v, i) for k, v in record["title"].items()}
+        records.append(record)
+    return records
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    records = getRecords(nb, "--structures" in sys.argv)
+    start = time.perf_counter()
+    for r in records:
+        libHAL.buildXML(r)
+    duration = time.perf_counter() - start
+    print("{:10.1f} records/s ({} records)".format(nb / duration, nb))
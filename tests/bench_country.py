@@ -0,0 +1,54 @@
+"""Benchmark: addresses per second through misc.getCountryFromText and
+misc.getAlpha2Country (country code of each address, as done for structures)
+
+usage: python tests/bench_country.py [number of addresses]
+(run with PYTHONPATH pointing to another tree to compare implementations)
+"""
+
+import sys
+import time
+import random
+import logging
+import pycountry as pc
+from push2HAL import misc
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+def getAddresses(nb):
+    rnd = random.Random(0)
+    countries = list(pc.countries)
+    addresses = list()
+    for i in range(nb):
+        country = rnd.choice(countries)
+        name = country.alpha_3 if i % 5 == 0 else country.name
+        addresses.append(
+            "Laboratory {}, {} Main street, {:05d} Some City, {}".format(
+                i, rnd.randint(1, 500), rnd.randint(0, 99999), name
+            )
+        )
+    return addresses
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    addresses = getAddresses(nb)
+    start = time.perf_counter()
+    misc.getCountryFromText(addresses[0])
+    print("first call (index built): {:.1f} ms".format(1e3 * (time.perf_counter() - start)))
+    start = time.perf_counter()
+    found = [misc.getCountryFromText(a) for a in addresses]
+    duration = time.perf_counter() - start
+    print(
+        "{:10.1f} addresses/s ({} addresses, {} found)".format(
+            nb / duration, nb, sum(f is not None for f in found)
+        )
+    )
+    start = time.perf_counter()
+    codes = [misc.getAlpha2Country(f) for f in found]
+    duration = time.perf_counter() - start
+    print(
+        "{:10.1f} country codes/s ({} codes, {} found)".format(
+            nb / duration, nb, sum(c is not None for c in codes)
+        )
+    )
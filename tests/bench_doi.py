@@ -0,0 +1,34 @@
+"""Benchmark: one query per DOI vs bulk DOI checks against a local fake HAL (with latency)
+
+usage: python tests/bench_doi.py [number of DOIs] [latency in s]
+"""
+
+import sys
+import time
+from push2HAL import default as dflt
+from push2HAL import libHAL, session
+
+from fakeHAL import FakeHAL
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    docs = [
+        {"halId_s": "hal-{:06d}".format(i), "doiId_id": "10.1000/{}".format(i)}
+        for i in range(0, nb, 3)
+    ]
+    dois = ["10.1000/{}".format(i) for i in range(nb)]
+    with FakeHAL(docs={"/search/": docs}, delay=delay) as fake:
+        dflt.HAL_API_SEARCH_URL = fake.url + "search/"
+        session.configurePolicy(rate=None)
+        start = time.perf_counter()
+        serial = {d: libHAL.checkDoiInHAL(d) for d in dois}
+        tSerial = time.perf_counter() - start
+        start = time.perf_counter()
+        bulk = libHAL.checkDoisInHAL(dois)
+        tBulk = time.perf_counter() - start
+        assert all(serial[d] == (bulk[d] is not None) for d in dois)
+        print("one query per DOI: {:8.3f} s ({} queries)".format(tSerial, nb))
+        print("bulk:              {:8.3f} s".format(tBulk))
+        print("speedup:           {:8.1f}x".format(tSerial / tBulk))
@@ -0,0 +1,69 @@
+"""Benchmark: records per second through the mapped sections of buildXML
+(IDs, notes, document info, series, external references and classification codes)
+
+usage: python tests/bench_mapping.py [number of records]
+(run with PYTHONPATH pointing to another tree to compare implementations)
+"""
+
+import sys
+import time
+import logging
+from lxml import etree
+from push2HAL import libHAL
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+RECORD = {
+    "ID": {
+        "isbn": "978-1725183483",
+        "reportNumber": "RR-1234",
+        "halJournalId": "12345",
+        "issn": "0378-5955",
+        "booktitle": "A book",
+    },
+    "notes": {
+        "invited": "yes",
+        "audience": "international",
+        "popular": "no",
+        "peer": "yes",
+        "proceedings": "no",
+        "comment": "small comment",
+        "description": "small description",
+    },
+    "infoDoc": {
+        "publisher": "springer",
+        "volume": "20",
+        "issue": "1",
+        "pages": "10-25",
+        "serie": "a special collection",
+        "datePub": "2024-01-01",
+    },
+    "series": {"editor": "Pr X Yy", "title": "A great series"},
+    "extref": {
+        "doi": "10.1000/xyz",
+        "arxiv": "2401.00001",
+        "publisher": "https://publisher.com/ID",
+        "link1": "https://link1.com/ID",
+        "link2": "https://link2.com/ID",
+    },
+    "codes": {"acm": "I.6", "halDomain": ["phys", "spi.meca"]},
+}
+
+
+def buildSections(record):
+    monogr = etree.Element(libHAL.TEI + "monogr")
+    libHAL.setIDS(monogr, record["ID"])
+    libHAL.setNotes(etree.Element(libHAL.TEI + "biblFull"), record["notes"])
+    libHAL.setInfoDoc(etree.SubElement(monogr, libHAL.TEI + "imprint"), record["infoDoc"])
+    libHAL.setSeries(etree.Element(libHAL.TEI + "series"), record["series"])
+    libHAL.setRef(etree.Element(libHAL.TEI + "biblStruct"), record["extref"])
+    libHAL.setCodes(etree.Element(libHAL.TEI + "textClass"), record["codes"])
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    start = time.perf_counter()
+    for _ in range(nb):
+        buildSections(RECORD)
+    duration = time.perf_counter() - start
+    print("{:10.1f} records/s ({} records)".format(nb / duration, nb))
@@ -0,0 +1,30 @@
+"""Benchmark: pooled (shared session) vs unpooled HTTP requests against a local fake HAL
+
+usage: python tests/bench_session.py [number of requests]
+"""
+
+import sys
+import time
+import requests
+from push2HAL import session
+
+from fakeHAL import FakeHAL
+
+
+def run(fun, url, nb):
+    start = time.perf_counter()
+    for _ in range(nb):
+        fun(url, params={"q": "doiId_id:10.1/a", "wt": "json"}).json()
+    return nb / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with FakeHAL(docs={"/search/": [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]}) as fake:
+        url = fake.url + "search/"
+        session.configurePolicy(rate=None)
+        unpooled = run(requests.get, url, nb)
+        pooled = run(session.get, url, nb)
+        print("unpooled: {:8.1f} req/s ({} connections)".format(unpooled, nb))
+        print("pooled:   {:8.1f} req/s".format(pooled))
+        print("speedup:  {:8.2f}x".format(pooled / unpooled))
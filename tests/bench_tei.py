@@ -0,0 +1,66 @@
+"""Benchmark: peak memory of TEI parsing (full tree vs stream) on a large response
+
+usage: python tests/bench_tei.py [number of documents]
+(each parsing runs in its own process: peak RSS includes memory of libxml2)
+"""
+
+import sys
+import time
+import resource
+from multiprocessing import Pool
+from lxml import etree
+from push2HAL import default as dflt
+from push2HAL import libHAL
+
+BIBL = (
+    "<biblFull><titleStmt><title>Title of document {0}</title>"
+    "<author><persName><forename>John</forename><surname>Doe</surname></persName>"
+    "</author></titleStmt><publicationStmt><distributor>CCSD</distributor>"
+    '<idno type="halId">hal-{0:08d}</idno></publicationStmt>'
+    "<notesStmt>{1}</notesStmt></biblFull>"
+)
+
+
+def measure(func, nb):
+    content = buildContent(nb)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    found = func(content)
+    duration = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    return found, duration, peak * 1024
+
+
+def buildContent(nb):
+    notes = '<note type="popular" n="0">No</note>' * 10
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><TEI xmlns="{}"><teiHeader/>'
+        "<text><body><listBibl>{}</listBibl></body></text></TEI>".format(
+            dflt.DEFAULT_TEI_URL_NAMESPACE,
+            "".join(BIBL.format(i, notes) for i in range(nb)),
+        )
+    ).encode("utf-8")
+
+
+def parseFull(content):
+    # previous behavior: decoded text, encoded again and parsed as one tree
+    tei = etree.fromstring(content.decode("utf-8").encode("utf-8"))
+    return sum(1 for _ in libHAL.splitTEI(tei))
+
+
+def parseStream(content):
+    chunks = (
+        content[i : i + dflt.DEFAULT_STREAM_CHUNK_SIZE]
+        for i in range(0, len(content), dflt.DEFAULT_STREAM_CHUNK_SIZE)
+    )
+    return sum(1 for _ in libHAL.parseTEIStream(chunks))
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("response: {:.1f} MB ({} documents)".format(len(buildContent(nb)) / 1e6, nb))
+    for name, func in (("full tree", parseFull), ("stream", parseStream)):
+        with Pool(1) as pool:
+            found, duration, peak = pool.apply(measure, (func, nb))
+        assert found == nb
+        print("{:10s} {:8.3f} s  peak RSS +{:8.1f} MB".format(name, duration, peak / 1e6))
@@ -0,0 +1,72 @@
+"""Benchmark: peak memory (tracemalloc) and throughput of libHAL.upload2HAL for
+payloads of growing size, sent to a local server discarding what it receives
+
+usage: python tests/bench_upload.py [size of payloads in MB...]
+(run with PYTHONPATH pointing to another tree to compare implementations)
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from push2HAL import default as dflt
+from push2HAL import libHAL, session
+
+from fakeHAL import SWORD_OK
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        while length > 0:
+            length -= len(self.rfile.read(min(length, 1 << 16)))
+        payload = SWORD_OK.format(hal_id="hal-00000001").encode("utf-8")
+        self.send_response(201)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def run(url, size):
+    path = os.path.join(tempfile.mkdtemp(), "upload.zip")
+    with open(path, "wb") as f:
+        for _ in range(size):
+            f.write(os.urandom(1024 * 1024))
+    credentials = {"login": "login", "passwd": "passwd"}
+    headers = {"Content-Type": "application/zip"}
+    dflt.HAL_SWORD_PRE_API_URL = url
+    tracemalloc.start()
+    start = time.perf_counter()
+    libHAL.upload2HAL(path, headers, credentials)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(path)
+    print(
+        "{:5d} MB: peak {:10.1f} kB, {:8.1f} MB/s".format(
+            size, peak / 1024, size / duration
+        )
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10, 50, 200]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    session.configurePolicy(rate=None)
+    url = "http://127.0.0.1:{}/sword/hal/".format(server.server_address[1])
+    for size in sizes:
+        run(url, size)
+    server.shutdown()
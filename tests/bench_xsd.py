@@ -0,0 +1,49 @@
+"""Benchmark: validations per second with XSD compiled on each call vs cached schema
+
+usage: python tests/bench_xsd.py [number of records] [path to XSD file] [number of authors]
+"""
+
+import sys
+import time
+from lxml import etree
+from push2HAL import default as dflt
+from push2HAL import misc
+
+RECORD = (
+    '<TEI xmlns="{0}"><text><body><listBibl><biblFull><titleStmt>'
+    '<title xml:lang="en">Title of record {1}</title>{2}'
+    "</titleStmt></biblFull></listBibl></body></text></TEI>"
+)
+AUTHOR = (
+    '<author role="aut"><persName><forename>John</forename>'
+    "<surname>Doe {}</surname></persName><email>john.doe@hal.fr</email></author>"
+)
+
+
+def checkCompiled(record, xsd):
+    # previous behavior: XSD parsed and compiled for each validation
+    schema = etree.XMLSchema(etree.parse(xsd))
+    return schema.validate(record)
+
+
+def checkCached(record, xsd):
+    return misc.checkXML(record, xsd, showError=False)
+
+
+if __name__ == "__main__":
+    nb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    xsd = misc.getXSDPath(sys.argv[2] if len(sys.argv) > 2 else None)
+    nbAuthors = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    authors = "".join(AUTHOR.format(i) for i in range(nbAuthors))
+    records = [
+        etree.fromstring(RECORD.format(dflt.DEFAULT_TEI_URL_NAMESPACE, i, authors))
+        for i in range(nb)
+    ]
+    rates = dict()
+    for name, func in (("compiled each time", checkCompiled), ("cached", checkCached)):
+        start = time.perf_counter()
+        for r in records:
+            func(r, xsd)
+        rates[name] = nb / (time.perf_counter() - start)
+        print("{:20s} {:10.1f} validations/s".format(name, rates[name]))
+    print("speedup: {:8.1f}x".format(rates["cached"] / rates["compiled each time"]))
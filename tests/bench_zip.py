@@ -0,0 +1,47 @@
+"""Benchmark: packaging of a deposit with a large PDF through libHAL.preparePayload
+(time and files left in the working directory)
+
+usage: python tests/bench_zip.py [size of PDF in MB]
+(run with PYTHONPATH pointing to another tree to compare implementations)
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+from push2HAL import libHAL, misc
+
+from fakeHAL import TEI_XSD
+
+logging.getLogger("push2HAL").setLevel(logging.ERROR)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(os.path.join("examples", "test.json")) as f:
+        data = json.load(f)
+    data["ID"]["halJournalId"] = "12345"
+    data.pop("structures")
+    workDir = tempfile.mkdtemp()
+    # permissive schema (TEI schema imports remote ones)
+    xsd = os.path.join(tempfile.mkdtemp(), "tei.xsd")
+    with open(xsd, "w") as f:
+        f.write(TEI_XSD)
+    misc.useXSD(xsd)
+    pdf = os.path.join(tempfile.mkdtemp(), "file.pdf")
+    with open(pdf, "wb") as f:
+        # PDF streams are already compressed: random content
+        for _ in range(size):
+            f.write(os.urandom(1024 * 1024))
+    os.chdir(workDir)
+    tei = libHAL.buildXML(data)
+    start = time.perf_counter()
+    file, _ = libHAL.preparePayload(tei, pdf_path=pdf, dirPath=workDir, hal_id="hal-01")
+    duration = time.perf_counter() - start
+    print(
+        "{:.2f} s for {} MB, files left: {}".format(
+            duration, size, sorted(os.listdir(workDir))
+        )
+    )
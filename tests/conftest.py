@@ -0,0 +1,46 @@
+import os
+import json
+import pytest
+from push2HAL import default as dflt
+from push2HAL import misc, session
+
+from fakeHAL import FakeHAL, TEI_XSD
+
+HAL_URLS = ("https://api.archives-ouvertes.fr/", "https://api-preprod.archives-ouvertes.fr/")
+
+
+@pytest.fixture
+def fakehal(monkeypatch):
+    """Start a fake HAL server and redirect all HAL URLs to it"""
+    with FakeHAL() as fake:
+        for name in dir(dflt):
+            value = getattr(dflt, name)
+            if name.startswith("HAL_") and type(value) is str:
+                for base in HAL_URLS:
+                    value = value.replace(base, fake.url)
+                monkeypatch.setattr(dflt, name, value)
+        session.closeSession()
+        # no rate limit and short retry delays against the local server
+        session.configurePolicy(rate=None, backoff=0.01)
+        yield fake
+        session.closeSession()
+        session.resetPolicy()
+
+
+@pytest.fixture
+def tei_xsd(tmp_path, monkeypatch):
+    """Validate TEI with a permissive schema: return its path"""
+    path = tmp_path / "tei.xsd"
+    path.write_text(TEI_XSD)
+    monkeypatch.setitem(misc.XSD_CONFIG, "path", str(path))
+    return str(path)
+
+
+@pytest.fixture
+def record():
+    """Example record (journal given by its HAL id, no local structures)"""
+    with open(os.path.join("examples", "test.json")) as f:
+        data = json.load(f)
+    data["ID"]["halJournalId"] = "12345"
+    data.pop("structures")
+    return data
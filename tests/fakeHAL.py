@@ -0,0 +1,207 @@
+"""Local stand-in for HAL API and SWORD servers (used by tests and benchmarks)"""
+
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+
+## permissive TEI schema (HAL schema imports remote ones)
+TEI_XSD = (
+    '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="{}">'
+    '<xs:element name="TEI"><xs:complexType><xs:sequence><xs:any minOccurs="0" '
+    'maxOccurs="unbounded" processContents="skip"/></xs:sequence></xs:complexType>'
+    "</xs:element></xs:schema>".format(TEI_NS)
+)
+
+## minimal document of HAL xml-tei results (HAL id as title)
+BIBL_FULL = (
+    "<biblFull><titleStmt><title>{0}</title></titleStmt><publicationStmt>"
+    '<idno type="halId">{0}</idno></publicationStmt></biblFull>'
+)
+
+SWORD_OK = """<?xml version="1.0" encoding="utf-8"?>
+<entry xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/">
+<id>{hal_id}</id>
+</entry>"""
+
+
+def getTEIList(bibls):
+    """Build xml-tei search results from documents (biblFull)"""
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<TEI xmlns="{}"><teiHeader/><text><body><listBibl>{}'
+        "</listBibl></body></text></TEI>".format(TEI_NS, "".join(bibls))
+    )
+
+
+def matchQuery(query, doc):
+    """Check if a (basic) Solr query matches a document"""
+    if query in (None, "*:*"):
+        return True
+    field, value = query.split(":", 1)
+    if value.startswith("(") and value.endswith(")"):
+        values = [v.strip().strip('"') for v in value[1:-1].split(" OR ")]
+    else:
+        values = [value.strip('"')]
+    values = [v.lower() for v in values]
+    content = doc.get(field, doc.get(re.sub("_[a-z]+$", "_s", field)))
+    if content is None:
+        return False
+    if type(content) is not list:
+        content = [content]
+    content = [str(c).lower() for c in content]
+    if field.endswith("_t"):
+        return any(v in c for v in values for c in content)
+    return any(v in content for v in values)
+
+
+class FakeHALHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.answer("GET")
+
+    def do_POST(self):
+        self.answer("POST")
+
+    def do_PUT(self):
+        self.answer("PUT")
+
+    def readBody(self):
+        if self.headers.get("Transfer-Encoding", "") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        return self.rfile.read(length) if length else b""
+
+    def answer(self, method):
+        parsed = urlparse(self.path)
+        req = {
+            "method": method,
+            "path": parsed.path,
+            "params": {k: v[0] for k, v in parse_qs(parsed.query).items()},
+            "headers": dict(self.headers),
+            "body": self.readBody(),
+            "client": self.client_address,
+        }
+        status, headers, payload = self.server.fake.handle(req)
+        if type(payload) is str:
+            payload = payload.encode("utf-8")
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeHAL:
+    """Fake HAL server: referentials/search (json or xml-tei) and SWORD"""
+
+    def __init__(self, docs=None, tei=None, delay=0):
+        # documents available for each API path (e.g. /search/, /ref/journal/)
+        self.docs = docs or dict()
+        # TEI (biblFull as string) of documents by halId
+        self.tei = tei or dict()
+        self.delay = delay
+        self.requests = list()
+        self.failures = list()
+        self.inflight = 0
+        self.maxInflight = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeHALHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def connections(self):
+        """Number of distinct client connections used so far"""
+        return len(set(r["client"] for r in self.requests))
+
+    def handle(self, req):
+        with self.lock:
+            self.requests.append(req)
+            failure = self.failures.pop(0) if self.failures else None
+            self.inflight += 1
+            self.maxInflight = max(self.maxInflight, self.inflight)
+        try:
+            if self.delay:
+                threading.Event().wait(self.delay)
+            if failure:
+                return failure
+            if "/sword/" in req["path"]:
+                return self.handleSWORD(req)
+            return self.handleSearch(req)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+    def handleSWORD(self, req):
+        if req["method"] == "PUT":
+            # update of an existing record
+            hal_id = req["path"].rstrip("/").rsplit("/", 1)[-1]
+            return 200, {"Content-Type": "text/xml"}, SWORD_OK.format(hal_id=hal_id)
+        return 201, {"Content-Type": "text/xml"}, SWORD_OK.format(hal_id="hal-00000001")
+
+    def handleSearch(self, req):
+        params = req["params"]
+        docs = [
+            d
+            for d in self.docs.get(req["path"], list())
+            if matchQuery(params.get("q"), d)
+        ]
+        rows = int(params.get("rows", 10))
+        if params.get("wt") == "xml-tei":
+            body = getTEIList(self.tei.get(d.get("halId_s"), "") for d in docs[:rows])
+            return 200, {"Content-Type": "text/xml; charset=utf-8"}, body
+        fields = params.get("fl", "*").split(",")
+        if fields != ["*"]:
+            docs = [{k: v for k, v in d.items() if k in fields} for d in docs]
+        cursor = params.get("cursorMark")
+        start = 0 if cursor in (None, "*") else int(cursor)
+        content = {
+            "response": {
+                "numFound": len(docs),
+                "start": start,
+                "docs": docs[start : start + rows],
+            }
+        }
+        if cursor:
+            # cursor is unchanged when all results have been sent
+            content["nextCursorMark"] = str(min(start + rows, len(docs)))
+            if start >= len(docs):
+                content["nextCursorMark"] = cursor
+        return 200, {"Content-Type": "application/json"}, json.dumps(content)
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import pytest
+from push2HAL import libHAL, session
+
+pytest.importorskip("aiohttp")
+
+
+def run(*coros):
+    async def main():
+        try:
+            res = await asyncio.gather(*coros)
+            return res if len(res) > 1 else res[0]
+        finally:
+            await libHAL.aio.closeSession()
+
+    return asyncio.run(main())
+
+
+def test_aioSearch(fakehal):
+    fakehal.docs["/search/"] = [
+        {"halId_s": "hal-{}".format(i), "doiId_id": "10.1/{}".format(i)}
+        for i in range(0, 40, 2)
+    ]
+    dois = ["10.1/{}".format(i) for i in range(40)]
+    found = run(*[libHAL.aio.checkDoiInHAL(d) for d in dois])
+    assert found == [i % 2 == 0 for i in range(40)]
+    halIds = run(libHAL.aio.checkDoisInHAL(dois, chunkSize=7))
+    assert halIds == libHAL.checkDoisInHAL(dois, chunkSize=7)
+
+
+def test_aioRetry(fakehal):
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_id": "10.1/a"}]
+    fakehal.failures = [(429, {"Retry-After": "0"}, "slow down"), (502, {}, "")]
+    assert run(libHAL.aio.checkDoiInHAL("10.1/a"))
+    assert len(fakehal.requests) == 3
+
+
+def test_aioCoalescing(fakehal):
+    fakehal.delay = 0.05
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]
+    before = session.getFlightStats()["coalesced"]
+    res = run(*[libHAL.aio.getDataFromHAL("10.1/a", typeI="doi") for _ in range(8)])
+    assert all(r == [{"halId_s": "hal-01"}] for r in res)
+    assert len(fakehal.requests) == 1
+    assert session.getFlightStats()["coalesced"] - before == 7
+
+
+def test_aioCoalescingCancelled(fakehal):
+    fakehal.delay = 0.1
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]
+
+    async def main():
+        leader = asyncio.ensure_future(libHAL.aio.getDataFromHAL("10.1/a", typeI="doi"))
+        await asyncio.sleep(0.02)
+        waiter = asyncio.ensure_future(libHAL.aio.getDataFromHAL("10.1/a", typeI="doi"))
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        # waiter is not cancelled with the leader: request issued again
+        return await waiter
+
+    assert run(main()) == [{"halId_s": "hal-01"}]
+    assert len(fakehal.requests) == 2
+
+
+def test_aioHostLimit(fakehal):
+    fakehal.delay = 0.05
+    libHAL.aio.configureSession(hostLimits={fakehal.url[7:-1]: 3})
+    try:
+        run(
+            *[
+                libHAL.aio.getDataFromHAL("10.1/{}".format(i), typeI="doi")
+                for i in range(12)
+            ]
+        )
+    finally:
+        libHAL.aio.SESSION_CONFIG["hostLimits"].clear()
+    assert len(fakehal.requests) == 12
+    assert fakehal.maxInflight == 3
+
+
+def test_aioAdaptiveConcurrency(fakehal):
+    fakehal.delay = 0.05
+    session.configurePolicy("search", concurrencyMax=2)
+    run(
+        *[
+            libHAL.aio.getDataFromHAL("10.1/{}".format(i), typeI="doi")
+            for i in range(8)
+        ]
+    )
+    assert len(fakehal.requests) == 8
+    assert fakehal.maxInflight == 2
+
+
+def test_aioTEIAndUpload(fakehal):
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01"}]
+    fakehal.tei["hal-01"] = "<biblFull><titleStmt/></biblFull>"
+    tei = run(libHAL.aio.getTEIFromHAL("hal-01"))
+    assert tei.find(".//{*}biblFull") is not None
+    res = run(
+        libHAL.aio.upload2HAL(
+            "examples/test.json", {}, {"login": "ll", "passwd": "pp"}
+        )
+    )
+    assert res == "hal-00000001"
+    assert fakehal.requests[-1]["headers"]["Authorization"].startswith("Basic ")
+
+
+def test_aioUploadStream(fakehal, tmp_path):
+    payload = os.urandom(100000)
+    path = tmp_path / "upload.zip"
+    path.write_bytes(payload)
+    progress = list()
+    res = run(
+        libHAL.aio.upload2HAL(
+            str(path),
+            {},
+            {"login": "ll", "passwd": "pp"},
+            hal_id="hal-01234567",
+            progress=lambda *a: progress.append(a),
+        )
+    )
+    assert res == "hal-01234567"
+    req = fakehal.requests[-1]
+    assert (req["method"], req["path"]) == ("PUT", "/sword/hal-01234567")
+    assert req["body"] == payload
+    assert req["headers"]["Content-Length"] == str(len(payload))
+    assert progress[-1][:2] == (len(payload), len(payload))
+
+
+def test_aioRunJSON2HAL(fakehal):
+    fakehal.docs["/ref/journal/"] = [{"docid": 12, "title_s": "Journal A"}]
+    assert run(libHAL.aio.getJournalIdFromHAL("Journal A")) == 12
+    res = run(libHAL.aio.runJSON2HAL("examples/missing.json"))
+    assert res == os.EX_OSFILE
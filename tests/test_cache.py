@@ -0,0 +1,104 @@
+import os
+import time
+import multiprocessing
+import pytest
+from push2HAL import libHAL, cache
+
+
+@pytest.fixture
+def hal_cache(tmp_path):
+    cache.enableCache(str(tmp_path / "cache.sqlite"), maxEntries=3, evictInterval=1)
+    yield cache
+    cache.disableCache()
+
+
+def searchJournal(title):
+    return libHAL.getDataFromHAL(
+        txtsearch=title, typeDB="journal", typeI="title", returnFields="docid,title_s"
+    )
+
+
+def test_cacheHitMiss(fakehal, hal_cache):
+    fakehal.docs["/ref/journal/"] = [{"docid": 12, "title_s": "Journal A"}]
+    stats = cache.getCacheStats()
+    assert searchJournal("journal a") == [{"docid": 12, "title_s": "Journal A"}]
+    assert searchJournal("journal a") == [{"docid": 12, "title_s": "Journal A"}]
+    # negative caching
+    assert searchJournal("unknown") == []
+    assert searchJournal("unknown") == []
+    assert len(fakehal.requests) == 2
+    new = cache.getCacheStats()
+    assert new["hit"] - stats["hit"] == 1
+    assert new["negativeHit"] - stats["negativeHit"] == 1
+    assert new["miss"] - stats["miss"] == 2
+    # articles are not cached
+    libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+    libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+    assert len(fakehal.requests) == 4
+
+
+def test_cacheTTL(fakehal, tmp_path):
+    fakehal.docs["/ref/journal/"] = [{"docid": 12, "title_s": "Journal A"}]
+    cache.enableCache(str(tmp_path / "cache.sqlite"), ttl={"journal": -1})
+    try:
+        searchJournal("journal a")
+        searchJournal("journal a")
+        assert len(fakehal.requests) == 2
+    finally:
+        cache.disableCache()
+
+
+def test_cacheLRU(fakehal, hal_cache):
+    for t in ["a", "b", "c"]:
+        searchJournal(t)
+    time.sleep(0.01)
+    searchJournal("a")  # refresh access
+    searchJournal("d")  # evict b
+    nb = len(fakehal.requests)
+    searchJournal("a")
+    assert len(fakehal.requests) == nb
+    searchJournal("b")
+    assert len(fakehal.requests) == nb + 1
+
+
+def test_cacheEvictInterval(tmp_path):
+    cache.enableCache(str(tmp_path / "cache.sqlite"), maxEntries=3, evictInterval=4)
+    try:
+        conn = cache.getConnection()
+        nbEntries = []
+        for i in range(9):
+            params = {"q": str(i), "fl": "docid", "wt": "json", "rows": 1}
+            cache.storeInCache("journal", "http://local/", params, [{"docid": i}])
+            nbEntries.append(conn.execute("SELECT COUNT(*) FROM query").fetchone()[0])
+    finally:
+        cache.disableCache()
+    # number of entries checked on first store then every 4 stores
+    assert nbEntries == [1, 2, 3, 4, 3, 4, 5, 6, 3]
+
+
+def storeMany(path, start):
+    cache.enableCache(path)
+    for i in range(start, start + 50):
+        params = {"q": str(i), "fl": "docid", "wt": "json", "rows": 1}
+        cache.storeInCache("journal", "http://local/", params, [{"docid": i}])
+
+
+def test_cacheMultiProcess(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    proc = [
+        multiprocessing.Process(target=storeMany, args=(path, i * 50))
+        for i in range(4)
+    ]
+    for p in proc:
+        p.start()
+    for p in proc:
+        p.join()
+    assert all(p.exitcode == 0 for p in proc)
+    cache.enableCache(path)
+    try:
+        for i in range(200):
+            params = {"q": str(i), "fl": "docid", "wt": "json", "rows": 1}
+            found, data = cache.getFromCache("journal", "http://local/", params)
+            assert found and data == [{"docid": i}]
+    finally:
+        cache.disableCache()
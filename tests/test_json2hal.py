@@ -1,4 +1,5 @@
 import os
+import json
 from push2HAL import execHAL
 
 
@@ -12,3 +13,44 @@ def test_runJSON2HAL():
         idhal=None,
     )
     assert res == os.EX_CONFIG
+
+
+def test_runBatchJSON2HAL(fakehal, tmp_path, tei_xsd, record):
+    records = tmp_path / "records"
+    records.mkdir()
+    for i in range(5):
+        # PDF given relatively to current directory
+        data = record
+        if i == 0:
+            data = dict(record, file=os.path.join("examples", "file.pdf"))
+        (records / "record{}.json".format(i)).write_text(json.dumps(data))
+    record.pop("title")
+    (records / "invalid.json").write_text(json.dumps(record))
+    results = str(tmp_path / "results.jsonl")
+    credentials = {"login": "login", "passwd": "passwd"}
+    # non-zero exit code only for failed records
+    res = execHAL.runBatchJSON2HAL(
+        str(records), jobs=2, uploads=2, results=results, credentials=credentials
+    )
+    assert res == os.EX_SOFTWARE
+    with open(results) as f:
+        lines = [json.loads(l) for l in f]
+    status = {os.path.basename(l["path"]): l for l in lines}
+    assert len(status) == 6
+    assert status["invalid.json"]["status"] == "failed"
+    assert status["invalid.json"]["code"] == os.EX_DATAERR
+    for i in range(5):
+        r = status["record{}.json".format(i)]
+        assert (r["status"], r["code"], r["halId"]) == ("ok", 201, "hal-00000001")
+        assert r["build"] >= 0 and r["upload"] >= 0
+    sword = [r for r in fakehal.requests if "/sword/" in r["path"]]
+    assert sorted(r["headers"]["Content-Type"] for r in sword) == [
+        "application/zip"
+    ] + ["text/xml"] * 4
+    # manifest
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# records\nrecords/record0.json\n\nrecords/record1.json\n")
+    res = execHAL.runBatchJSON2HAL(
+        str(manifest), jobs=1, uploads=1, results=results, credentials=credentials
+    )
+    assert res == os.EX_OK
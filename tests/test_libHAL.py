@@ -1,5 +1,14 @@
 import os
+import zipfile
+import tempfile
+import pytest
+import requests
+from lxml import etree
 from push2HAL import libHAL
+from push2HAL import default as dflt
+
+from fakeHAL import BIBL_FULL, getTEIList
+
 
 def test_doiInHAL():
     res = libHAL.checkDoiInHAL('10.1007/s11831-017-9226-3')
@@ -7,4 +16,243 @@ def test_doiInHAL():
     
 def test_doiNotInHAL():
     res = libHAL.checkDoiInHAL('10.1007/XXXX')
-    assert res == False
\ No newline at end of file
+    assert res == False
+
+def test_doisInHAL(fakehal):
+    fakehal.docs["/search/"] = [
+        {"halId_s": "hal-{:03d}".format(i), "doiId_id": "10.1/A{}".format(i)}
+        for i in range(0, 250, 2)
+    ]
+    dois = ["10.1/a{}".format(i) for i in range(250)]
+    res = libHAL.checkDoisInHAL(dois, chunkSize=40)
+    assert len(fakehal.requests) == 7
+    for d in dois[:20]:
+        assert (res[d] is not None) == libHAL.checkDoiInHAL(d)
+    assert res["10.1/a4"] == "hal-004"
+    assert res["10.1/a5"] is None
+
+
+def test_doisInHALDuplicates(fakehal):
+    fakehal.docs["/search/"] = [
+        {"halId_s": "hal-{}-{}".format(i, j), "doiId_id": "10.1/{}".format(i)}
+        for i in range(4)
+        for j in range(3)
+    ]
+    res = libHAL.checkDoisInHAL(["10.1/{}".format(i) for i in range(5)])
+    assert res == {
+        "10.1/0": "hal-0-0",
+        "10.1/1": "hal-1-0",
+        "10.1/2": "hal-2-0",
+        "10.1/3": "hal-3-0",
+        "10.1/4": None,
+    }
+
+
+def test_iterDataFromHAL(fakehal):
+    fakehal.docs["/ref/structure/"] = [{"docid": i} for i in range(250)]
+    for prefetch in [False, True]:
+        nb = len(fakehal.requests)
+        res = libHAL.iterDataFromHAL(
+            txtsearch="*:*",
+            typeI="query",
+            typeDB="structure",
+            returnFields="docid",
+            pageSize=40,
+            prefetch=prefetch,
+        )
+        assert [d["docid"] for d in res] == list(range(250))
+        assert len(fakehal.requests) - nb == 8
+    assert fakehal.requests[-1]["params"]["sort"] == "docid asc"
+
+
+def test_iterDataFromHALFailure(fakehal):
+    fakehal.docs["/ref/structure/"] = [{"docid": i} for i in range(100)]
+    res = libHAL.iterDataFromHAL(
+        txtsearch="*:*", typeI="query", typeDB="structure", pageSize=40, prefetch=False
+    )
+    assert next(res)["docid"] == 0
+    # next page fails after retries: error instead of truncated results
+    fakehal.failures = [(503, {}, "busy")] * (dflt.DEFAULT_HTTP_MAX_RETRIES + 1)
+    with pytest.raises(requests.HTTPError):
+        list(res)
+
+
+def test_TEIsFromHAL(fakehal):
+    halIds = ["hal-{:02d}".format(i) for i in range(25)]
+    fakehal.docs["/search/"] = [{"halId_s": h} for h in halIds[:-1]]
+    for h in halIds[:-1]:
+        fakehal.tei[h] = BIBL_FULL.format(h)
+    teis = libHAL.getTEIsFromHAL(halIds, chunkSize=10)
+    assert len(fakehal.requests) == 3
+    assert teis[halIds[-1]] is None
+    for h in halIds[:-1]:
+        # one TEI per document, with the same structure as a single one
+        bibl = teis[h].findall(".//{0}listBibl/{0}biblFull".format(libHAL.TEI))
+        assert len(bibl) == 1
+        assert bibl[0].findtext(".//{}title".format(libHAL.TEI)) == h
+        assert teis[h].find(libHAL.TEI + "teiHeader") is not None
+
+
+def test_parseTEIStream():
+    halIds = ["hal-{:03d}".format(i) for i in range(100)]
+    content = getTEIList(BIBL_FULL.format(h) for h in halIds).encode("utf-8")
+    # fed by small chunks: documents are yielded as soon as they are complete
+    chunks = [content[i : i + 50] for i in range(0, len(content), 50)]
+    res = list(libHAL.parseTEIStream(chunks))
+    assert [h for h, _ in res] == halIds
+    for h, tei in res:
+        assert len(tei.findall(".//{}biblFull".format(libHAL.TEI))) == 1
+        assert tei.find(libHAL.TEI + "teiHeader") is not None
+
+
+def test_buildXMLSharedStructures():
+    structures = [
+        {"id": "s{}".format(i), "name": "Lab {}".format(i), "address": "Paris, France"}
+        for i in range(3)
+    ]
+    authors = [
+        {"firstname": "F{}".format(i), "lastname": "L{}".format(i), "role": "aut"}
+        for i in range(4)
+    ]
+    for a in authors:
+        a["affiliation"] = ["s1", "s0", "s1"]
+    authors[0]["affiliationHAL"] = ["#struct-12", "12"]
+    data = {
+        "title": {"en": "title"},
+        "type": "ART",
+        "authors": authors,
+        "structures": structures + structures[:1],
+        "ID": {"halJournalId": "12345"},
+    }
+    tei = libHAL.buildXML(data)
+    titleStmt = tei.find(".//{}titleStmt".format(libHAL.TEI))
+    refs = [
+        [e.get("ref") for e in a.iter(libHAL.TEI + "affiliation")]
+        for a in titleStmt.iter(libHAL.TEI + "author")
+    ]
+    assert refs[0] == ["#localStruct-s1", "#localStruct-s0", "#struct-12"]
+    assert refs[1:] == 3 * [["#localStruct-s1", "#localStruct-s0"]]
+    # structures declared once (with country of their shared address)
+    orgs = tei.findall(".//{}org".format(libHAL.TEI))
+    ids = [o.get(dflt.DEFAULT_XML_LANG + "id") for o in orgs]
+    assert ids == ["localStruct-s0", "localStruct-s1", "localStruct-s2"]
+    assert [o.find(".//{}country".format(libHAL.TEI)).get("key") for o in orgs] == [
+        "FR",
+        "FR",
+        "FR",
+    ]
+    # records do not share elements
+    assert libHAL.buildXML(data) is not tei
+    assert len(libHAL.SKELETON.find(".//{}titleStmt".format(libHAL.TEI))) == 0
+
+
+def test_preparePayload(tmp_path, monkeypatch, tei_xsd, record):
+    pdf = os.path.abspath(os.path.join("examples", "file.pdf"))
+    tei = libHAL.buildXML(record)
+    monkeypatch.chdir(tmp_path)
+    file, header = libHAL.preparePayload(
+        tei, pdf_path=pdf, dirPath=str(tmp_path), hal_id="hal-01"
+    )
+    assert header["Content-Type"] == "application/zip"
+    # only XML file is written: archive in memory, PDF stored as is
+    assert sorted(os.listdir(tmp_path)) == ["tei.xsd", "upload.xml"]
+    with zipfile.ZipFile(file) as z:
+        assert sorted(z.namelist()) == ["hal-01.pdf", "upload.xml"]
+        assert z.getinfo("hal-01.pdf").compress_type == zipfile.ZIP_STORED
+        parser = etree.XMLParser(remove_blank_text=True)
+        xml = etree.fromstring(z.read("upload.xml"), parser)
+        with open(pdf, "rb") as f:
+            assert z.read("hal-01.pdf") == f.read()
+    assert etree.tostring(xml, method="c14n") == etree.tostring(tei, method="c14n")
+
+
+def test_buildZIP(tmp_path, monkeypatch):
+    pdf = os.path.abspath(os.path.join("examples", "file.pdf"))
+    xml = tmp_path / "record.xml"
+    xml.write_text("<TEI/>")
+    monkeypatch.chdir(tmp_path)
+    archive = libHAL.buildZIP(
+        str(xml), pdf, "hal-01.pdf", compression=zipfile.ZIP_DEFLATED
+    )
+    assert os.listdir(tmp_path) == ["record.xml"]
+    with zipfile.ZipFile(archive) as z:
+        assert z.read("upload.xml") == b"<TEI/>"
+        assert z.getinfo("hal-01.pdf").compress_type == zipfile.ZIP_DEFLATED
+    with open(pdf, "rb") as f:
+        size = len(f.read())
+    archive.seek(0)
+    data = archive.read()
+    assert data[:2] == b"PK" and len(data) < size + 1024
+
+
+def test_upload2HALStream(fakehal, tmp_path):
+    payload = os.urandom(100000)
+    path = tmp_path / "upload.zip"
+    path.write_bytes(payload)
+    credentials = {"login": "login", "passwd": "passwd"}
+    headers = {"Content-Type": "application/zip"}
+    progress = list()
+
+    def upload(file, **kwargs):
+        nb = len(fakehal.requests)
+        res = libHAL.upload2HAL(file, headers, credentials, **kwargs)
+        assert res == "hal-00000001"
+        return fakehal.requests[nb]
+
+    def generate():
+        for i in range(0, len(payload), 30000):
+            yield payload[i : i + 30000]
+
+    # path of a file: sent by chunks with its length
+    req = upload(str(path), progress=lambda *a: progress.append(a))
+    assert req["body"] == payload
+    assert req["headers"]["Content-Length"] == str(len(payload))
+    assert [p[:2] for p in progress][-1] == (len(payload), len(payload))
+    assert len(progress) == 1 + len(payload) // dflt.DEFAULT_UPLOAD_CHUNK_SIZE
+    # file object (closed once sent)
+    f = open(path, "rb")
+    assert upload(f)["body"] == payload
+    assert f.closed
+    # spooled archive (as built by buildZIP)
+    spooled = tempfile.SpooledTemporaryFile()
+    spooled.write(payload)
+    spooled.seek(0)
+    req = upload(spooled)
+    assert req["body"] == payload
+    assert req["headers"]["Content-Length"] == str(len(payload))
+    # generator with or without known length
+    req = upload(generate(), length=len(payload))
+    assert req["body"] == payload
+    assert req["headers"]["Content-Length"] == str(len(payload))
+    req = upload(generate())
+    assert req["body"] == payload
+    assert req["headers"]["Transfer-Encoding"] == "chunked"
+
+
+def test_mapping(monkeypatch):
+    notes = etree.Element(libHAL.TEI + "biblFull")
+    libHAL.setNotes(notes, {"audience": "International", "invited": True, "peer": "maybe"})
+    assert [(n.get("type"), n.get("n")) for n in notes.iter(libHAL.TEI + "note")] == [
+        ("audience", "2"),
+        ("invited", "1"),
+        ("popular", dflt.DEFAULT_POPULAR),
+        ("peer", dflt.DEFAULT_PEER),
+        ("proceedings", dflt.DEFAULT_PROCEEDINGS),
+    ]
+    codes = etree.Element(libHAL.TEI + "textClass")
+    libHAL.setCodes(codes, {"jel": "C6", "halDomain": ["phys", "spi"]})
+    assert [(c.get("scheme"), c.get("n"), c.text) for c in codes] == [
+        ("jel", None, "C6"),
+        ("halDomain", "phys", None),
+        ("halDomain", "spi", None),
+    ]
+    # new field: edit mapping only
+    mapping = dict(libHAL.MAPPING)
+    mapping["extref"] = libHAL.MAPPING["extref"] + [
+        {"key": "hal", "tag": "idno", "attrib": {"type": "halId"}}
+    ]
+    monkeypatch.setattr(libHAL, "MAPPING_TABLES", libHAL.compileMapping(mapping))
+    ref = etree.Element(libHAL.TEI + "biblStruct")
+    libHAL.setRef(ref, {"doi": "10.1000/1", "hal": "hal-01"})
+    assert [(r.get("type"), r.text) for r in ref] == [("doi", "10.1000/1"), ("halId", "hal-01")]
+    assert libHAL.getTypeDoc("Monograph") == "OUV"
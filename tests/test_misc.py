@@ -0,0 +1,88 @@
+import os
+import threading
+from lxml import etree
+from push2HAL import misc
+
+XSD = """<?xml version="1.0" encoding="utf-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="record">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="title" type="xs:string" maxOccurs="{}"/>
+      </xs:sequence>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+
+def test_schemaCache(tmp_path):
+    xsd = tmp_path / "record.xsd"
+    xsd.write_text(XSD.format(1))
+    valid = etree.fromstring("<record><title>A</title></record>")
+    invalid = etree.fromstring("<record><title>A</title><title>B</title></record>")
+    assert misc.checkXML(valid, str(xsd))
+    assert not misc.checkXML(invalid, str(xsd), showError=False)
+    # compiled once per thread
+    schema = misc.getSchema(str(xsd))
+    assert misc.getSchema(str(xsd)) is schema
+    other = list()
+    t = threading.Thread(target=lambda: other.append(misc.getSchema(str(xsd))))
+    t.start()
+    t.join()
+    assert other[0] is not schema
+    # compiled again if file changes
+    xsd.write_text(XSD.format("unbounded"))
+    os.utime(xsd, (0, 0))
+    assert misc.checkXML(invalid, str(xsd))
+
+
+def test_useXSD(tmp_path):
+    xsd = tmp_path / "record.xsd"
+    xsd.write_text(XSD.format(1))
+    misc.useXSD(str(xsd))
+    try:
+        misc.writeXML(
+            etree.fromstring("<record><title>A</title></record>"),
+            str(tmp_path / "record.xml"),
+        )
+        assert misc.checkXML(etree.parse(str(tmp_path / "record.xml")))
+    finally:
+        misc.useXSD()
+
+
+def test_getCountryFromText():
+    assert misc.getCountryFromText("Blue street 155, 552501 Olso, Norway") == "Norway"
+    # rightmost country wins, codes are whole words in upper case
+    assert misc.getCountryFromText("University of Georgia, Athens, USA") == (
+        "United States"
+    )
+    assert misc.getCountryFromText("we can do it") is None
+    # longest name, common names and accents
+    assert misc.getCountryFromText("Port Moresby, Papua New Guinea") == (
+        "Papua New Guinea"
+    )
+    assert misc.getCountryFromText("Seoul, South Korea") == "Korea, Republic of"
+    assert misc.getCountryFromText("Abidjan, COTE D'IVOIRE") == "Côte d'Ivoire"
+    assert misc.getCountryFromText("Nigeria") == "Nigeria"
+    assert misc.getCountryFromText(None) is None
+
+
+def test_getAlpha2Country(monkeypatch):
+    assert misc.getAlpha2Country("Norway") == "NO"
+    assert misc.getAlpha2Country("fra") == "FR"
+    assert misc.getAlpha2Country("COTE D'IVOIRE") == "CI"
+    assert misc.getAlpha2Country("Turkey") == "TR"
+    assert misc.getAlpha2Country("Niger") == "NE"
+    assert misc.getAlpha2Country(None) is None
+    # fuzzy search only on misses (and once)
+    calls = list()
+    search = misc.pc.countries.search_fuzzy
+    monkeypatch.setattr(
+        misc.pc.countries, "search_fuzzy", lambda t: calls.append(t) or search(t)
+    )
+    misc.searchAlpha2Country.cache_clear()
+    for _ in range(3):
+        assert misc.getAlpha2Country("Norway") == "NO"
+        assert misc.getAlpha2Country("Bayern") == "DE"
+    assert calls == ["Bayern"]
@@ -0,0 +1,187 @@
+import os
+import pytest
+import requests
+from lxml import etree
+from push2HAL import libHAL, refHAL
+from push2HAL import default as dflt
+
+JOURNALS = [
+    {"docid": 1, "title_s": "Advanced Modeling and Simulation in Engineering Sciences", "issn_s": "2213-7467", "valid_s": "VALID"},
+    {"docid": 2, "title_s": "Journal of Computational Physics", "issn_s": "0021-9991", "eissn_s": "1090-2716", "valid_s": "VALID"},
+    {"docid": 3, "title_s": "Journal of Computational Physics", "valid_s": "OLD"},
+    {"docid": 4, "title_s": "Computer Methods in Applied Mechanics and Engineering", "valid_s": "VALID"},
+]
+
+
+def test_normalizeText():
+    assert refHAL.normalizeText("Études  Mécaniques, (Série A)") == "etudes mecaniques serie a"
+    assert refHAL.normalizeISSN("0021-9991") == "00219991"
+    assert refHAL.normalizeISSN("xxx") is None
+
+
+def test_journalIndex(fakehal, tmp_path):
+    fakehal.docs["/ref/journal/"] = JOURNALS
+    path = refHAL.downloadReferential("journal", str(tmp_path / "journal.json.gz"), pageSize=3)
+    assert refHAL.loadSnapshot(path)[1]["eissn_s"] == "1090-2716"
+    # exact title (valid entry preferred), ISSN, eISSN and approximated title
+    assert refHAL.findJournalId("journal of computational physics", path=path) == 2
+    assert refHAL.findJournalId("whatever", issn="00219991", path=path) == 2
+    assert refHAL.findJournalId(eissn="1090-2716", path=path) == 2
+    assert refHAL.findJournalId("Computer Method in Applied Mechanic and Engineering", path=path) == 4
+    assert refHAL.findJournalId("Journal of Fluid Mechanics", path=path) is None
+
+
+def test_downloadReferentialFailure(fakehal, tmp_path, monkeypatch):
+    fakehal.docs["/ref/journal/"] = JOURNALS
+    path = refHAL.downloadReferential("journal", str(tmp_path / "journal.json.gz"), pageSize=2)
+    # page not available once retried: error raised and previous snapshot kept
+    fakehal.failures = [(503, {}, "busy")] * (dflt.DEFAULT_HTTP_MAX_RETRIES + 1)
+    with pytest.raises(requests.HTTPError):
+        refHAL.downloadReferential("journal", path, pageSize=2)
+    assert len(refHAL.loadSnapshot(path)) == len(JOURNALS)
+    # short download (fewer entries than announced by HAL) is detected
+    getPage = libHAL.getPageFromHAL
+    def getShortPage(url, params, cursor="*"):
+        docs, nextCursor, numFound = getPage(url, params, cursor)
+        return docs[:1], nextCursor, numFound
+    monkeypatch.setattr(libHAL, "getPageFromHAL", getShortPage)
+    with pytest.raises(ValueError):
+        refHAL.downloadReferential("journal", path, pageSize=2)
+    assert len(refHAL.loadSnapshot(path)) == len(JOURNALS)
+    assert os.listdir(tmp_path) == ["journal.json.gz"]
+
+
+def test_setIDSFromIndex(fakehal, tmp_path):
+    fakehal.docs["/ref/journal/"] = JOURNALS
+    path = refHAL.downloadReferential("journal", str(tmp_path / "journal.json.gz"))
+    default = refHAL.getSnapshotPath("journal")
+    refHAL.useSnapshot("journal", path)
+    try:
+        nb = len(fakehal.requests)
+        monogr = etree.Element("monogr")
+        libHAL.setIDS(monogr, {"journal": "Advanced Modeling and Simulation in Engineering Sciences"})
+        assert len(fakehal.requests) == nb
+        assert monogr.find(".//{*}idno[@type='halJournalId']").text == "1"
+    finally:
+        refHAL.useSnapshot("journal", default)
+
+
+STRUCTURES = [
+    {"docid": 10, "name_s": "Conservatoire national des arts et métiers", "acronym_s": "CNAM", "valid_s": "VALID", "country_s": "fr", "address_s": "292 rue Saint-Martin, 75003 Paris"},
+    {"docid": 11, "name_s": "Laboratoire de Mécanique des Structures et des Systèmes Couplés", "acronym_s": "LMSSC", "valid_s": "VALID", "country_s": "fr", "parentDocid_i": [10]},
+    {"docid": 12, "name_s": "Laboratoire de Mécanique des Structures et des Systèmes Couplés", "acronym_s": "LMSSC", "valid_s": "OLD", "country_s": "fr"},
+    {"docid": 13, "name_s": "Laboratoire de Mécanique", "acronym_s": "LM", "valid_s": "VALID", "country_s": "no", "parentDocid_i": 14},
+    {"docid": 14, "name_s": "University of Oslo", "acronym_s": "UiO", "valid_s": "VALID", "country_s": "no"},
+]
+
+
+def test_structureIndex(fakehal, tmp_path):
+    fakehal.docs["/ref/structure/"] = STRUCTURES
+    path = refHAL.downloadReferential("structure", str(tmp_path / "structure.json.gz"))
+    # exact name (valid entry preferred), approximated name and acronym
+    found = refHAL.findStructure("Laboratoire de mécanique des structures et des systèmes couplés", path=path)
+    assert found == (11, 1.0)
+    docid, score = refHAL.findStructure("Lab. de Mecanique des Structures et Systemes Couples", "LMSSC", country="FR", path=path)
+    assert docid == 11 and 0.85 <= score < 1.0
+    # country and parent structure
+    assert refHAL.findStructure("Laboratoire de Mécanique", country="fr", path=path) is None
+    assert refHAL.findStructure("Laboratoire de Mécanique", country="no", path=path)[0] == 13
+    assert refHAL.findStructure("Laboratoire de Mécanique", parent="University of Oslo", path=path)[0] == 13
+    assert refHAL.findStructure("Laboratory of Fluid Dynamics", path=path) is None
+
+
+def test_buildXMLWithStructureIndex(fakehal, tmp_path):
+    fakehal.docs["/ref/structure/"] = STRUCTURES
+    path = refHAL.downloadReferential("structure", str(tmp_path / "structure.json.gz"))
+    default = refHAL.getSnapshotPath("structure")
+    refHAL.useSnapshot("structure", path)
+    data = {
+        "title": "title",
+        "authors": [{"firstname": "John", "lastname": "Doe", "affiliation": ["lmssc", "other"]}],
+        "structures": [
+            {"id": "lmssc", "name": "Laboratoire de Mécanique des Structures et des Systèmes Couplés", "acronym": "LMSSC", "address": "Paris, France"},
+            {"id": "other", "name": "Laboratory of Fluid Dynamics", "address": "Oslo, Norway"},
+        ],
+    }
+    try:
+        nb = len(fakehal.requests)
+        tei = libHAL.buildXML(data)
+        assert len(fakehal.requests) == nb
+    finally:
+        refHAL.useSnapshot("structure", default)
+    refs = [a.get("ref") for a in tei.find(".//{*}titleStmt").iter("{*}affiliation")]
+    assert refs == ["#struct-11", "#localStruct-other"]
+    orgs = tei.findall(".//{*}listOrg/{*}org")
+    assert [o.get("{http://www.w3.org/XML/1998/namespace}id") for o in orgs] == ["localStruct-other"]
+
+
+AUTHORS = [
+    {"docid": 100, "idHal_s": "john-doe", "firstName_s": "John", "lastName_s": "Doe", "valid_s": "VALID", "orcidId_s": ["https://orcid.org/0000-0002-1825-0097"], "structureId_i": [11]},
+    {"docid": 101, "idHal_s": "john-doe", "firstName_s": "J.", "lastName_s": "Doe", "valid_s": "OLD"},
+    {"docid": 102, "firstName_s": "John", "lastName_s": "Doe", "valid_s": "INCOMING", "structureId_i": [13]},
+    {"docid": 103, "idHal_s": "jane-smith", "firstName_s": "Jane", "lastName_s": "Smith", "valid_s": "VALID"},
+]
+
+
+def test_authorIndex(fakehal, tmp_path):
+    fakehal.docs["/ref/author/"] = AUTHORS
+    path = refHAL.refreshReferential("author", str(tmp_path / "author.json.gz"))
+    # up to date snapshot is not downloaded again
+    nb = len(fakehal.requests)
+    assert refHAL.refreshReferential("author", path, maxAge=3600) == path
+    assert len(fakehal.requests) == nb
+
+    def find(*args, **kwargs):
+        found, info = refHAL.findAuthor(*args, path=path, **kwargs)
+        return found and found["docid"], info
+
+    assert find("Jane", "Smith") == (103, "name")
+    assert find("X", "Y", orcid="0000-0002-1825-0097") == (100, "orcid")
+    # same name: two persons (forms of john-doe grouped), resolved from affiliation
+    found, candidates = refHAL.findAuthor("John", "Doe", path=path)
+    assert found is None and [c["docid"] for c in candidates] == [100, 102]
+    assert find("Jöhn", "DOE", structures=["11"]) == (100, "affiliation")
+    assert find("John", "Doe", structures=[13]) == (102, "affiliation")
+    # initial of first name must be confirmed by affiliation
+    assert refHAL.findAuthor("J", "Smith", path=path)[0] is None
+    assert refHAL.findAuthor("Paul", "Martin", path=path) == (None, [])
+
+
+def test_authorHomonyms(fakehal, tmp_path):
+    fakehal.docs["/ref/author/"] = AUTHORS
+    path = refHAL.downloadReferential("author", str(tmp_path / "author.json.gz"))
+    # homonym with another ORCID is not the same person
+    other = "0000-0001-5109-3700"
+    found, info = refHAL.findAuthor("John", "Doe", orcid=other, path=path)
+    assert (found["docid"], info) == (102, "name")
+    # even if linked to affiliation of author
+    found, info = refHAL.findAuthor("John", "Doe", orcid=other, structures=[11], path=path)
+    assert (found["docid"], info) == (102, "name")
+    assert refHAL.findAuthor("J", "Doe", orcid=other, structures=[11], path=path)[0] is None
+    found, info = refHAL.findAuthor("John", "Doe", orcid="0000-0002-1825-0097", path=path)
+    assert (found["docid"], info) == (100, "orcid")
+
+
+def test_enrichAuthors(fakehal, tmp_path):
+    fakehal.docs["/ref/author/"] = AUTHORS
+    path = refHAL.downloadReferential("author", str(tmp_path / "author.json.gz"))
+    default = refHAL.getSnapshotPath("author")
+    refHAL.useSnapshot("author", path)
+    authors = [
+        {"firstname": "John", "lastname": "Doe", "affiliationHAL": "#struct-11"},
+        {"firstname": "John", "lastname": "Doe"},
+        {"firstname": "Jane", "lastname": "Smith", "idhal": "other"},
+    ]
+    try:
+        enriched = libHAL.enrichAuthors(authors)
+        tei = libHAL.buildXML({"title": "title", "authors": authors[:1]})
+    finally:
+        refHAL.useSnapshot("author", default)
+    assert enriched[0] == dict(
+        authors[0], idhal="john-doe", halauthor="100", orcid="https://orcid.org/0000-0002-1825-0097"
+    )
+    # ambiguous author and given identifiers are kept
+    assert enriched[1] is authors[1]
+    assert enriched[2] == dict(authors[2], halauthor="103")
+    assert "idhal" not in authors[0]
+    assert tei.find(".//{*}titleStmt//{*}idno[@type='idhal']").text == "john-doe"
@@ -0,0 +1,85 @@
+import os
+import json
+from push2HAL import execHAL, libHAL, schema
+
+XSD = """<?xml version="1.0" encoding="utf-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="note">
+    <xs:complexType>
+      <xs:attribute name="type" use="required">
+        <xs:simpleType>
+          <xs:restriction base="xs:string">
+            <xs:enumeration value="audience"/>
+          </xs:restriction>
+        </xs:simpleType>
+      </xs:attribute>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+
+def loadExample():
+    with open(os.path.join("examples", "test.json")) as f:
+        return json.load(f)
+
+
+def test_checkJSON():
+    data = loadExample()
+    assert schema.checkJSON(data) == []
+    # unknown keys are only reported in strict mode
+    assert schema.checkJSON(data, strict=True, showError=False) == [
+        "infoDoc.dateEPub: unknown key"
+    ]
+    # all errors in one pass
+    data["type"] = "unknown"
+    data["title"] = {"en": "title", "english": "title"}
+    data["authors"][0].pop("firstname")
+    data["authors"][1]["affiliation"] = ["affiliationA", 1]
+    data["infoDoc"]["datePub"] = "01/01/2024"
+    data["structures"] = {"id": "affiliation"}
+    assert schema.checkJSON(data, showError=False) == [
+        "type: unknown type of document 'unknown'",
+        "title: unknown language 'english'",
+        "authors[0].firstname: missing",
+        "authors[1].affiliation[1]: expected text, got int",
+        "infoDoc.datePub: expected date YYYY[-MM[-DD]], got '01/01/2024'",
+        "structures.name: missing",
+    ]
+    assert schema.checkJSON([data], showError=False) == ["expected object, got array"]
+    # rejected before building XML
+    assert execHAL.prepareJSON2HAL(data, "", "test.xml") == (os.EX_DATAERR, None, None)
+
+
+def test_checkJSONWithXSD(tmp_path):
+    xsd = tmp_path / "notes.xsd"
+    xsd.write_text(XSD)
+    data = {
+        "title": "title",
+        "authors": [{"firstname": "John", "lastname": "Doe"}],
+        "notes": {"audience": "international", "comment": "small comment"},
+    }
+    assert schema.checkJSON(data) == []
+    # notes not enumerated in XSD are rejected
+    assert schema.checkJSON(data, xsd_file_path=str(xsd), showError=False) == [
+        "notes.comment: not accepted by XSD (note/@type=commentary)"
+    ]
+    # compiled once per XSD
+    assert schema.getValidator(str(xsd)) is schema.getValidator(str(xsd))
+
+
+def test_buildXMLFromValidJSON():
+    data = loadExample()
+    data["ID"] = {"halJournalId": "12345", "j": "journal", "eissn": "xxx"}
+    data["abstract"] = "abstract"
+    data["keywords"] = ["keyword1", "keyword2"]
+    data.pop("structures")
+    assert schema.checkJSON(data) == []
+    tei = libHAL.buildXML(data)
+    terms = tei.findall(".//{}keywords/{}term".format(libHAL.TEI, libHAL.TEI))
+    assert [t.text for t in terms] == ["keyword1", "keyword2"]
+    assert tei.find(".//{}abstract".format(libHAL.TEI)).text == "abstract"
+    # no IDs at all
+    data.pop("ID")
+    assert schema.checkJSON(data) == []
+    libHAL.buildXML(data)
@@ -0,0 +1,132 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+from push2HAL import libHAL, session
+
+
+def test_sharedSession():
+    session.closeSession()
+    assert session.getSession() is session.getSession()
+    session.configureSession(poolSize=3)
+    s = session.getSession()
+    assert s.get_adapter("https://api.archives-ouvertes.fr/")._pool_maxsize == 3
+    assert session.POLICY["search"]["concurrencyMax"] == 3
+    assert session.POLICY["search"]["concurrency"] == 3
+    session.configureSession(poolSize=10)
+    assert session.POLICY["search"]["concurrencyMax"] == 10
+
+
+def test_keepAlive(fakehal):
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]
+    for _ in range(5):
+        res = libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+        assert res[0]["halId_s"] == "hal-01"
+    assert len(fakehal.requests) == 5
+    assert fakehal.connections() == 1
+
+
+def test_authReuse(fakehal):
+    session.configureSession(credentials={"login": "ll", "passwd": "pp"})
+    try:
+        libHAL.upload2HAL("examples/test.json", {}, None)
+        assert fakehal.requests[-1]["headers"]["Authorization"].startswith("Basic ")
+    finally:
+        session.SESSION_CONFIG["credentials"] = None
+
+
+def test_retryThrottled(fakehal):
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]
+    fakehal.failures = [(503, {}, "busy"), (429, {"Retry-After": "0"}, "slow down")]
+    res = libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+    assert res[0]["halId_s"] == "hal-01"
+    assert len(fakehal.requests) == 3
+    # retries exhausted: last response is returned
+    session.configurePolicy(maxRetries=1)
+    fakehal.failures = [(503, {}, "busy")] * 3
+    assert libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi") == []
+    assert len(fakehal.requests) == 5
+
+
+def test_retryPost(fakehal):
+    url = libHAL.getSWORDUrl("preprod")
+    # server error: the deposit may have been processed (no retry)
+    fakehal.failures = [(500, {}, "error")]
+    assert session.post(url, data=b"data").status_code == 500
+    assert len(fakehal.requests) == 1
+    # throttled: the deposit has not been processed (retry)
+    fakehal.failures = [(503, {"Retry-After": "0"}, "busy")]
+    assert session.post(url, data=b"data").status_code == 201
+    assert len(fakehal.requests) == 3
+    assert fakehal.requests[-1]["body"] == b"data"
+
+
+def test_rateLimit(fakehal):
+    session.configurePolicy("search", rate=20, burst=1)
+    start = time.perf_counter()
+    for _ in range(5):
+        libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+    assert time.perf_counter() - start >= 0.18
+
+
+def test_adaptiveConcurrency():
+    session.configurePolicy("ref", concurrencyMax=8)
+    try:
+        policy = session.POLICY["ref"]
+        session.acquireSlot("ref")
+        session.releaseSlot("ref", failed=True)
+        assert policy["concurrency"] == 4
+        for _ in range(4):
+            session.acquireSlot("ref")
+            session.releaseSlot("ref")
+        assert 4 < policy["concurrency"] < 6
+        assert policy["inflight"] == 0
+    finally:
+        session.resetPolicy()
+
+
+def test_coalescing(fakehal):
+    fakehal.delay = 0.1
+    fakehal.docs["/search/"] = [{"halId_s": "hal-01", "doiId_s": "10.1/a"}]
+    before = session.getFlightStats()["coalesced"]
+    with ThreadPoolExecutor(8) as pool:
+        res = list(
+            pool.map(
+                lambda _: libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi"),
+                range(8),
+            )
+        )
+    assert all(r == [{"halId_s": "hal-01"}] for r in res)
+    # callers get their own results
+    assert len(set(id(r) for r in res)) == 8
+    assert len(fakehal.requests) == 1
+    assert session.getFlightStats()["coalesced"] - before == 7
+    # completed requests are not shared
+    libHAL.getDataFromHAL(txtsearch="10.1/a", typeI="doi")
+    assert len(fakehal.requests) == 2
+
+
+def checkChild():
+    """Run in a forked child: locks free and no inherited request in flight"""
+    ok = session.POLICY_LOCK.acquire(timeout=1) and session.FLIGHT_LOCK.acquire(
+        timeout=1
+    )
+    ok = ok and not session.FLIGHTS
+    ok = ok and all(p["inflight"] == 0 for p in session.POLICY.values())
+    os._exit(0 if ok else 1)
+
+
+def test_resetChild():
+    ctx = multiprocessing.get_context("fork")
+    session.POLICY["sword"]["inflight"] = 3
+    session.FLIGHTS["key"] = Future()
+    lock, flight = session.POLICY_LOCK, session.FLIGHT_LOCK
+    try:
+        with lock, flight:
+            child = ctx.Process(target=checkChild)
+            child.start()
+            child.join(10)
+        assert child.exitcode == 0
+    finally:
+        session.FLIGHTS.pop("key")
+        session.resetPolicy()
@@ -0,0 +1,108 @@
+import os
+import copy
+from lxml import etree
+from push2HAL import execHAL, libHAL, syncHAL
+
+TEI = libHAL.TEI
+HAL_ID = "hal-01234567"
+
+
+def loadHALRecord(withFile=True):
+    """Record exported by HAL (xml-tei) once the example record has been deposited"""
+    tei = etree.parse(os.path.join("tests", "data", HAL_ID + ".xml"))
+    biblFull = tei.find(".//{}biblFull".format(TEI))
+    if not withFile:
+        for ref in biblFull.findall(".//{0}editionStmt//{0}ref".format(TEI)):
+            ref.getparent().remove(ref)
+    return biblFull
+
+
+def getRecord(record):
+    """Example record with the identifiers found in its HAL export"""
+    data = copy.deepcopy(record)
+    data["halId"] = HAL_ID
+    data["licence"] = "by"
+    john, jane = data["authors"]
+    john.update(email="john.doe@univ-yeah.com", orcid="0000-0002-1825-0097")
+    jane.update(
+        email="Jane.Doe@univ-yeah.com",
+        orcid="https://orcid.org/0000-0001-5109-3700",
+        idhal="jane-doe",
+    )
+    return data
+
+
+def test_diffTEI(record):
+    data = getRecord(record)
+    tei = libHAL.buildXML(data)
+    current = loadHALRecord(withFile=False)
+    assert syncHAL.diffTEI(tei, current) == []
+    assert syncHAL.getSyncAction(tei, current) == ("unchanged", [])
+    assert syncHAL.getSyncAction(tei, current, "file.pdf")[0] == "file"
+    assert syncHAL.getSyncAction(tei, loadHALRecord(), "file.pdf")[0] == "unchanged"
+    assert syncHAL.getSyncAction(tei, None) == ("deposit", [])
+    # changed code of a note (labels added by HAL are not compared)
+    data["notes"]["audience"] = "national"
+    differences = syncHAL.diffTEI(libHAL.buildXML(data), current)
+    assert differences == [
+        "notesStmt/note[n=3,type=audience]: ",
+        "-notesStmt/note[n=2,type=audience]: ",
+    ]
+    # changed metadata and order of authors
+    data["title"]["en"] = "new title"
+    data["authors"] = data["authors"][::-1]
+    differences = syncHAL.diffTEI(libHAL.buildXML(data), current)
+    assert "titleStmt/title[lang=en]: new title" in differences
+    assert "titleStmt/author[role=aut]#0/persName/forename[type=first]: Jane" in (
+        differences
+    )
+
+    # removed author and keyword
+    data = getRecord(record)
+    author = data["authors"].pop()
+    keywords = data["keywords"]
+    lang = next(iter(keywords))
+    if type(keywords[lang]) is list:
+        removed = keywords[lang].pop()
+    else:
+        removed = keywords.pop(lang)
+    tei = libHAL.buildXML(data)
+    differences = syncHAL.diffTEI(tei, current)
+    assert syncHAL.getSyncAction(tei, current)[0] == "metadata"
+    assert any(d.startswith("-") and author["firstname"] in d for d in differences)
+    assert any(d.startswith("-") and str(removed) in d for d in differences)
+
+
+def test_runJSON2HALSync(fakehal, tmp_path, monkeypatch, tei_xsd, record):
+    pdf = os.path.abspath(os.path.join("examples", "file.pdf"))
+    data = getRecord(record)
+    fakehal.docs["/search/"] = [{"halId_s": HAL_ID}]
+    current = loadHALRecord(withFile=False)
+    fakehal.tei[HAL_ID] = etree.tostring(current, encoding="unicode")
+    monkeypatch.chdir(tmp_path)
+    credentials = {"login": "login", "passwd": "passwd"}
+
+    def run(record):
+        nb = len(fakehal.requests)
+        res = execHAL.runJSON2HAL(
+            copy.deepcopy(record), credentials=credentials, sync=True
+        )
+        return res, [r for r in fakehal.requests[nb:] if "/sword/" in r["path"]]
+
+    # unchanged: nothing uploaded
+    assert run(data) == (os.EX_OK, [])
+    # metadata only
+    data["abstract"]["en"] = "a new abstract"
+    res, sword = run(data)
+    assert res == HAL_ID
+    assert [(r["method"], r["path"]) for r in sword] == [("PUT", "/sword/" + HAL_ID)]
+    assert sword[0]["headers"]["Content-Type"] == "text/xml"
+    # new file
+    res, sword = run(dict(data, file=pdf))
+    assert sword[0]["method"] == "PUT"
+    assert sword[0]["headers"]["Content-Type"] == "application/zip"
+    # not in HAL: new deposit
+    data["halId"] = "hal-00000000"
+    res, sword = run(data)
+    assert res == "hal-00000001"
+    assert [r["method"] for r in sword] == ["POST"]